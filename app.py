@@ -1,22 +1,85 @@
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
 from functools import wraps
 import json
+import threading
 from datetime import datetime
 from iterpro_client import (
     get_players, get_teams, get_player_by_id, get_team_by_id, 
-    get_players_by_team, get_enhanced_athletic_performance,
+    get_players_by_team, get_roster, get_enhanced_athletic_performance,
     get_player_test_instances_batch, extract_latest_test_value,
     clear_cache, clear_team_cache, clear_player_cache, 
-    cleanup_expired_cache, get_cache_stats
+    cleanup_expired_cache, get_cache_stats, median_cache, run_cache_maintenance,
+    get_measurement_history, measurement_store, served_stale
 )
-from auth import authenticate_user, login_required, role_required, get_user_team_players, get_user_player_profile
-from database import MedianCache
+from distributions import Distribution
+import ingest
+import iterpro_breaker
+import leaderboards
+import roster_matrix
+from ingest import IngestError
+from roster import AGE_BUCKETS, POSITION_GROUPS, RosterIndex, normalize_player
+from auth import authenticate_user, login_required, role_required, token_required, get_user_team_players, get_user_player_profile
+from utils.logger import get_logger
+from utils import cache_maintenance, compression, fragment_cache, metrics, profiler, svg_charts
+from utils.serialization import fingerprint
+from utils.metrics import timed
 
 app = Flask(__name__, template_folder="templates", static_folder="static")
 app.secret_key = 'your-secret-key-change-this-in-production'
 
-# Initialize median cache
-median_cache = MedianCache()
+logger = get_logger("app")
+
+_initialized = False
+_init_lock = threading.Lock()
+
+@app.after_request
+def _mark_stale_response(response):
+    """Tell clients which data was served from persisted copies because Iterpro was unreachable"""
+    stale = served_stale()
+    if stale:
+        response.headers['X-Iterpro-Stale'] = ', '.join(stale)
+    return response
+
+# Templates need these to render, however the app is served (flask run, app:app, create_app()):
+# {% cache %} template fragments, keyed by role and roster/median version
+fragment_cache.init_app(app, lambda: median_cache.get_data_version())
+# Page banner while persisted data stands in for Iterpro
+app.context_processor(lambda: {'stale_sources': served_stale()})
+
+def create_app():
+    """
+    Wire the optional extensions and background tasks into the app once and return it
+
+    The module-level app has its routes, template extensions and stale-data
+    marking, so any way of serving it renders every page. Metrics, profiling,
+    compression and the cache maintenance thread are only added here: serve
+    create_app() in production (gunicorn 'app:create_app()'). Clients, caches
+    and stores are built on first use (see utils/lazy.py), so importing this
+    module stays cheap. Safe to call repeatedly.
+    """
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return app
+        
+        # Request/upstream timing, Server-Timing header and /metrics
+        metrics.init_app(app)
+
+        # Admin-only request profiling (?profile=1) and sampling profiler
+        profiler.init_app(app)
+
+        # gzip/brotli responses and fingerprinted, immutable static URLs
+        compression.init_app(app)
+
+        # Periodic expiry, size-capped LRU eviction and vacuum for both cache layers
+        cache_maintenance.register("median_cache", lambda: median_cache.run_maintenance())
+        cache_maintenance.register("response_cache", run_cache_maintenance)
+        # Roster-wide measurement sync for the leaderboards, off the request path
+        cache_maintenance.register("measurement_sync", leaderboards.sync_roster, scheduled_only=True)
+        cache_maintenance.init_app(app)
+        
+        _initialized = True
+    return app
 
 # Authentication routes
 @app.route("/login", methods=["GET", "POST"])
@@ -116,7 +179,7 @@ def api_get_players():
         if not players_data:
             return jsonify({"error": "No players found", "users": []}), 404
         
-        print(f"[DEBUG] Got {len(players_data)} players from iterpro API")
+        logger.debug("Got %d players from iterpro API", len(players_data))
         
         # Devolver directamente los jugadores de iterpro
         return jsonify({
@@ -125,7 +188,7 @@ def api_get_players():
         }), 200
         
     except Exception as e:
-        print(f"[ERROR] Error in api_get_players: {str(e)}")
+        logger.error("Error in api_get_players: %s", e)
         return jsonify({"error": str(e), "users": []}), 500
 
 
@@ -229,29 +292,39 @@ def get_enhanced_athletic_performance_route(player_id):
         
         player = result['player']
         enhanced_data = result['enhanced_data']
-        test_instances = result['test_instances']
         player_thresholds = result['player_thresholds']
         team_thresholds = result['team_thresholds']
-        real_test_data = result.get('real_test_data', {})
         
-        # Get all players for median calculations
-        all_players = get_players()
+        # Normalized roster (ages, position groups) for median calculations
+        roster = get_roster()
+        current_player = roster.get(player_id) or normalize_player(player)
+        cohort = roster.cohort(current_player)
         team_id = player.get('teamId')
         team_players = get_players_by_team(team_id) if team_id else []
         
         # Fetch test instances for all relevant players
-        all_player_ids = [p.get('_id') for p in all_players if p.get('_id')]
+        all_player_ids = [r.id for r in roster.records if r.id]
         team_player_ids = [p.get('_id') for p in team_players if p.get('_id')]
-        
-        # Fetch test data for all players (limit to avoid API overload)
-        print(f"[DEBUG] Fetching test data for {len(all_player_ids)} all players")
-        all_players_test_data = get_player_test_instances_batch(all_player_ids, max_players=20)
-        print(f"[DEBUG] Fetching test data for {len(team_player_ids)} team players")
-        team_players_test_data = get_player_test_instances_batch(team_player_ids, max_players=10)
+        cohort_ids = [r.id for r in cohort if r.id]
+        
+        matrix = roster_matrix.get_matrix(roster)
+        if matrix is not None and matrix.covers(cohort_ids) and matrix.covers(team_player_ids):
+            # Whole cohort and team from the node's shared matrix: no batch fetches, no per-worker copies
+            all_players_test_data = matrix.rows_for(cohort_ids)
+            team_players_test_data = matrix.rows_for(team_player_ids)
+            # The median cache only holds whole-group medians; not while a rebuild is catching up with /ingest
+            store_medians = roster_matrix.is_current(matrix)
+        else:
+            # Fetch test data for a sample of players (limit to avoid API overload); its medians are never cached
+            store_medians = False
+            logger.debug("Fetching test data for %d all players", len(all_player_ids))
+            all_players_test_data = get_player_test_instances_batch(all_player_ids, max_players=20)
+            logger.debug("Fetching test data for %d team players", len(team_player_ids))
+            team_players_test_data = get_player_test_instances_batch(team_player_ids, max_players=10)
         
         # Debug logging
-        print(f"[DEBUG] All players test data: {type(all_players_test_data)}, length: {len(all_players_test_data) if all_players_test_data else 'None'}")
-        print(f"[DEBUG] Team players test data: {type(team_players_test_data)}, length: {len(team_players_test_data) if team_players_test_data else 'None'}")
+        logger.debug("All players test data length: %s", len(all_players_test_data) if all_players_test_data else 'None')
+        logger.debug("Team players test data length: %s", len(team_players_test_data) if team_players_test_data else 'None')
         
         # Ensure we always have dictionaries, not None
         if all_players_test_data is None:
@@ -262,25 +335,28 @@ def get_enhanced_athletic_performance_route(player_id):
         # Calculate medians for each test
         for category, tests in enhanced_data.items():
             for test_name, test_data in tests.items():
-                # Calculate position and age median
-                position_age_median = calculate_median_by_position_and_age(
-                    all_players, player, test_name, all_players_test_data
+                # Position/age and team distributions (medians, percentiles)
+                position_age = position_age_distribution(
+                    cohort, current_player, test_name, all_players_test_data, store=store_medians
                 )
-                
-                # Calculate team median
-                team_median = calculate_team_median(
-                    team_players, test_name, team_players_test_data, team_id
+                team = team_distribution(
+                    team_players, test_name, team_players_test_data, team_id, store=store_medians
                 )
+                position_age_median = round(position_age.median(), 2) if position_age else None
+                team_median = round(team.median(), 2) if team else None
                 
                 # Debug logging for median calculations
-                print(f"[DEBUG] Test: {test_name}")
-                print(f"[DEBUG] Position/Age median: {position_age_median}")
-                print(f"[DEBUG] Team median: {team_median}")
+                logger.debug("Test: %s, position/age median: %s, team median: %s", test_name, position_age_median, team_median)
                 
                 # Add medians to test data
                 test_data['position_age_median'] = position_age_median
                 test_data['team_median'] = team_median
                 
+                # Where the player's latest real value sits in each distribution
+                latest_value = next((m['value'] for m in test_data.get('measurements', []) if m.get('is_real')), None)
+                test_data['position_age_distribution'] = position_age.summary(latest_value) if position_age else None
+                test_data['team_distribution'] = team.summary(latest_value) if team else None
+                
                 # If no real medians found, provide sample data for demonstration
                 if position_age_median is None and team_median is None and test_name in ['Height', 'Weight', 'BMI', '5m', '10m', '20m', '30m', 'T Test', 'Illinois', 'ArrowHead', 'Single Leg Jump', 'CMJ Arm Swing HT', 'CMJ Arm Locked HT', 'Diff % Height Swing-Locked', 'Lactate', 'YYIRT1', 'YYIRT2']:
                     # Provide sample medians based on test type
@@ -307,18 +383,78 @@ def get_enhanced_athletic_performance_route(player_id):
                     if test_name in sample_medians:
                         test_data['position_age_median'] = sample_medians[test_name]
                         test_data['team_median'] = sample_medians[test_name] + 2.1  # Slightly different for variety
-                        print(f"[DEBUG] Using sample median for {test_name}: {sample_medians[test_name]}")
+                        logger.debug("Using sample median for %s: %s", test_name, sample_medians[test_name])
         
         return jsonify({
             "player": player,
             "enhanced_data": enhanced_data,
-            "test_instances": test_instances,
             "player_thresholds": player_thresholds,
             "team_thresholds": team_thresholds
         })
         
     except Exception as e:
-        print(f"Error in athletic performance route: {e}")
+        logger.exception("Error in athletic performance route: %s", e)
+        return jsonify({"error": "Internal server error"}), 500
+
+# Historial real de mediciones de un test, por rango y paginado
+@app.route("/players/<player_id>/history/<path:test_name>")
+@login_required
+def get_measurement_history_route(player_id, test_name):
+    """Real measurements of one test: ?months= bounds the range, ?limit= and ?before= page back from the newest"""
+    try:
+        months = request.args.get('months', type=int)
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        before = request.args.get('before', type=float)
+        points = get_measurement_history(player_id, test_name, months=months, before=before, limit=limit)
+        return jsonify({
+            "player_id": player_id,
+            "test_name": test_name,
+            "measurements": [
+                {"date": datetime.fromtimestamp(measured_at).strftime('%Y-%m-%d'), "timestamp": measured_at, "value": value}
+                for measured_at, value in points
+            ],
+            # Cursor for the previous (older) page
+            "next_before": points[0][0] if points and len(points) == limit else None
+        })
+    except Exception as e:
+        logger.exception("Error in measurement history route: %s", e)
+        return jsonify({"error": "Internal server error"}), 500
+
+# Clasificaciones del club por test
+@app.route("/leaderboards")
+@login_required
+def leaderboard_tests_route():
+    """Tests with a leaderboard"""
+    try:
+        return jsonify({"tests": leaderboards.tests()})
+    except Exception as e:
+        logger.exception("Error listing leaderboards: %s", e)
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route("/leaderboards/<path:test_name>")
+@login_required
+def leaderboard_route(test_name):
+    """Top (or ?order=bottom) ?n= players of a test from ?offset=, filterable by ?team_id=, ?position= and ?age_bucket="""
+    order = request.args.get('order', 'top')
+    if order not in ('top', 'bottom'):
+        return jsonify({"error": "order must be 'top' or 'bottom'"}), 400
+    n = min(max(request.args.get('n', 10, type=int), 1), leaderboards.LEADERBOARD_MAX_N)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    try:
+        result = leaderboards.leaderboard(
+            test_name, n, bottom=order == 'bottom',
+            team_id=request.args.get('team_id') or None,
+            position=request.args.get('position') or None,
+            age_bucket=request.args.get('age_bucket') or None,
+            offset=offset,
+        )
+        if result is None:
+            return jsonify({"error": f"Unknown test: {test_name}"}), 404
+        return jsonify(result)
+    except leaderboards.LeaderboardUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.exception("Error in leaderboard route: %s", e)
         return jsonify({"error": "Internal server error"}), 500
 
 # Settings page for admin cache management
@@ -331,10 +467,12 @@ def settings():
         # Get cache statistics
         cache_stats = median_cache.get_cache_stats()
         
-        return render_template("settings.html", cache_stats=cache_stats)
+        return render_template("settings.html", cache_stats=cache_stats,
+                               position_groups=POSITION_GROUPS, age_buckets=AGE_BUCKETS)
     except Exception as e:
-        print(f"Error in settings route: {e}")
-        return render_template("settings.html", cache_stats={}, error=str(e))
+        logger.error("Error in settings route: %s", e)
+        return render_template("settings.html", cache_stats={}, error=str(e),
+                               position_groups=POSITION_GROUPS, age_buckets=AGE_BUCKETS)
 
 @app.route("/settings/invalidate-cache", methods=["POST"])
 @login_required
@@ -347,11 +485,57 @@ def invalidate_cache():
         
         # Invalidate cache
         median_cache.invalidate_all_cache(user.get('name', 'Admin'), reason)
+        measurement_store.mark_stale()
+        fragment_cache.clear()
         
         flash('Cache invalidated successfully', 'success')
         return redirect(url_for('settings'))
     except Exception as e:
-        print(f"Error invalidating cache: {e}")
+        logger.error("Error invalidating cache: %s", e)
+        flash('Error invalidating cache', 'error')
+        return redirect(url_for('settings'))
+
+@app.route("/settings/invalidate-scope", methods=["POST"])
+@login_required
+@role_required('admin')
+def invalidate_cache_scope():
+    """Invalidate only the cached data that depends on a player, team, test or cohort"""
+    try:
+        user = session.get('user')
+        reason = request.form.get('reason') or 'Scoped invalidation by admin'
+        player_id = request.form.get('player_id', '').strip()
+        team_id = request.form.get('team_id', '').strip()
+        test_name = request.form.get('test_name', '').strip()
+        position_group = request.form.get('position_group', '').strip()
+        age_bucket = request.form.get('age_bucket', '').strip()
+        
+        players = []
+        if player_id:
+            record = get_roster().get(player_id)
+            if record is None:
+                flash(f'Unknown player: {player_id}', 'error')
+                return redirect(url_for('settings'))
+            players.append(record)
+        cohorts = []
+        if position_group or age_bucket:
+            if not (position_group and age_bucket):
+                flash('A cohort needs both a position group and an age range', 'error')
+                return redirect(url_for('settings'))
+            cohorts.append((position_group, age_bucket))
+        if not (players or team_id or test_name or cohorts):
+            flash('Choose a player, team, test or cohort to invalidate', 'error')
+            return redirect(url_for('settings'))
+        
+        removed = median_cache.invalidate(
+            user.get('name', 'Admin'), reason, players=players,
+            teams=[team_id] if team_id else [], cohorts=cohorts, tests=[test_name] if test_name else [],
+        )
+        if player_id:
+            measurement_store.mark_stale([player_id])
+        flash(f'Invalidated {removed} cache entries', 'success')
+        return redirect(url_for('settings'))
+    except Exception as e:
+        logger.error("Error invalidating cache scope: %s", e)
         flash('Error invalidating cache', 'error')
         return redirect(url_for('settings'))
 
@@ -361,127 +545,95 @@ def invalidate_cache():
 def cleanup_cache():
     """Clean up expired cache entries"""
     try:
-        deleted_count = median_cache.cleanup_expired_cache()
-        flash(f'Cleaned up {deleted_count} expired cache entries', 'success')
+        results = cache_maintenance.run_once()
+        expired = sum(r.get('expired', 0) for r in results.values())
+        evicted = sum(r.get('evicted', 0) for r in results.values())
+        flash(f'Cleaned up {expired} expired cache entries, evicted {evicted} to stay within the size budget', 'success')
         return redirect(url_for('settings'))
     except Exception as e:
-        print(f"Error cleaning up cache: {e}")
+        logger.error("Error cleaning up cache: %s", e)
         flash('Error cleaning up cache', 'error')
         return redirect(url_for('settings'))
 
-def calculate_median_by_position_and_age(all_players, current_player, test_name, all_players_test_data):
+@timed("median", kind="position_age")
+def position_age_distribution(cohort, current_player, test_name, all_players_test_data, store=True):
     """
-    Calculate median for players with same position and ±3 age range
+    Distribution of a test's latest values among players in the same position group and age bucket
+
+    cohort and current_player are normalized roster records (see roster.py).
+    The distribution is cached together with the cohort median unless store is
+    False (test data covering only part of the cohort).
     """
     try:
-        if not all_players or not current_player or not all_players_test_data:
-            print(f"[DEBUG] Early return - all_players: {bool(all_players)}, current_player: {bool(current_player)}, all_players_test_data: {bool(all_players_test_data)}")
+        if not cohort or not current_player or not all_players_test_data:
+            logger.debug("Early return - cohort: %s, current_player: %s, all_players_test_data: %s", bool(cohort), bool(current_player), bool(all_players_test_data))
             return None
         
-        current_position = current_player.get('position', '')
-        current_age = current_player.get('age')
-        if current_age is None:
-            # Try to calculate age from birthDate
-            birth_date = current_player.get('birthDate')
-            if birth_date:
-                from datetime import datetime
-                try:
-                    birth = datetime.fromisoformat(birth_date.replace('Z', '+00:00'))
-                    current_age = datetime.now().year - birth.year
-                except:
-                    current_age = 25  # Default age
-            else:
-                current_age = 25  # Default age
-        
-        # Generate age range for caching
-        age_range = median_cache.get_age_range(current_age)
+        position, age_range = RosterIndex.cohort_key(current_player)
         
         # Try to get from cache first
-        cached_median = median_cache.get_cached_position_age_median(test_name, current_position, age_range)
-        if cached_median is not None:
-            print(f"[CACHE HIT] Position/Age median for {test_name} - {current_position} {age_range}: {cached_median}")
-            return cached_median
-        
-        print(f"[DEBUG] Looking for position: {current_position}, age: {current_age}, test: {test_name}")
-        
-        # Filter players by position and age range (±3 years)
-        filtered_players = []
-        for player in all_players:
-            player_position = player.get('position', '')
-            player_age = player.get('age', 25)
-            player_id = player.get('_id')
+        cached = median_cache.get_cached_position_age_distribution(test_name, position, age_range)
+        if cached is not None:
+            logger.debug("[CACHE HIT] Position/Age distribution for %s - %s %s: %d players", test_name, position, age_range, len(cached))
+            return cached
+        
+        logger.debug("Looking for position: %s, age range: %s, test: %s", position, age_range, test_name)
+        
+        values = {}
+        for record in cohort:
+            # Get test value for this player from the batch data
+            test_instances = all_players_test_data.get(record.id)
+            if test_instances is not None:
+                test_value = extract_latest_test_value(test_instances, test_name)
+                if test_value is not None:
+                    values[record.id] = test_value
+        
+        logger.debug("Found %d players with matching criteria", len(values))
+        if values:
+            distribution = Distribution(values)
+            median_value = round(distribution.median(), 2)
             
-            # Check if positions match (allowing for variations)
-            position_match = (
-                player_position == current_position or
-                (current_position in player_position) or
-                (player_position in current_position)
-            )
+            # Cache the result (unless persisted data stood in for part of the cohort)
+            if store and not served_stale():
+                median_cache.cache_position_age_median(test_name, position, age_range, median_value, len(values), distribution)
+                logger.debug("[CACHE STORED] Position/Age median for %s - %s %s: %s (from %d players)", test_name, position, age_range, median_value, len(values))
             
-            # Check if age is within appropriate range based on player age
-            if current_age < 18:
-                # For younger players, use smaller ranges
-                if current_age < 14:
-                    age_match = 14 <= player_age <= 17
-                elif current_age < 16:
-                    age_match = 14 <= player_age <= 17
-                else:
-                    age_match = 16 <= player_age <= 19
-            else:
-                # For adult players, use ±3 range
-                age_match = abs(player_age - current_age) <= 3
-            
-            if position_match and age_match and player_id:
-                # Get test value for this player from the batch data
-                test_instances = all_players_test_data.get(player_id, [])
-                if test_instances is not None:  # Add null check
-                    test_value = extract_latest_test_value(test_instances, test_name)
-                    if test_value is not None:
-                        filtered_players.append(test_value)
-        
-        # Calculate median
-        print(f"[DEBUG] Found {len(filtered_players)} players with matching criteria")
-        if filtered_players:
-            filtered_players.sort()
-            n = len(filtered_players)
-            if n % 2 == 0:
-                median = (filtered_players[n//2 - 1] + filtered_players[n//2]) / 2
-            else:
-                median = filtered_players[n//2]
-            median_value = round(median, 2)
-            
-            # Cache the result
-            median_cache.cache_position_age_median(test_name, current_position, age_range, median_value, len(filtered_players))
-            print(f"[CACHE STORED] Position/Age median for {test_name} - {current_position} {age_range}: {median_value} (from {len(filtered_players)} players)")
-            
-            return median_value
+            return distribution
         
-        print(f"[DEBUG] No players found with matching criteria")
+        logger.debug("No players found with matching criteria")
         return None
         
     except Exception as e:
-        print(f"Error calculating position/age median: {e}")
+        logger.error("Error calculating position/age distribution: %s", e)
         return None
 
-def calculate_team_median(team_players, test_name, team_players_test_data, team_id=None):
+def calculate_median_by_position_and_age(cohort, current_player, test_name, all_players_test_data):
+    """Median for players in the same position group and age bucket"""
+    distribution = position_age_distribution(cohort, current_player, test_name, all_players_test_data)
+    return round(distribution.median(), 2) if distribution else None
+
+@timed("median", kind="team")
+def team_distribution(team_players, test_name, team_players_test_data, team_id=None, store=True):
     """
-    Calculate median for players in the same team
+    Distribution of a test's latest values among players in the same team
+
+    Cached with the team median when team_id is given, unless store is False.
     """
     try:
         if not team_players or not team_players_test_data:
-            print(f"[DEBUG] Team median early return - team_players: {bool(team_players)}, team_players_test_data: {bool(team_players_test_data)}")
+            logger.debug("Team distribution early return - team_players: %s, team_players_test_data: %s", bool(team_players), bool(team_players_test_data))
             return None
         
         # Try to get from cache first if team_id is provided
         if team_id:
-            cached_median = median_cache.get_cached_team_median(test_name, team_id)
-            if cached_median is not None:
-                print(f"[CACHE HIT] Team median for {test_name} - team {team_id}: {cached_median}")
-                return cached_median
+            cached = median_cache.get_cached_team_distribution(test_name, team_id)
+            if cached is not None:
+                logger.debug("[CACHE HIT] Team distribution for %s - team %s: %d players", test_name, team_id, len(cached))
+                return cached
         
-        print(f"[DEBUG] Calculating team median for test: {test_name}, team players: {len(team_players)}")
+        logger.debug("Calculating team distribution for test: %s, team players: %d", test_name, len(team_players))
         
-        test_values = []
+        values = {}
         for player in team_players:
             player_id = player.get('_id')
             if player_id:
@@ -490,33 +642,32 @@ def calculate_team_median(team_players, test_name, team_players_test_data, team_
                 if test_instances is not None:  # Add null check
                     test_value = extract_latest_test_value(test_instances, test_name)
                     if test_value is not None:
-                        test_values.append(test_value)
-        
-        # Calculate median
-        print(f"[DEBUG] Found {len(test_values)} team players with test data")
-        if test_values:
-            test_values.sort()
-            n = len(test_values)
-            if n % 2 == 0:
-                median = (test_values[n//2 - 1] + test_values[n//2]) / 2
-            else:
-                median = test_values[n//2]
-            median_value = round(median, 2)
+                        values[player_id] = test_value
+        
+        logger.debug("Found %d team players with test data", len(values))
+        if values:
+            distribution = Distribution(values)
+            median_value = round(distribution.median(), 2)
             
-            # Cache the result if team_id is provided
-            if team_id:
-                median_cache.cache_team_median(test_name, team_id, median_value, len(test_values))
-                print(f"[CACHE STORED] Team median for {test_name} - team {team_id}: {median_value} (from {len(test_values)} players)")
+            # Cache the result if team_id is provided (and Iterpro answered for the whole team)
+            if team_id and store and not served_stale():
+                median_cache.cache_team_median(test_name, team_id, median_value, len(values), distribution)
+                logger.debug("[CACHE STORED] Team median for %s - team %s: %s (from %d players)", test_name, team_id, median_value, len(values))
             
-            return median_value
+            return distribution
         
-        print(f"[DEBUG] No team players found with test data")
+        logger.debug("No team players found with test data")
         return None
         
     except Exception as e:
-        print(f"Error calculating team median: {e}")
+        logger.error("Error calculating team distribution: %s", e)
         return None
 
+def calculate_team_median(team_players, test_name, team_players_test_data, team_id=None):
+    """Median for players in the same team"""
+    distribution = team_distribution(team_players, test_name, team_players_test_data, team_id)
+    return round(distribution.median(), 2) if distribution else None
+
 
 
 # Cache management endpoints (for debugging)
@@ -526,6 +677,7 @@ def cache_stats():
     """Get cache statistics"""
     try:
         stats = get_cache_stats()
+        stats['iterpro_breakers'] = iterpro_breaker.states()
         return jsonify(stats)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -536,6 +688,7 @@ def cache_clear():
     """Clear all cache"""
     try:
         clear_cache()
+        fragment_cache.clear()
         return jsonify({"message": "All cache cleared successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -556,6 +709,7 @@ def cache_clear_players():
     """Clear player cache only"""
     try:
         clear_player_cache()
+        fragment_cache.clear()
         return jsonify({"message": "Player cache cleared successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -570,6 +724,31 @@ def cache_cleanup():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Push-based updates from Iterpro (webhook or batch upload, see ingest.py)
+@app.route("/ingest", methods=["POST"])
+@token_required
+def ingest_events():
+    """Apply pushed change notifications or test-instance payloads"""
+    payload = request.get_json(silent=True)
+    if payload is None:
+        return jsonify({"error": "Expected a JSON body"}), 400
+    try:
+        events = ingest.parse_events(payload)
+    except IngestError as e:
+        return jsonify({"error": str(e)}), 400
+    result = ingest.apply_events(events, source=request.headers.get('X-Ingest-Source', 'ingest'))
+    return jsonify(result), 200 if not result['errors'] else 207
+
+@timed("report_charts")
+def get_report_charts(player_id, enhanced_data, version=None):
+    """SVG trend charts per category and test, cached per (player, data version)"""
+    version = version or svg_charts.data_version(enhanced_data)
+    charts = median_cache.get_cached_report_charts(player_id, version)
+    if charts is None:
+        charts = svg_charts.render_report_charts(enhanced_data)
+        median_cache.cache_report_charts(player_id, version, charts)
+    return charts
+
 @app.route('/player-report/<player_id>')
 @login_required    
 def player_report(player_id):
@@ -589,32 +768,35 @@ def player_report(player_id):
         # Get enhanced athletic performance data
         athletic_performance_data = get_enhanced_athletic_performance(player_id, player_data.get('teamId'))
         
-        # Helper function for age calculation
-        def calculate_age(birth_date_str):
-            try:
-                if birth_date_str:
-                    birth_date = datetime.fromisoformat(birth_date_str.replace('Z', '+00:00'))
-                    today = datetime.now()
-                    age = today.year - birth_date.year
-                    if today.month < birth_date.month or (today.month == birth_date.month and today.day < birth_date.day):
-                        age -= 1
-                    return age
-                return None
-            except Exception as e:
-                print(f"Error generating player report: {e}")
-                return None
+        # Versions of the cached report fragments (profile sections, performance sections)
+        profile_version = fingerprint([player_data, team_data, datetime.now().strftime('%Y-%m-%d')])
+        report_version = None
+        if athletic_performance_data:
+            report_version = svg_charts.data_version(athletic_performance_data['enhanced_data'])
+        
+        # Server-rendered SVG charts for printing (?charts=svg)
+        charts = None
+        if request.args.get('charts') == 'svg' and athletic_performance_data:
+            charts = get_report_charts(player_id, athletic_performance_data['enhanced_data'], report_version)
+        
+        # Age from the normalized roster record
+        player_record = get_roster().get(player_id) or normalize_player(player_data)
         
         return render_template(
             'player_report.html',
+            player_id=player_id,
             player=player_data,
             team=team_data,
             athletic_performance=athletic_performance_data,
+            charts=charts,
+            profile_version=profile_version,
+            report_version=report_version,
             current_datetime=datetime.now(),
             now=datetime.now(),
-            calculate_age=calculate_age
+            player_age=player_record.age
         )
     except Exception as e:
-        print(f"Error generating player report: {e}")
+        logger.exception("Error generating player report: %s", e)
         flash('Error generating player report', 'error')
         return redirect(url_for('index'))
 
@@ -628,4 +810,4 @@ def get_current_user():
     return jsonify({"error": "No user in session"}), 401
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -1,22 +1,114 @@
+import hmac
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from functools import wraps
-from flask import session, redirect, url_for, flash
+from pathlib import Path
+from flask import session, redirect, url_for, flash, request, jsonify
+from utils.logger import get_logger
+
+logger = get_logger("auth")
+
+USERS_FILE = Path(os.getenv("USERS_FILE", Path(__file__).resolve().parent / "users.json"))
+# bcrypt is CPU bound; cap how many verifications run at once so a burst of
+# logins cannot take every core away from the threads serving dashboards
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", "2"))
+AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", "32"))
+AUTH_TIMEOUT = float(os.getenv("AUTH_TIMEOUT", "10"))
+# Shared secret for machine-to-machine endpoints (/ingest); unset disables them
+INGEST_TOKEN = os.getenv("INGEST_TOKEN", "")
+# Bearer token for the Prometheus scrape endpoint (/metrics); unset disables it
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+
+class UserStore:
+    """users.json loaded once into a dict keyed by username, reloaded when the file's mtime changes"""
+
+    def __init__(self, path=USERS_FILE):
+        self.path = Path(path)
+        self._users = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _reload_if_changed(self):
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            users = {}
+            if mtime is not None:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    for user in json.load(f).get('users', []):
+                        users[user['username']] = user
+            self._users = users
+            self._mtime = mtime
+            logger.info("Loaded %d users from %s", len(users), self.path)
+
+    def get(self, username):
+        self._reload_if_changed()
+        return self._users.get(username)
+
+    def all(self):
+        self._reload_if_changed()
+        return list(self._users.values())
+
+
+user_store = UserStore()
+
+_password_pool = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="auth")
+_pending_verifications = threading.BoundedSemaphore(AUTH_MAX_PENDING)
+
+
+def _check_stored_password(password, stored):
+    if stored.startswith(BCRYPT_PREFIXES):
+        from db.db import check_password
+        return check_password(password, stored)
+    # Legacy plaintext entry (see utils/hash_user_passwords.py)
+    return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+
+
+def verify_password(password, stored):
+    """Verify a password on the bounded auth pool; False when overloaded or timed out"""
+    if not password or not stored:
+        return False
+    if not _pending_verifications.acquire(timeout=AUTH_TIMEOUT):
+        logger.warning("Too many pending logins, rejecting attempt")
+        return False
+    try:
+        future = _password_pool.submit(_check_stored_password, password, stored)
+    except BaseException:
+        _pending_verifications.release()
+        raise
+    # The slot is held until the hash is done, not until we stop waiting for it
+    future.add_done_callback(lambda _: _pending_verifications.release())
+    try:
+        return future.result(timeout=AUTH_TIMEOUT)
+    except FutureTimeoutError:
+        logger.warning("Password verification timed out")
+        return False
+    except ValueError as e:
+        logger.error("Invalid password hash: %s", e)
+        return False
+
 
 def load_users():
     """Load users from JSON file"""
-    try:
-        with open('users.json', 'r') as f:
-            data = json.load(f)
-            return data.get('users', [])
-    except FileNotFoundError:
-        return []
+    return user_store.all()
 
 def authenticate_user(username, password):
     """Authenticate user with username and password"""
-    users = load_users()
-    for user in users:
-        if user['username'] == username and user['password'] == password:
-            return user
+    user = user_store.get(username)
+    if user and verify_password(password, user.get('password', '')):
+        # Never keep the password (or its hash) in the session cookie
+        return {key: value for key, value in user.items() if key != 'password'}
     return None
 
 def login_required(f):
@@ -45,13 +137,40 @@ def role_required(allowed_roles):
         return decorated_function
     return decorator
 
+def _bearer_token_matches(expected):
+    header = request.headers.get('Authorization', '')
+    token = header[len('Bearer '):] if header.startswith('Bearer ') else ''
+    return hmac.compare_digest(token.encode('utf-8'), expected.encode('utf-8'))
+
+def token_required(f):
+    """Decorator for webhook routes: requires 'Authorization: Bearer <INGEST_TOKEN>'"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not INGEST_TOKEN:
+            return jsonify({"error": "Ingestion is disabled"}), 404
+        if not _bearer_token_matches(INGEST_TOKEN):
+            return jsonify({"error": "Unauthorized"}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+def metrics_token_required(f):
+    """Decorator for scrape endpoints: requires 'Authorization: Bearer <METRICS_TOKEN>'"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not METRICS_TOKEN:
+            return jsonify({"error": "Metrics are disabled"}), 404
+        if not _bearer_token_matches(METRICS_TOKEN):
+            return jsonify({"error": "Unauthorized"}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
 def get_user_team_players(team_id):
     """Get players for a specific team"""
     from iterpro_client import get_players_by_team
     try:
         return get_players_by_team(team_id)
     except Exception as e:
-        print(f"[DEBUG] Error getting team players: {str(e)}")
+        logger.error("Error getting team players: %s", e)
         return []
 
 def get_user_player_profile(player_id):
@@ -60,5 +179,5 @@ def get_user_player_profile(player_id):
     try:
         return get_player_by_id(player_id)
     except Exception as e:
-        print(f"[DEBUG] Error getting player profile: {str(e)}")
+        logger.error("Error getting player profile: %s", e)
         return None
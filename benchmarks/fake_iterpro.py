@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Local fake Iterpro API serving a synthetic club.
+
+Players, teams and thresholds are generated up front; test histories are
+generated on demand from a per-player seed, so a 5,000 player club stays
+cheap to host while always returning the same data for the same player.
+
+Usage:
+    python benchmarks/fake_iterpro.py --players 500 --port 8765 --latency 0.05 --jitter 0.02
+    BASE_URL=http://127.0.0.1:8765 python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+POSITIONS = ["Goalkeeper", "Defender", "Central Defender", "Full Back", "Midfielder",
+             "Defensive Midfielder", "Attacking Midfielder", "Winger", "Forward", "Striker"]
+NATIONALITIES = ["US", "MX", "CA", "ES", "BR", "AR", "GB", "FR"]
+TEAM_NAMES = ["U13", "U14", "U15", "U16", "U17", "U19", "Reserves", "First Team"]
+
+# test name: (rawField, baseline, spread, improves_with_age)
+TESTS = {
+    "Height": ("height", 172.0, 8.0, 1.2),
+    "Weight": ("weight", 66.0, 8.0, 1.5),
+    "% BF": ("bodyFat", 12.0, 3.0, -0.1),
+    "Single Leg Jump": ("distance", 80.0, 8.0, 0.8),
+    "CMJ Arm Swing HT": ("height", 44.0, 5.0, 0.6),
+    "CMJ Arm Locked HT": ("height", 39.0, 4.5, 0.5),
+    "Diff % Height Swing-Locked": ("percentage", 8.0, 2.5, 0.0),
+    "5m": ("time", 1.05, 0.08, -0.01),
+    "10m": ("time", 1.75, 0.10, -0.015),
+    "20m": ("time", 3.05, 0.15, -0.02),
+    "30m": ("time", 4.20, 0.20, -0.03),
+    "T Test": ("time", 10.2, 0.6, -0.05),
+    "Illinois": ("time", 15.4, 0.9, -0.08),
+    "ArrowHead": ("time", 15.8, 0.9, -0.08),
+    "Lactate": ("mmol", 4.0, 0.8, -0.05),
+    "YYIRT1": ("distance", 2100, 350, 60),
+    "YYIRT2": ("distance", 1250, 250, 40),
+}
+
+
+def _object_id(prefix, index):
+    """Mongo-style 24 hex char id"""
+    return f"{prefix:08x}{index:016x}"
+
+
+class SyntheticClub:
+    """Deterministic synthetic roster with lazily generated test histories"""
+
+    def __init__(self, players=50, teams=None, sessions=12, seed=42):
+        self.seed = seed
+        self.sessions = sessions
+        rng = random.Random(seed)
+        team_count = teams or max(2, min(len(TEAM_NAMES) * 4, players // 25))
+        self.teams = [
+            {
+                "_id": _object_id(0x59916330, i),
+                "name": f"{TEAM_NAMES[i % len(TEAM_NAMES)]} {chr(65 + i // len(TEAM_NAMES))}",
+                "clubId": _object_id(0x5991632f, 0),
+                "category": TEAM_NAMES[i % len(TEAM_NAMES)],
+            }
+            for i in range(team_count)
+        ]
+        today = datetime.now()
+        self.players = []
+        for i in range(players):
+            age = rng.randint(13, 32)
+            birth = today - timedelta(days=age * 365 + rng.randint(0, 364))
+            height = round(rng.gauss(172 + min(age - 13, 6) * 1.5, 7))
+            weight = round(rng.gauss(62 + min(age - 13, 8) * 1.5, 7))
+            self.players.append({
+                "_id": _object_id(0x5991645e, i),
+                "name": f"Player{i}",
+                "lastName": f"Synthetic{i}",
+                "displayName": f"P. Synthetic{i}",
+                "position": rng.choice(POSITIONS),
+                "position2": rng.choice(POSITIONS),
+                "birthDate": birth.strftime("%Y-%m-%dT00:00:00.000Z"),
+                "birthPlace": "San Antonio",
+                "nationality": rng.choice(NATIONALITIES),
+                "foot": rng.choice(["right", "left", "both"]),
+                "height": height,
+                "weight": weight,
+                "jersey": rng.randint(1, 99),
+                "captain": rng.random() < 0.05,
+                "currentStatus": "inTeam",
+                "teamId": self.teams[i % team_count]["_id"],
+                "role1": [],
+                "education": "highSchool",
+                "school": "Synthetic High",
+                "biography": "Synthetic player generated for benchmarking. " * 3,
+                # Unused fields Iterpro also returns; kept to make payload sizes realistic
+                "contractDetails": {"value": rng.randint(0, 500000), "agentValue": 0, "clubValue": 0},
+                "anamnesys": [], "documents": [], "injuries": [], "archived": False,
+                "createdAt": "2017-08-14T12:00:00.000Z", "updatedAt": today.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            })
+        self._players_by_id = {p["_id"]: p for p in self.players}
+
+    def player(self, player_id):
+        return self._players_by_id.get(player_id)
+
+    def team(self, team_id):
+        return next((t for t in self.teams if t["_id"] == team_id), None)
+
+    def test_instances(self, player_id):
+        """Full test history for a player (sessions every 6-10 weeks, most tests per session)"""
+        player = self._players_by_id.get(player_id)
+        if player is None:
+            return []
+        rng = random.Random(f"{self.seed}:{player_id}")
+        talent = rng.gauss(0, 1)
+        date = datetime.now() - timedelta(weeks=8 * self.sessions)
+        instances = []
+        for session in range(self.sessions):
+            date += timedelta(weeks=rng.randint(6, 10))
+            progress = session / max(1, self.sessions - 1)
+            for test_name, (field, base, spread, trend) in TESTS.items():
+                if rng.random() < 0.2:
+                    continue  # not every test is run in every session
+                sign = -1 if field == "time" else 1
+                value = base + sign * talent * spread * 0.6 + trend * progress * 2 + rng.gauss(0, spread * 0.3)
+                instances.append({
+                    "_id": f"{player_id[:12]}{session:04x}{len(instances):08x}",
+                    "testId": f"test-{test_name}",
+                    "testName": test_name,
+                    "date": date.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                    "playerId": player_id,
+                    "results": {"rawField": field, "rawValue": round(value, 2)},
+                })
+        return instances
+
+    def thresholds(self, player_id=None):
+        return [{"name": name, "value": base, "customValue": None} for name, (_, base, _, _) in TESTS.items()]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    club = None
+    latency = 0.0
+    jitter = 0.0
+    _players_body = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, payload, status=200):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        # Accept both /players and /api/v1/players
+        if parts[:2] == ["api", "v1"]:
+            parts = parts[2:]
+        club = self.club
+
+        if parts == ["players"]:
+            # Cached on this server's handler class: each server (club) keeps its own body
+            handler = type(self)
+            if handler._players_body is None:
+                handler._players_body = json.dumps(club.players).encode("utf-8")
+            return self._send(handler._players_body)
+        if parts == ["teams"]:
+            return self._send(club.teams)
+        if len(parts) == 2 and parts[0] == "players":
+            player = club.player(parts[1])
+            return self._send(player) if player else self._send({"error": "Not found"}, 404)
+        if len(parts) == 2 and parts[0] == "teams":
+            team = club.team(parts[1])
+            return self._send(team) if team else self._send({"error": "Not found"}, 404)
+        if len(parts) == 3 and parts[0] == "players" and parts[2] == "test-instances":
+            return self._send(club.test_instances(parts[1]))
+        if len(parts) == 3 and parts[2] == "thresholds":
+            return self._send(club.thresholds(parts[1]))
+        return self._send({"error": "Not found"}, 404)
+
+
+def make_server(club, host="127.0.0.1", port=0, latency=0.0, jitter=0.0):
+    """Create (but do not start) a fake Iterpro server; port 0 picks a free port"""
+    handler = type("FakeIterproHandler", (_Handler,), {
+        "club": club, "latency": latency, "jitter": jitter, "_players_body": None,
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve_in_background(club, latency=0.0, jitter=0.0):
+    """Start a fake server in a daemon thread and return (server, base_url)"""
+    server = make_server(club, latency=latency, jitter=jitter)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic club over a fake Iterpro API")
+    parser.add_argument("--players", type=int, default=50)
+    parser.add_argument("--teams", type=int, default=None)
+    parser.add_argument("--sessions", type=int, default=12, help="Test sessions per player")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Base latency per request (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- jitter (seconds)")
+    args = parser.parse_args()
+
+    club = SyntheticClub(args.players, args.teams, args.sessions, args.seed)
+    server = make_server(club, args.host, args.port, args.latency, args.jitter)
+    print(f"Fake Iterpro with {len(club.players)} players / {len(club.teams)} teams "
+          f"on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
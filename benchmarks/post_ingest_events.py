@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Post synthetic push events to the app's /ingest endpoint.
+
+Player and team ids come from the same SyntheticClub the fake Iterpro API
+serves, so the events land on players the app already knows about.
+
+Usage:
+    INGEST_TOKEN=secret python app.py   # with BASE_URL pointing at fake_iterpro.py
+    python benchmarks/post_ingest_events.py --url http://127.0.0.1:5000 --token secret \\
+        --players 500 --events 200 --batch 50
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime
+
+import requests
+
+from fake_iterpro import TESTS, SyntheticClub
+
+
+def test_instance_event(rng, club):
+    """One new test result for a random player"""
+    player = rng.choice(club.players)
+    test_name = rng.choice(list(TESTS))
+    field, base, spread, _ = TESTS[test_name]
+    return {
+        "type": "test_instance",
+        "player_id": player["_id"],
+        "instance": {
+            "_id": f"push{rng.getrandbits(80):020x}",
+            "testId": f"test-{test_name}",
+            "testName": test_name,
+            "date": datetime.now().strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "playerId": player["_id"],
+            "results": {"rawField": field, "rawValue": round(rng.gauss(base, spread), 2)},
+        },
+    }
+
+
+def player_event(rng, club):
+    """A profile change (weight) for a random player"""
+    player = dict(rng.choice(club.players))
+    player["weight"] = player["weight"] + rng.choice([-2, -1, 1, 2])
+    return {"type": "player", "player": player}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Post synthetic events to /ingest")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="App base URL")
+    parser.add_argument("--token", required=True, help="INGEST_TOKEN configured in the app")
+    parser.add_argument("--players", type=int, default=50, help="Size of the synthetic club (as in fake_iterpro.py)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=1, help="Events per request")
+    parser.add_argument("--player-updates", type=float, default=0.1, help="Fraction of profile changes")
+    args = parser.parse_args()
+
+    club = SyntheticClub(args.players, seed=args.seed)
+    rng = random.Random()
+    events = [
+        player_event(rng, club) if rng.random() < args.player_updates else test_instance_event(rng, club)
+        for _ in range(args.events)
+    ]
+    headers = {"Authorization": f"Bearer {args.token}", "X-Ingest-Source": "post_ingest_events"}
+    applied = invalidated = failed = 0
+    start = time.perf_counter()
+    for i in range(0, len(events), args.batch):
+        response = requests.post(f"{args.url}/ingest", json={"events": events[i:i + args.batch]},
+                                 headers=headers, timeout=30)
+        if response.status_code not in (200, 207):
+            print(f"HTTP {response.status_code}: {response.text[:200]}", file=sys.stderr)
+            return 1
+        result = response.json()
+        applied += result["applied"]
+        invalidated += result["invalidated"]
+        failed += len(result["errors"])
+    elapsed = time.perf_counter() - start
+    print(f"{applied} events applied, {failed} rejected, {invalidated} cache entries invalidated "
+          f"in {elapsed:.2f}s ({len(events) / elapsed:.0f} events/s)")
+    return 0 if not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the Soccer Central app.
+
+Each club size runs in its own subprocess against a local fake Iterpro server
+(benchmarks/fake_iterpro.py) with an isolated temp cache dir and
+median_cache.db. For every route we record cold latency (all caches cleared),
+warm latency percentiles, sequential throughput and peak Python allocations.
+MedianCache operations are measured on their own.
+
+Results are appended to benchmarks/results/history.jsonl together with the
+current git commit, and each run is compared with the previous run of the
+same size and settings so regressions show up between commits.
+
+Usage:
+    python benchmarks/run_benchmarks.py                      # 50, 500, 5000 players
+    python benchmarks/run_benchmarks.py --sizes 50 --latency 0.05 --jitter 0.02
+    python benchmarks/run_benchmarks.py --sizes 500 --backend memory   # compare cache backends
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = BENCH_DIR.parent
+RESULTS_FILE = BENCH_DIR / "results" / "history.jsonl"
+DEFAULT_SIZES = [50, 500, 5000]
+REGRESSION_THRESHOLD = 0.20  # flag anything 20% slower than the previous run
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def _reset_caches():
+    """Drop the file cache and every MedianCache table so the next request is cold"""
+    import iterpro_client
+    iterpro_client.clear_cache()
+    iterpro_client.median_cache.invalidate_all_cache("benchmark", "cold run")
+
+
+def _bench_route(client, path, iterations):
+    """Cold + warm latency, throughput and peak allocations for one route"""
+    _reset_caches()
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(path)
+    cold = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    warm = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        client.get(path)
+        warm.append(time.perf_counter() - start)
+
+    return {
+        "status": response.status_code,
+        "bytes": len(response.data),
+        "cold_ms": round(cold * 1000, 2),
+        "warm_p50_ms": round(_percentile(warm, 50) * 1000, 2),
+        "warm_p95_ms": round(_percentile(warm, 95) * 1000, 2),
+        "warm_mean_ms": round(statistics.mean(warm) * 1000, 2),
+        "throughput_rps": round(len(warm) / sum(warm), 1) if sum(warm) else None,
+        "cold_peak_alloc_kb": round(peak / 1024, 1),
+    }
+
+
+def _bench_median_cache(club, operations):
+    """Per-operation latency of the MedianCache read/write paths"""
+    from database import MedianCache
+
+    cache = MedianCache(db_path=str(Path(tempfile.mkdtemp()) / "bench_median_cache.db"))
+    team_id = club.teams[0]["_id"]
+    player_ids = [p["_id"] for p in club.players[:operations]]
+    instances = {pid: club.test_instances(pid) for pid in player_ids[:20]}
+
+    def timed(label, func, count):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        return label, {"ops": count, "mean_us": round(elapsed / count * 1e6, 1),
+                       "ops_per_s": round(count / elapsed, 1) if elapsed else None}
+
+    tests = ["10m", "CMJ Arm Swing HT", "YYIRT1"]
+    results = dict([
+        timed("cache_team_median", lambda: [cache.cache_team_median(t, team_id, 1.0, 10)
+                                            for _ in range(operations // 3) for t in tests], operations // 3 * 3),
+        timed("get_cached_team_median", lambda: [cache.get_cached_team_median(t, team_id)
+                                                 for _ in range(operations // 3) for t in tests], operations // 3 * 3),
+        timed("cache_position_age_median", lambda: [cache.cache_position_age_median(t, "Midfielder", "22-25", 1.0, 10)
+                                                    for _ in range(operations // 3) for t in tests], operations // 3 * 3),
+        timed("get_cached_position_age_median", lambda: [cache.get_cached_position_age_median(t, "Midfielder", "22-25")
+                                                         for _ in range(operations // 3) for t in tests], operations // 3 * 3),
+        timed("cache_test_instances", lambda: [cache.cache_test_instances(pid, data)
+                                               for pid, data in instances.items()], len(instances)),
+        timed("get_cached_test_instances", lambda: [cache.get_cached_test_instances(pid)
+                                                    for pid in instances], len(instances)),
+        timed("get_cache_stats", lambda: [cache.get_cache_stats() for _ in range(10)], 10),
+    ])
+    return results
+
+
+def run_single(size, latency, jitter, iterations):
+    """Benchmark one club size in the current (already isolated) process"""
+    sys.path.insert(0, str(PROJECT_ROOT))
+    sys.path.insert(0, str(BENCH_DIR))
+    from fake_iterpro import SyntheticClub, serve_in_background
+
+    club = SyntheticClub(players=size)
+    server, base_url = serve_in_background(club, latency=latency, jitter=jitter)
+    os.environ["BASE_URL"] = base_url
+
+    import_start = time.perf_counter()
+    import app as app_module
+    import_ms = round((time.perf_counter() - import_start) * 1000, 2)
+
+    client = app_module.create_app().test_client()
+    with client.session_transaction() as session:
+        session["user"] = {"id": 1, "name": "Benchmark", "username": "bench", "role": "admin"}
+
+    player_id = club.players[0]["_id"]
+    routes = {
+        "/api/players": "/api/players",
+        "/players/<id>/athletic-performance": f"/players/{player_id}/athletic-performance",
+        "/player-report/<id>": f"/player-report/{player_id}",
+    }
+    result = {
+        "size": size,
+        "import_ms": import_ms,
+        "routes": {name: _bench_route(client, path, iterations) for name, path in routes.items()},
+        "median_cache": _bench_median_cache(club, operations=300),
+    }
+    try:
+        import resource
+        result["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    except ImportError:
+        pass
+    server.shutdown()
+    return result
+
+
+def _run_isolated(size, args):
+    """Run one size in a subprocess with its own temp dir, cache dir and median_cache.db"""
+    workdir = tempfile.mkdtemp(prefix=f"sc_bench_{size}_")
+    # The fake Iterpro has no quota to protect, so outbound rate limiting stays off
+    env = dict(os.environ, TMPDIR=workdir, LOG_LEVEL="WARNING", ITERPRO_RATE_LIMITS="off")
+    if args.backend:
+        env["CACHE_BACKEND"] = args.backend
+        # Without a configured database the sql backend runs against a local SQLite file
+        env.setdefault("DATABASE_URL", f"sqlite:///{Path(workdir) / 'shared_cache.db'}")
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--child", str(size),
+           "--latency", str(args.latency), "--jitter", str(args.jitter),
+           "--iterations", str(args.iterations)]
+    output = subprocess.check_output(cmd, cwd=workdir, env=env, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _load_previous(size, settings):
+    if not RESULTS_FILE.exists():
+        return None
+    previous = None
+    with open(RESULTS_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("size") == size and entry.get("settings") == settings:
+                previous = entry
+    return previous
+
+
+def _compare(current, previous):
+    """Return human-readable regressions between two runs"""
+    regressions = []
+    for route, metrics in current["routes"].items():
+        before = previous.get("routes", {}).get(route, {})
+        for key in ("cold_ms", "warm_p50_ms", "warm_p95_ms"):
+            old, new = before.get(key), metrics.get(key)
+            if old and new and new > old * (1 + REGRESSION_THRESHOLD):
+                regressions.append(f"{route} {key}: {old} -> {new} ms")
+    for op, metrics in current["median_cache"].items():
+        old = previous.get("median_cache", {}).get(op, {}).get("mean_us")
+        new = metrics.get("mean_us")
+        if old and new and new > old * (1 + REGRESSION_THRESHOLD):
+            regressions.append(f"MedianCache.{op}: {old} -> {new} us")
+    return regressions
+
+
+def _print_report(entry):
+    print(f"\n== {entry['size']} players (commit {entry['commit']}, import {entry['import_ms']} ms) ==")
+    print(f"{'route':40} {'status':>6} {'cold ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>8} {'peak KB':>9}")
+    for route, m in entry["routes"].items():
+        print(f"{route:40} {m['status']:>6} {m['cold_ms']:>9} {m['warm_p50_ms']:>8} {m['warm_p95_ms']:>8} "
+              f"{m['throughput_rps']:>8} {m['cold_peak_alloc_kb']:>9}")
+    print(f"{'MedianCache op':40} {'mean us':>9} {'ops/s':>10}")
+    for op, m in entry["median_cache"].items():
+        print(f"{op:40} {m['mean_us']:>9} {m['ops_per_s']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run offline benchmarks against a fake Iterpro server")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake Iterpro latency (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Fake Iterpro jitter (seconds)")
+    parser.add_argument("--iterations", type=int, default=20, help="Warm requests per route")
+    parser.add_argument("--backend", choices=["memory", "file", "sqlite", "sql"],
+                        help="Cache backend for both cache layers (default: per-layer defaults)")
+    parser.add_argument("--no-save", action="store_true", help="Do not append to results history")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_single(args.child, args.latency, args.jitter, args.iterations)))
+        return
+
+    settings = {"latency": args.latency, "jitter": args.jitter, "iterations": args.iterations}
+    if args.backend:
+        settings["backend"] = args.backend
+    commit = _git_commit()
+    found_regressions = False
+    for size in args.sizes:
+        entry = _run_isolated(size, args)
+        entry.update(commit=commit, timestamp=datetime.now().isoformat(timespec="seconds"), settings=settings)
+        _print_report(entry)
+
+        previous = _load_previous(size, settings)
+        if previous:
+            regressions = _compare(entry, previous)
+            if regressions:
+                found_regressions = True
+                print(f"Regressions vs {previous['commit']}:")
+                for line in regressions:
+                    print(f"  - {line}")
+            else:
+                print(f"No regressions vs {previous['commit']}")
+
+        if not args.no_save:
+            RESULTS_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(RESULTS_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    sys.exit(1 if found_regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
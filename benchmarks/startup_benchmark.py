@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark and import-time budget.
+
+Each scenario runs in fresh interpreters (own temp cwd, so no cache files are
+shared) and reports the median of several runs:
+
+    import_iterpro_client   import iterpro_client (what CLI scripts pay)
+    import_app              import app (what each gunicorn worker pays before create_app())
+    first_request           create_app() and serve GET /login through the test client
+
+It also checks that importing app neither wires the app (create_app) nor builds
+any of the lazy clients and caches (see utils/lazy.py). The run fails when a median exceeds its budget, so a new
+eager import or an init at import time shows up in CI.
+
+Usage:
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --repeat 10 --budget import_app=300
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = BENCH_DIR.parent
+
+# Milliseconds; generous enough for a laptop, tight enough to catch NumPy or a DB open at import
+DEFAULT_BUDGETS = {
+    "import_iterpro_client": 200,
+    "import_app": 350,
+    "first_request": 450,
+}
+LAZY_OBJECTS = ("median_cache", "measurement_store", "rate_limiter", "response_cache", "transport")
+
+
+def run_child(scenario):
+    """Time one scenario in this (fresh) interpreter"""
+    sys.path.insert(0, str(PROJECT_ROOT))
+    start = time.perf_counter()
+    if scenario == "import_iterpro_client":
+        import iterpro_client
+        module = iterpro_client
+    else:
+        import app as module
+        if scenario == "import_app" and module._initialized:
+            raise SystemExit("import app ran create_app()")
+        if scenario == "first_request":
+            client = module.create_app().test_client()
+            status = client.get("/login").status_code
+            if status != 200:
+                raise SystemExit(f"GET /login returned {status}")
+    elapsed = time.perf_counter() - start
+    import iterpro_client
+    built = [name for name in LAZY_OBJECTS if getattr(iterpro_client, name).initialized]
+    return {"ms": elapsed * 1000, "built": built}
+
+
+def _run_isolated(scenario):
+    env = dict(os.environ, CACHE_MAINTENANCE_INTERVAL="0")
+    with tempfile.TemporaryDirectory() as cwd:
+        start = time.perf_counter()
+        output = subprocess.check_output([sys.executable, str(Path(__file__).resolve()), "--child", scenario],
+                                         cwd=cwd, env=env, text=True)
+        wall = time.perf_counter() - start
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_ms"] = wall * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and startup time against budgets")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per scenario")
+    parser.add_argument("--budget", action="append", default=[], metavar="SCENARIO=MS",
+                        help="Override a budget, e.g. import_app=300")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child)))
+        return 0
+
+    budgets = dict(DEFAULT_BUDGETS)
+    for override in args.budget:
+        name, _, value = override.partition("=")
+        if name not in budgets:
+            parser.error(f"unknown scenario {name!r}")
+        budgets[name] = float(value)
+
+    failures = []
+    print(f"{'scenario':<24}{'median ms':>10}{'min ms':>9}{'process ms':>12}{'budget':>9}")
+    for scenario, budget in budgets.items():
+        runs = [_run_isolated(scenario) for _ in range(args.repeat)]
+        times = [run["ms"] for run in runs]
+        median = statistics.median(times)
+        process = statistics.median(run["process_ms"] for run in runs)
+        status = "" if median <= budget else "  OVER BUDGET"
+        print(f"{scenario:<24}{median:>10.1f}{min(times):>9.1f}{process:>12.1f}{budget:>9.0f}{status}")
+        if status:
+            failures.append(f"{scenario}: {median:.1f} ms > {budget:.0f} ms")
+        built = sorted({name for run in runs for name in run["built"]})
+        if built and scenario != "first_request":
+            failures.append(f"{scenario}: built at import: {', '.join(built)}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,658 @@
+"""
+Cache backends shared by MedianCache (database.py) and the Iterpro response
+cache (iterpro_client.py).
+
+Every backend stores JSON-serializable values under (namespace, key) with an
+optional TTL and implements the same interface:
+
+    get(namespace, key)                  -> value or None
+    get_many(namespace, keys)            -> {key: value} for the keys found
+    set(namespace, key, value, ttl)
+    set_many(namespace, items, ttl)      items is {key: value}
+    delete(namespace, keys=None)         keys=None drops the whole namespace
+    keys(namespace)                      -> list of live keys
+    expire()                             -> number of expired entries removed
+    stats()                              -> {namespace: {total, expired, bytes}}
+    evict(max_bytes, max_rows, protected) -> least recently used entries removed to fit the budget
+    maintain()                           -> storage housekeeping (vacuum, statistics), returns a summary
+
+Implementations: MemoryBackend (per process), FileBackend (one file per entry,
+shared by the workers on one node), SQLiteBackend (one file, shared by the
+workers on one node) and SQLBackend (any SQLAlchemy database, shared by every
+node). The persistent backends store values as compact, compressed blobs
+(utils/serialization.py). Reads are remembered in memory and written to the
+entries' last-access time in batches (flush_access), so lookups stay
+read-only while eviction can still go least recently used first.
+
+Environment variables:
+    CACHE_BACKEND            Default backend for both layers: memory | file | sqlite | sql
+    MEDIAN_CACHE_BACKEND     Override for MedianCache (default: sqlite)
+    RESPONSE_CACHE_BACKEND   Override for the Iterpro response cache (default: file)
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from utils.serialization import dumps, loads
+
+# SQLite limits the number of bound parameters per statement
+_SQLITE_CHUNK = 500
+# Pending last-access updates are written once this many have piled up
+ACCESS_FLUSH_SIZE = 1000
+
+
+def _expires_at(ttl):
+    return time.time() + ttl if ttl else None
+
+
+def _chunks(items, size=_SQLITE_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class CacheBackend:
+    """Base class; subclasses implement get_many, set_many, delete, keys, expire, stats and usage"""
+
+    name = "base"
+    _touched = None
+    _touch_lock = threading.Lock()
+
+    def get(self, namespace, key):
+        return self.get_many(namespace, [key]).get(key)
+
+    def set(self, namespace, key, value, ttl=None):
+        self.set_many(namespace, {key: value}, ttl)
+
+    def get_many(self, namespace, keys):
+        raise NotImplementedError
+
+    def set_many(self, namespace, items, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, namespace, keys=None):
+        raise NotImplementedError
+
+    def keys(self, namespace):
+        raise NotImplementedError
+
+    def expire(self):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+    def describe(self):
+        return self.name
+
+    def usage(self):
+        """[(namespace, key, bytes, last_used)] for every stored entry"""
+        raise NotImplementedError
+
+    def _touch(self, namespace, keys):
+        """Remember that keys were read; written by flush_access()"""
+        if not keys:
+            return
+        now = time.time()
+        with self._touch_lock:
+            if self._touched is None:
+                self._touched = {}
+            for key in keys:
+                self._touched[(namespace, key)] = now
+            full = len(self._touched) >= ACCESS_FLUSH_SIZE
+        if full:
+            self.flush_access()
+
+    def _take_touched(self):
+        with self._touch_lock:
+            touched, self._touched = self._touched or {}, {}
+        return touched
+
+    def flush_access(self):
+        """Write pending last-access times; returns the number written"""
+        return len(self._take_touched())
+
+    def evict(self, max_bytes=0, max_rows=0, protected=()):
+        """Delete least recently used entries until the namespaces outside protected fit the budget (0 = no limit)"""
+        if not max_bytes and not max_rows:
+            return 0
+        self.flush_access()
+        entries = [e for e in self.usage() if e[0] not in protected]
+        rows, size = len(entries), sum(e[2] for e in entries)
+
+        def within_budget():
+            return (not max_rows or rows <= max_rows) and (not max_bytes or size <= max_bytes)
+
+        doomed = {}
+        for namespace, key, entry_bytes, _ in sorted(entries, key=lambda e: e[3]):
+            if within_budget():
+                break
+            doomed.setdefault(namespace, []).append(key)
+            rows -= 1
+            size -= entry_bytes
+        return sum(self.delete(namespace, keys) for namespace, keys in doomed.items())
+
+    def maintain(self):
+        """Storage housekeeping after expiry and eviction; returns a summary dict"""
+        self.flush_access()
+        return {}
+
+
+class MemoryBackend(CacheBackend):
+    """Per-process dict; fastest, but not shared between gunicorn workers"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, namespace, keys):
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._data.get((namespace, key))
+                if entry and (entry[1] is None or entry[1] > now):
+                    found[key] = entry[0]
+                    self._data[(namespace, key)] = (entry[0], entry[1], now)
+        return found
+
+    def set_many(self, namespace, items, ttl=None):
+        now = time.time()
+        expires_at = _expires_at(ttl)
+        with self._lock:
+            for key, value in items.items():
+                self._data[(namespace, key)] = (value, expires_at, now)
+
+    def delete(self, namespace, keys=None):
+        with self._lock:
+            targets = [k for k in self._data if k[0] == namespace] if keys is None \
+                else [(namespace, key) for key in keys]
+            removed = 0
+            for target in targets:
+                if self._data.pop(target, None) is not None:
+                    removed += 1
+        return removed
+
+    def keys(self, namespace):
+        now = time.time()
+        with self._lock:
+            return [k[1] for k, v in self._data.items() if k[0] == namespace and (v[1] is None or v[1] > now)]
+
+    def expire(self):
+        now = time.time()
+        with self._lock:
+            expired = [k for k, v in self._data.items() if v[1] is not None and v[1] <= now]
+            for k in expired:
+                del self._data[k]
+        return len(expired)
+
+    def stats(self):
+        now = time.time()
+        result = {}
+        with self._lock:
+            for (namespace, _), (_, expires_at, _) in self._data.items():
+                ns = result.setdefault(namespace, {"total": 0, "expired": 0, "bytes": None})
+                ns["total"] += 1
+                if expires_at is not None and expires_at <= now:
+                    ns["expired"] += 1
+        return result
+
+    def usage(self):
+        # Sizes are unknown in memory; only the row budget applies
+        with self._lock:
+            return [(namespace, key, 0, entry[2]) for (namespace, key), entry in self._data.items()]
+
+
+class FileBackend(CacheBackend):
+    """One serialized file per entry (<namespace>.<key>.cache) in a directory"""
+
+    name = "file"
+    suffix = ".cache"
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def describe(self):
+        return f"file:{self.directory}"
+
+    def _path(self, namespace, key):
+        safe_key = key.replace('/', '_').replace('\\', '_').replace(':', '_')
+        return self.directory / f"{namespace}.{safe_key}{self.suffix}"
+
+    def _read(self, path):
+        """Return (data, expires_at) or None for missing/corrupt files"""
+        try:
+            with open(path, 'rb') as f:
+                entry = loads(f.read())
+            return entry['data'], entry['expires_at']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def get_many(self, namespace, keys):
+        now = time.time()
+        found = {}
+        for key in keys:
+            path = self._path(namespace, key)
+            entry = self._read(path)
+            if entry is None:
+                continue
+            data, expires_at = entry
+            if expires_at is None or expires_at > now:
+                found[key] = data
+            else:
+                path.unlink(missing_ok=True)
+        self._touch(namespace, list(found))
+        return found
+
+    def set_many(self, namespace, items, ttl=None):
+        expires_at = _expires_at(ttl)
+        for key, value in items.items():
+            path = self._path(namespace, key)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(dumps({'data': value, 'timestamp': time.time(), 'expires_at': expires_at}))
+            os.replace(tmp_path, path)
+
+    def _files(self, namespace=None):
+        pattern = f"{namespace}.*{self.suffix}" if namespace else f"*{self.suffix}"
+        return self.directory.glob(pattern)
+
+    def delete(self, namespace, keys=None):
+        paths = list(self._files(namespace)) if keys is None else [self._path(namespace, k) for k in keys]
+        removed = 0
+        for path in paths:
+            try:
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def keys(self, namespace):
+        # File names are lossy (':' and '/' are replaced), so keys come back sanitized
+        prefix = f"{namespace}."
+        return [p.stem[len(prefix):] for p in self._files(namespace)]
+
+    def expire(self):
+        now = time.time()
+        # Indented JSON files written by earlier versions are never read again
+        removed = 0
+        for path in self.directory.glob("*.json"):
+            path.unlink(missing_ok=True)
+            removed += 1
+        for path in self._files():
+            entry = self._read(path)
+            if entry is None or (entry[1] is not None and entry[1] <= now):
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def flush_access(self):
+        # The access time is the file's atime; mtime stays the write time
+        touched = self._take_touched()
+        for (namespace, key), accessed_at in touched.items():
+            path = self._path(namespace, key)
+            try:
+                os.utime(path, (accessed_at, path.stat().st_mtime))
+            except FileNotFoundError:
+                pass
+        return len(touched)
+
+    def usage(self):
+        result = []
+        for path in self._files():
+            namespace, _, key = path.stem.partition('.')
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            result.append((namespace, key, st.st_size, max(st.st_atime, st.st_mtime)))
+        return result
+
+    def stats(self):
+        now = time.time()
+        result = {}
+        for path in self._files():
+            namespace = path.name.split('.', 1)[0]
+            ns = result.setdefault(namespace, {"total": 0, "expired": 0, "bytes": 0})
+            ns["total"] += 1
+            ns["bytes"] += path.stat().st_size
+            entry = self._read(path)
+            if entry is None or (entry[1] is not None and entry[1] <= now):
+                ns["expired"] += 1
+        return result
+
+
+class SQLiteBackend(CacheBackend):
+    """Single cache_entries table in a SQLite file, one connection per thread"""
+
+    name = "sqlite"
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._init_database()
+
+    def describe(self):
+        return f"sqlite:{self.db_path}"
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        # Connections must not cross a fork (e.g. gunicorn --preload)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            # Must come before WAL creates the file; maintain() converts files created without it
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_database(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    cache_key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL,  -- unix time, NULL = never expires
+                    last_access REAL,  -- unix time of the last read (flushed in batches)
+                    PRIMARY KEY (namespace, cache_key)
+                ) WITHOUT ROWID
+            ''')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(cache_entries)')}
+            if 'last_access' not in columns:
+                conn.execute('ALTER TABLE cache_entries ADD COLUMN last_access REAL')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_entries_expires ON cache_entries(expires_at)')
+
+    def get_many(self, namespace, keys):
+        conn = self._connect()
+        now = time.time()
+        found = {}
+        for chunk in _chunks(keys):
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f'SELECT cache_key, value FROM cache_entries WHERE namespace = ? AND cache_key IN ({placeholders}) '
+                f'AND (expires_at IS NULL OR expires_at > ?)',
+                (namespace, *chunk, now),
+            ).fetchall()
+            for key, raw in rows:
+                found[key] = loads(raw)
+        self._touch(namespace, list(found))
+        return found
+
+    def set_many(self, namespace, items, ttl=None):
+        now = time.time()
+        expires_at = _expires_at(ttl)
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO cache_entries (namespace, cache_key, value, created_at, expires_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(namespace, key, dumps(value), now, expires_at, now) for key, value in items.items()],
+            )
+
+    def flush_access(self):
+        touched = self._take_touched()
+        if touched:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    'UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND cache_key = ?',
+                    [(at, namespace, key) for (namespace, key), at in touched.items()],
+                )
+        return len(touched)
+
+    def usage(self):
+        return self._connect().execute(
+            'SELECT namespace, cache_key, LENGTH(value), COALESCE(last_access, created_at) FROM cache_entries'
+        ).fetchall()
+
+    def maintain(self):
+        """Flush access times, give free pages back to the OS and refresh the planner statistics"""
+        self.flush_access()
+        conn = self._connect()
+        summary = {}
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            # Created before incremental vacuum: convert once (rewrites the file)
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('VACUUM')
+            summary['vacuum'] = 'full'
+        else:
+            free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if free_pages:
+                conn.execute('PRAGMA incremental_vacuum').fetchall()
+            summary['pages_freed'] = free_pages
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        summary['file_bytes'] = conn.execute('PRAGMA page_count').fetchone()[0] * page_size
+        return summary
+
+    def delete(self, namespace, keys=None):
+        conn = self._connect()
+        with conn:
+            if keys is None:
+                return conn.execute('DELETE FROM cache_entries WHERE namespace = ?', (namespace,)).rowcount
+            removed = 0
+            for chunk in _chunks(keys):
+                placeholders = ",".join("?" * len(chunk))
+                removed += conn.execute(
+                    f'DELETE FROM cache_entries WHERE namespace = ? AND cache_key IN ({placeholders})',
+                    (namespace, *chunk),
+                ).rowcount
+            return removed
+
+    def keys(self, namespace):
+        rows = self._connect().execute(
+            'SELECT cache_key FROM cache_entries WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (namespace, time.time()),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def expire(self):
+        conn = self._connect()
+        with conn:
+            return conn.execute('DELETE FROM cache_entries WHERE expires_at <= ?', (time.time(),)).rowcount
+
+    def stats(self):
+        rows = self._connect().execute('''
+            SELECT namespace, COUNT(*), SUM(CASE WHEN expires_at <= ? THEN 1 ELSE 0 END), SUM(LENGTH(value))
+            FROM cache_entries GROUP BY namespace
+        ''', (time.time(),)).fetchall()
+        return {ns: {"total": total, "expired": expired or 0, "bytes": size or 0} for ns, total, expired, size in rows}
+
+
+class SQLBackend(CacheBackend):
+    """cache_entries table in the shared SQLAlchemy database (db/db.py), using its connection pool"""
+
+    name = "sql"
+
+    def __init__(self, engine=None):
+        from sqlalchemy import Column, Float, LargeBinary, MetaData, String, Table
+        from sqlalchemy.dialects import mysql
+
+        if engine is None:
+            from db.db import get_engine
+            engine = get_engine()
+        self.engine = engine
+        metadata = MetaData()
+        self.table = Table(
+            "cache_entries", metadata,
+            Column("namespace", String(64), primary_key=True),
+            Column("cache_key", String(255), primary_key=True),
+            # Test histories easily exceed MySQL's 64 KB BLOB limit
+            Column("value", LargeBinary().with_variant(mysql.LONGBLOB(), "mysql"), nullable=False),
+            Column("created_at", Float, nullable=False),
+            Column("expires_at", Float, index=True),
+            Column("last_access", Float),
+        )
+        metadata.create_all(engine)
+        self._add_missing_columns()
+
+    def _add_missing_columns(self):
+        """Tables created before last_access existed get the column added in place"""
+        from sqlalchemy import inspect, text
+
+        columns = {c["name"] for c in inspect(self.engine).get_columns("cache_entries")}
+        if "last_access" not in columns:
+            with self.engine.begin() as conn:
+                conn.execute(text("ALTER TABLE cache_entries ADD COLUMN last_access FLOAT"))
+
+    def describe(self):
+        return f"sql:{self.engine.url.render_as_string(hide_password=True)}"
+
+    def get_many(self, namespace, keys):
+        from sqlalchemy import or_, select
+
+        t = self.table
+        now = time.time()
+        found = {}
+        with self.engine.connect() as conn:
+            for chunk in _chunks(keys):
+                rows = conn.execute(
+                    select(t.c.cache_key, t.c.value).where(
+                        t.c.namespace == namespace, t.c.cache_key.in_(chunk),
+                        or_(t.c.expires_at.is_(None), t.c.expires_at > now))
+                ).all()
+                for key, raw in rows:
+                    found[key] = loads(raw)
+        self._touch(namespace, list(found))
+        return found
+
+    def _upsert_statement(self, rows):
+        from sqlalchemy import delete, insert
+
+        t = self.table
+        dialect = self.engine.dialect.name
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert as mysql_insert
+            stmt = mysql_insert(t).values(rows)
+            return [stmt.on_duplicate_key_update(value=stmt.inserted.value, created_at=stmt.inserted.created_at,
+                                                 expires_at=stmt.inserted.expires_at,
+                                                 last_access=stmt.inserted.last_access)]
+        if dialect in ("sqlite", "postgresql"):
+            module = __import__(f"sqlalchemy.dialects.{dialect}", fromlist=["insert"])
+            stmt = module.insert(t).values(rows)
+            return [stmt.on_conflict_do_update(
+                index_elements=[t.c.namespace, t.c.cache_key],
+                set_={"value": stmt.excluded.value, "created_at": stmt.excluded.created_at,
+                      "expires_at": stmt.excluded.expires_at, "last_access": stmt.excluded.last_access})]
+        # Generic fallback: replace inside the same transaction
+        namespace = rows[0]["namespace"]
+        return [delete(t).where(t.c.namespace == namespace, t.c.cache_key.in_([r["cache_key"] for r in rows])),
+                insert(t).values(rows)]
+
+    def set_many(self, namespace, items, ttl=None):
+        if not items:
+            return
+        now = time.time()
+        expires_at = _expires_at(ttl)
+        rows = [{"namespace": namespace, "cache_key": key, "value": dumps(value),
+                 "created_at": now, "expires_at": expires_at, "last_access": now} for key, value in items.items()]
+        with self.engine.begin() as conn:
+            for chunk in _chunks(rows):
+                for stmt in self._upsert_statement(chunk):
+                    conn.execute(stmt)
+
+    def delete(self, namespace, keys=None):
+        from sqlalchemy import delete
+
+        t = self.table
+        with self.engine.begin() as conn:
+            if keys is None:
+                return conn.execute(delete(t).where(t.c.namespace == namespace)).rowcount
+            return sum(
+                conn.execute(delete(t).where(t.c.namespace == namespace, t.c.cache_key.in_(chunk))).rowcount
+                for chunk in _chunks(keys)
+            )
+
+    def keys(self, namespace):
+        from sqlalchemy import or_, select
+
+        t = self.table
+        with self.engine.connect() as conn:
+            return list(conn.execute(select(t.c.cache_key).where(
+                t.c.namespace == namespace, or_(t.c.expires_at.is_(None), t.c.expires_at > time.time()))).scalars())
+
+    def expire(self):
+        from sqlalchemy import delete
+
+        with self.engine.begin() as conn:
+            return conn.execute(delete(self.table).where(self.table.c.expires_at <= time.time())).rowcount
+
+    def stats(self):
+        from sqlalchemy import case, func, select
+
+        t = self.table
+        expired = func.sum(case((t.c.expires_at <= time.time(), 1), else_=0))
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(t.c.namespace, func.count(), expired, func.sum(func.length(t.c.value)))
+                                .group_by(t.c.namespace)).all()
+        return {ns: {"total": total, "expired": int(exp or 0), "bytes": int(size or 0)} for ns, total, exp, size in rows}
+
+    def flush_access(self):
+        from sqlalchemy import bindparam, update
+
+        touched = self._take_touched()
+        if touched:
+            t = self.table
+            stmt = update(t).where(t.c.namespace == bindparam("ns"), t.c.cache_key == bindparam("key")) \
+                .values(last_access=bindparam("at"))
+            with self.engine.begin() as conn:
+                conn.execute(stmt, [{"ns": ns, "key": key, "at": at} for (ns, key), at in touched.items()])
+        return len(touched)
+
+    def usage(self):
+        from sqlalchemy import func, select
+
+        t = self.table
+        with self.engine.connect() as conn:
+            return [tuple(row) for row in conn.execute(select(
+                t.c.namespace, t.c.cache_key, func.length(t.c.value), func.coalesce(t.c.last_access, t.c.created_at)))]
+
+    def maintain(self):
+        """Flush access times and refresh planner statistics; the server reclaims space itself"""
+        from sqlalchemy import text
+
+        self.flush_access()
+        statement = {"mysql": "ANALYZE TABLE cache_entries", "postgresql": "ANALYZE cache_entries",
+                     "sqlite": "ANALYZE cache_entries"}.get(self.engine.dialect.name)
+        if statement:
+            with self.engine.begin() as conn:
+                conn.execute(text(statement))
+        return {}
+
+
+def create_backend(kind, path=None):
+    """Build a backend by name; path is the directory (file) or database file (sqlite)"""
+    kind = kind.lower()
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "file":
+        return FileBackend(path)
+    if kind == "sqlite":
+        return SQLiteBackend(path)
+    if kind == "sql":
+        return SQLBackend()
+    raise ValueError(f"Unknown cache backend '{kind}' (expected memory, file, sqlite or sql)")
+
+
+def backend_from_env(layer_variable, default_kind, default_path):
+    """Backend for one cache layer: <layer_variable>, then CACHE_BACKEND, then the layer default"""
+    kind = os.getenv(layer_variable) or os.getenv("CACHE_BACKEND") or default_kind
+    if kind == "file" and str(default_path).endswith(".db"):
+        # MedianCache has no file layout of its own; keep it in SQLite next to the requested path
+        kind = "sqlite"
+    if kind == "sqlite" and not str(default_path).endswith(".db"):
+        default_path = Path(default_path) / "cache.db"
+    return create_backend(kind, default_path)
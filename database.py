@@ -1,362 +1,340 @@
-import sqlite3
-import json
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
+import uuid
+from cache_backends import backend_from_env
+from distributions import Distribution
+from roster import RosterIndex, age_bucket
+from utils.metrics import timed, record_cache_lookup
+
+# Expirations in seconds
+MEDIAN_TTL = 7 * 24 * 3600        # 7 days for median values
+TEST_DATA_TTL = 24 * 3600         # 1 day for test instances, batch test data and report charts
+
+# Size budget enforced by run_maintenance (least recently used entries go first; 0 = unlimited)
+MEDIAN_CACHE_MAX_BYTES = int(os.getenv("MEDIAN_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+MEDIAN_CACHE_MAX_ROWS = int(os.getenv("MEDIAN_CACHE_MAX_ROWS", "200000"))
+INVALIDATION_LOG_KEEP = 200       # most recent invalidation log entries kept
+
+# Backend namespaces used by MedianCache
+TEAM_MEDIANS = "team_median"
+POSITION_AGE_MEDIANS = "position_age_median"
+TEST_INSTANCES = "test_instances"
+TEST_DATA = "test_data"
+REPORT_CHARTS = "report_charts"
+INVALIDATION_LOG = "invalidation_log"
+DATA_VERSIONS = "data_versions"   # roster / medians version tokens, never expire
+CACHE_NAMESPACES = (TEAM_MEDIANS, POSITION_AGE_MEDIANS, TEST_INSTANCES, TEST_DATA, REPORT_CHARTS)
 
 class MedianCache:
-    def __init__(self, db_path="median_cache.db"):
+    def __init__(self, db_path="median_cache.db", backend=None):
         self.db_path = db_path
-        self.init_database()
+        self.backend = backend or backend_from_env("MEDIAN_CACHE_BACKEND", "sqlite", db_path)
     
-    def init_database(self):
-        """Initialize the database with required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create team median cache table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS team_median_cache (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                test_name TEXT NOT NULL,
-                team_id TEXT NOT NULL,
-                median_value REAL NOT NULL,
-                player_count INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP,
-                UNIQUE(test_name, team_id)
-            )
-        ''')
-        
-        # Create position-age median cache table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS position_age_median_cache (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                test_name TEXT NOT NULL,
-                position TEXT NOT NULL,
-                age_range TEXT NOT NULL,  -- e.g., "22-25", "26-29"
-                median_value REAL NOT NULL,
-                player_count INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP,
-                UNIQUE(test_name, position, age_range)
-            )
-        ''')
-        
-        # Create cache invalidation log
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cache_invalidation_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                invalidated_by TEXT NOT NULL,
-                invalidated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                reason TEXT
-            )
-        ''')
-        
-        # Create test instances cache table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS test_instances_cache (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                player_id TEXT NOT NULL,
-                test_instances_data TEXT NOT NULL,  -- JSON string
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP,
-                UNIQUE(player_id)
-            )
-        ''')
-        
-        # Create test data cache table (for batch player test data)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS test_data_cache (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cache_key TEXT NOT NULL,  -- e.g., "all_players" or "team_123"
-                test_data TEXT NOT NULL,  -- JSON string
-                player_count INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP,
-                UNIQUE(cache_key)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+    @staticmethod
+    def _key(*parts):
+        return "|".join(str(part) for part in parts)
     
+    @timed("median_cache", op="get_cached_team_median")
     def get_cached_team_median(self, test_name, team_id):
         """Get cached team median value if it exists and is not expired"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT median_value, expires_at 
-            FROM team_median_cache 
-            WHERE test_name = ? AND team_id = ?
-        ''', (test_name, team_id))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            median_value, expires_at = result
-            expires_at = datetime.fromisoformat(expires_at)
-            
-            # Check if cache is still valid (7 days expiration)
-            if expires_at > datetime.now():
-                return median_value
-        
-        return None
+        entry = self.backend.get(TEAM_MEDIANS, self._key(test_name, team_id))
+        record_cache_lookup('median_cache', 'team_median', entry is not None)
+        return entry['median'] if entry is not None else None
     
+    @timed("median_cache", op="get_cached_position_age_median")
     def get_cached_position_age_median(self, test_name, position, age_range):
         """Get cached position-age median value if it exists and is not expired"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT median_value, expires_at 
-            FROM position_age_median_cache 
-            WHERE test_name = ? AND position = ? AND age_range = ?
-        ''', (test_name, position, age_range))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            median_value, expires_at = result
-            expires_at = datetime.fromisoformat(expires_at)
-            
-            # Check if cache is still valid (7 days expiration)
-            if expires_at > datetime.now():
-                return median_value
-        
-        return None
+        entry = self.backend.get(POSITION_AGE_MEDIANS, self._key(test_name, position, age_range))
+        record_cache_lookup('median_cache', 'position_age_median', entry is not None)
+        return entry['median'] if entry is not None else None
     
-    def cache_team_median(self, test_name, team_id, median_value, player_count):
-        """Cache team median value with 7-day expiration"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        expires_at = datetime.now() + timedelta(days=7)
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO team_median_cache 
-            (test_name, team_id, median_value, player_count, expires_at)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (test_name, team_id, median_value, player_count, expires_at))
-        
-        conn.commit()
-        conn.close()
+    @timed("median_cache", op="get_cached_team_distribution")
+    def get_cached_team_distribution(self, test_name, team_id):
+        """Cached team distribution (see distributions.py), None if missing or cached without one"""
+        entry = self.backend.get(TEAM_MEDIANS, self._key(test_name, team_id))
+        record_cache_lookup('median_cache', 'team_distribution', entry is not None and 'distribution' in entry)
+        return Distribution.unpack(entry['distribution']) if entry and 'distribution' in entry else None
     
-    def cache_position_age_median(self, test_name, position, age_range, median_value, player_count):
-        """Cache position-age median value with 7-day expiration"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        expires_at = datetime.now() + timedelta(days=7)
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO position_age_median_cache 
-            (test_name, position, age_range, median_value, player_count, expires_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (test_name, position, age_range, median_value, player_count, expires_at))
-        
-        conn.commit()
-        conn.close()
+    @timed("median_cache", op="get_cached_position_age_distribution")
+    def get_cached_position_age_distribution(self, test_name, position, age_range):
+        """Cached position-age distribution, None if missing or cached without one"""
+        entry = self.backend.get(POSITION_AGE_MEDIANS, self._key(test_name, position, age_range))
+        record_cache_lookup('median_cache', 'position_age_distribution', entry is not None and 'distribution' in entry)
+        return Distribution.unpack(entry['distribution']) if entry and 'distribution' in entry else None
+    
+    @staticmethod
+    def _median_entry(median_value, player_count, distribution):
+        entry = {'median': median_value, 'player_count': player_count}
+        if distribution is not None:
+            entry['distribution'] = distribution.pack()
+        return entry
     
+    @timed("median_cache", op="cache_team_median")
+    def cache_team_median(self, test_name, team_id, median_value, player_count, distribution=None):
+        """Cache team median value (and the distribution it came from) with 7-day expiration"""
+        self.backend.set(TEAM_MEDIANS, self._key(test_name, team_id),
+                         self._median_entry(median_value, player_count, distribution), MEDIAN_TTL)
+    
+    @timed("median_cache", op="cache_position_age_median")
+    def cache_position_age_median(self, test_name, position, age_range, median_value, player_count, distribution=None):
+        """Cache position-age median value (and the distribution it came from) with 7-day expiration"""
+        self.backend.set(POSITION_AGE_MEDIANS, self._key(test_name, position, age_range),
+                         self._median_entry(median_value, player_count, distribution), MEDIAN_TTL)
+    
+    @timed("median_cache", op="update_distributions")
+    def update_distributions(self, player, test_results, tests):
+        """
+        Apply a player's new latest values to the cached team and cohort entries of the given tests
+
+        player is a normalized roster record and test_results their TestResults.
+        Each matching entry gets the player's latest value (or loses it when
+        there is none any more) and its median recomputed, without touching the
+        other players. Entries cached without a distribution are dropped
+        instead. Returns the number of entries updated or dropped.
+        """
+        lowered = {t.lower() for t in tests}
+        keys = {
+            TEAM_MEDIANS: [k for k in self.backend.keys(TEAM_MEDIANS)
+                           if player.team_id and k.rsplit("|", 1)[1] == player.team_id],
+            POSITION_AGE_MEDIANS: [k for k in self.backend.keys(POSITION_AGE_MEDIANS)
+                                   if tuple(k.rsplit("|", 2)[1:]) == RosterIndex.cohort_key(player)],
+        }
+        changed = 0
+        for namespace, namespace_keys in keys.items():
+            for key, entry in self.backend.get_many(namespace, namespace_keys).items():
+                test_name = key.rsplit("|", 1 if namespace == TEAM_MEDIANS else 2)[0]
+                name = test_name.lower()
+                if not any(t in name or name in t for t in lowered):
+                    continue
+                changed += 1
+                if 'distribution' not in entry:
+                    self.backend.delete(namespace, [key])
+                    continue
+                distribution = Distribution.unpack(entry['distribution'])
+                value = test_results.latest(test_name)
+                if value is None:
+                    distribution.remove(player.id)
+                else:
+                    distribution.add(player.id, value)
+                if not len(distribution):
+                    self.backend.delete(namespace, [key])
+                    continue
+                self.backend.set(namespace, key, self._median_entry(
+                    round(distribution.median(), 2), len(distribution), distribution), MEDIAN_TTL)
+        return changed
+    
+    @timed("median_cache", op="invalidate_all_cache")
     def invalidate_all_cache(self, invalidated_by, reason="Manual invalidation"):
         """Invalidate all cached data"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Clear all cache
-        cursor.execute('DELETE FROM team_median_cache')
-        cursor.execute('DELETE FROM position_age_median_cache')
-        cursor.execute('DELETE FROM test_instances_cache')
-        cursor.execute('DELETE FROM test_data_cache')
-        
-        # Log the invalidation
-        cursor.execute('''
-            INSERT INTO cache_invalidation_log (invalidated_by, reason)
-            VALUES (?, ?)
-        ''', (invalidated_by, reason))
-        
-        conn.commit()
-        conn.close()
+        for namespace in CACHE_NAMESPACES:
+            self.backend.delete(namespace)
+        self.bump_data_version('medians')
+        self._log_invalidation(invalidated_by, reason)
     
+    @timed("median_cache", op="invalidate")
+    def invalidate(self, invalidated_by, reason="Scoped invalidation", players=(), teams=(), cohorts=(), tests=(),
+                   log=True, medians=True):
+        """
+        Invalidate only the entries that depend on the given scope; returns the number removed
+
+        players are normalized roster records (see roster.py). Through the
+        dependency graph a player's data feeds their test instances, report
+        charts, the test batches that include them, their team's medians and
+        their cohort's position/age medians. teams and cohorts ((position
+        group, age bucket) pairs) select medians directly. tests narrows the
+        medians to those tests (matched like extract_latest_test_value); on its
+        own it selects those tests' medians everywhere. log=False skips the
+        invalidation log (for high-volume pushed updates); medians=False keeps
+        the median entries (for callers that update_distributions instead).
+        """
+        tests = set(tests)
+        lowered = {t.lower() for t in tests}
+        player_ids = {p.id for p in players}
+        teams = set(teams) | {p.team_id for p in players if p.team_id}
+        cohorts = {tuple(c) for c in cohorts} | {RosterIndex.cohort_key(p) for p in players}
+        tests_only = tests and not (player_ids or teams or cohorts)
+
+        def test_match(test_name):
+            # Same loose matching as extract_latest_test_value ('CMJ' feeds 'CMJ Arm Swing HT')
+            name = test_name.lower()
+            return not tests or any(t in name or name in t for t in lowered)
+
+        doomed = {
+            TEST_INSTANCES: list(player_ids),
+            TEAM_MEDIANS: [],
+            POSITION_AGE_MEDIANS: [],
+            REPORT_CHARTS: [],
+            TEST_DATA: [],
+        }
+        for key in self.backend.keys(TEAM_MEDIANS) if medians else ():
+            test_name, team_id = key.rsplit("|", 1)
+            if test_match(test_name) and (tests_only or team_id in teams):
+                doomed[TEAM_MEDIANS].append(key)
+        for key in self.backend.keys(POSITION_AGE_MEDIANS) if medians else ():
+            test_name, position, age_range = key.rsplit("|", 2)
+            if test_match(test_name) and (tests_only or (position, age_range) in cohorts):
+                doomed[POSITION_AGE_MEDIANS].append(key)
+        if player_ids:
+            doomed[REPORT_CHARTS] = [k for k in self.backend.keys(REPORT_CHARTS) if k.split("|", 1)[0] in player_ids]
+            batches = self.backend.get_many(TEST_DATA, self.backend.keys(TEST_DATA))
+            doomed[TEST_DATA] = [k for k, entry in batches.items() if player_ids & set(entry['test_data'])]
+
+        removed = sum(self.backend.delete(namespace, keys) for namespace, keys in doomed.items() if keys)
+        if not log:
+            return removed
+        scope = ", ".join(f"{name}={','.join(sorted(map(str, values)))}" for name, values in
+                          (("players", player_ids), ("teams", teams), ("tests", tests),
+                           ("cohorts", {"/".join(map(str, c)) for c in cohorts})) if values)
+        self._log_invalidation(invalidated_by, f"{reason} ({scope or 'empty scope'}; {removed} entries)")
+        return removed
+
+    def _log_invalidation(self, invalidated_by, reason):
+        now = datetime.now()
+        # Keys sort chronologically; microseconds keep same-second entries apart
+        self.backend.set(INVALIDATION_LOG, now.isoformat(), {
+            'invalidated_by': invalidated_by,
+            'invalidated_at': now.strftime('%Y-%m-%d %H:%M:%S'),
+            'reason': reason,
+        })
+    
+    @timed("median_cache", op="get_cache_stats")
     def get_cache_stats(self):
         """Get cache statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Team median cache stats
-        cursor.execute('SELECT COUNT(*) FROM team_median_cache')
-        team_total_entries = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM team_median_cache WHERE expires_at < ?', (datetime.now(),))
-        team_expired_entries = cursor.fetchone()[0]
-        
-        # Position-age median cache stats
-        cursor.execute('SELECT COUNT(*) FROM position_age_median_cache')
-        pos_age_total_entries = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM position_age_median_cache WHERE expires_at < ?', (datetime.now(),))
-        pos_age_expired_entries = cursor.fetchone()[0]
-        
-        # Test instances cache stats
-        cursor.execute('SELECT COUNT(*) FROM test_instances_cache')
-        test_instances_total_entries = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM test_instances_cache WHERE expires_at < ?', (datetime.now(),))
-        test_instances_expired_entries = cursor.fetchone()[0]
-        
-        # Test data cache stats
-        cursor.execute('SELECT COUNT(*) FROM test_data_cache')
-        test_data_total_entries = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM test_data_cache WHERE expires_at < ?', (datetime.now(),))
-        test_data_expired_entries = cursor.fetchone()[0]
-        
-        # Combined stats
-        total_entries = team_total_entries + pos_age_total_entries + test_instances_total_entries + test_data_total_entries
-        expired_entries = team_expired_entries + pos_age_expired_entries + test_instances_expired_entries + test_data_expired_entries
-        valid_entries = total_entries - expired_entries
+        stats = self.backend.stats()
+        totals = {ns: stats.get(ns, {}).get('total', 0) for ns in CACHE_NAMESPACES}
+        expired_entries = sum(stats.get(ns, {}).get('expired', 0) for ns in CACHE_NAMESPACES)
+        total_entries = sum(totals.values())
         
         # Last invalidation
-        cursor.execute('''
-            SELECT invalidated_by, invalidated_at, reason 
-            FROM cache_invalidation_log 
-            ORDER BY invalidated_at DESC 
-            LIMIT 1
-        ''')
-        last_invalidation = cursor.fetchone()
-        
-        conn.close()
+        last_invalidation = None
+        log_keys = self.backend.keys(INVALIDATION_LOG)
+        if log_keys:
+            entry = self.backend.get(INVALIDATION_LOG, max(log_keys))
+            if entry:
+                last_invalidation = (entry['invalidated_by'], entry['invalidated_at'], entry['reason'])
         
         return {
+            'backend': self.backend.describe(),
             'total_entries': total_entries,
-            'valid_entries': valid_entries,
+            'valid_entries': total_entries - expired_entries,
             'expired_entries': expired_entries,
-            'team_entries': team_total_entries,
-            'position_age_entries': pos_age_total_entries,
-            'test_instances_entries': test_instances_total_entries,
-            'test_data_entries': test_data_total_entries,
+            'team_entries': totals[TEAM_MEDIANS],
+            'position_age_entries': totals[POSITION_AGE_MEDIANS],
+            'test_instances_entries': totals[TEST_INSTANCES],
+            'test_data_entries': totals[TEST_DATA],
+            'report_chart_entries': totals[REPORT_CHARTS],
             'last_invalidation': last_invalidation
         }
     
+    @timed("median_cache", op="cleanup_expired_cache")
     def cleanup_expired_cache(self):
         """Remove expired cache entries"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM team_median_cache WHERE expires_at < ?', (datetime.now(),))
-        team_deleted_count = cursor.rowcount
-        
-        cursor.execute('DELETE FROM position_age_median_cache WHERE expires_at < ?', (datetime.now(),))
-        pos_age_deleted_count = cursor.rowcount
-        
-        cursor.execute('DELETE FROM test_instances_cache WHERE expires_at < ?', (datetime.now(),))
-        test_instances_deleted_count = cursor.rowcount
-        
-        cursor.execute('DELETE FROM test_data_cache WHERE expires_at < ?', (datetime.now(),))
-        test_data_deleted_count = cursor.rowcount
-        
-        conn.commit()
-        conn.close()
-        
-        return team_deleted_count + pos_age_deleted_count + test_instances_deleted_count + test_data_deleted_count
+        return self.backend.expire()
+    
+    @timed("median_cache", op="run_maintenance")
+    def run_maintenance(self, max_bytes=None, max_rows=None):
+        """Expire, trim the invalidation log, evict down to the size budget and vacuum; returns a summary"""
+        max_bytes = MEDIAN_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        max_rows = MEDIAN_CACHE_MAX_ROWS if max_rows is None else max_rows
+        summary = {'expired': self.backend.expire()}
+        log_keys = sorted(self.backend.keys(INVALIDATION_LOG))
+        summary['log_trimmed'] = self.backend.delete(INVALIDATION_LOG, log_keys[:-INVALIDATION_LOG_KEEP]) \
+            if len(log_keys) > INVALIDATION_LOG_KEEP else 0
+        # Version tokens and the log are tiny and must survive eviction
+        summary['evicted'] = self.backend.evict(max_bytes, max_rows, protected=(DATA_VERSIONS, INVALIDATION_LOG))
+        summary.update(self.backend.maintain())
+        return summary
     
+    @timed("median_cache", op="get_cached_test_instances")
     def get_cached_test_instances(self, player_id):
         """Get cached test instances for a player if they exist and are not expired"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT test_instances_data, expires_at 
-            FROM test_instances_cache 
-            WHERE player_id = ?
-        ''', (player_id,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            test_instances_data, expires_at = result
-            expires_at = datetime.fromisoformat(expires_at)
-            
-            # Check if cache is still valid (1 day expiration for test instances)
-            if expires_at > datetime.now():
-                return json.loads(test_instances_data)
-        
-        return None
+        data = self.backend.get(TEST_INSTANCES, player_id)
+        record_cache_lookup('median_cache', 'test_instances', data is not None)
+        return data
+    
+    @timed("median_cache", op="get_cached_test_instances_many")
+    def get_cached_test_instances_many(self, player_ids):
+        """Get cached test instances for several players in one lookup; returns {player_id: data}"""
+        found = self.backend.get_many(TEST_INSTANCES, player_ids)
+        for player_id in player_ids:
+            record_cache_lookup('median_cache', 'test_instances', player_id in found)
+        return found
     
+    @timed("median_cache", op="cache_test_instances")
     def cache_test_instances(self, player_id, test_instances_data):
         """Cache test instances for a player with 1-day expiration"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        expires_at = datetime.now() + timedelta(days=1)
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO test_instances_cache 
-            (player_id, test_instances_data, expires_at)
-            VALUES (?, ?, ?)
-        ''', (player_id, json.dumps(test_instances_data), expires_at))
-        
-        conn.commit()
-        conn.close()
+        self.backend.set(TEST_INSTANCES, player_id, test_instances_data, TEST_DATA_TTL)
+    
+    def cache_test_instances_many(self, test_instances_by_player, age=0):
+        """Cache several players' test instances in one write (fetched age seconds ago)"""
+        if TEST_DATA_TTL - age > 0:
+            self.backend.set_many(TEST_INSTANCES, test_instances_by_player, TEST_DATA_TTL - age)
     
+    @timed("median_cache", op="get_cached_test_data")
     def get_cached_test_data(self, cache_key):
         """Get cached test data for a batch of players if it exists and is not expired"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT test_data, expires_at 
-            FROM test_data_cache 
-            WHERE cache_key = ?
-        ''', (cache_key,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            test_data, expires_at = result
-            expires_at = datetime.fromisoformat(expires_at)
-            
-            # Check if cache is still valid (1 day expiration for test data)
-            if expires_at > datetime.now():
-                return json.loads(test_data)
-        
-        return None
+        entry = self.backend.get(TEST_DATA, cache_key)
+        record_cache_lookup('median_cache', 'test_data', entry is not None)
+        return entry['test_data'] if entry is not None else None
     
+    @timed("median_cache", op="cache_test_data")
     def cache_test_data(self, cache_key, test_data, player_count):
         """Cache test data for a batch of players with 1-day expiration"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        expires_at = datetime.now() + timedelta(days=1)
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO test_data_cache 
-            (cache_key, test_data, player_count, expires_at)
-            VALUES (?, ?, ?, ?)
-        ''', (cache_key, json.dumps(test_data), player_count, expires_at))
-        
-        conn.commit()
-        conn.close()
+        self.backend.set(TEST_DATA, cache_key, {'test_data': test_data, 'player_count': player_count}, TEST_DATA_TTL)
+    
+    @timed("median_cache", op="get_data_version")
+    def get_data_version(self, scope=None):
+        """Combined roster and median version (or one scope's version); changes whenever either is refreshed"""
+        if scope is not None:
+            return self.backend.get(DATA_VERSIONS, scope)
+        versions = self.backend.get_many(DATA_VERSIONS, ['roster', 'medians'])
+        return f"{versions.get('roster', '0')}.{versions.get('medians', '0')}"
+    
+    def set_data_version(self, scope, version):
+        """Record the version of a data scope ('roster' or 'medians')"""
+        if self.backend.get(DATA_VERSIONS, scope) != version:
+            self.backend.set(DATA_VERSIONS, scope, version)
+    
+    def bump_data_version(self, scope):
+        """Give a data scope a fresh, unique version"""
+        self.backend.set(DATA_VERSIONS, scope, uuid.uuid4().hex[:12])
+    
+    @timed("median_cache", op="get_cached_report_charts")
+    def get_cached_report_charts(self, player_id, data_version):
+        """Get rendered report charts for a player at a given data version"""
+        charts = self.backend.get(REPORT_CHARTS, self._key(player_id, data_version))
+        record_cache_lookup('median_cache', 'report_charts', charts is not None)
+        return charts
+    
+    @timed("median_cache", op="cache_report_charts")
+    def cache_report_charts(self, player_id, data_version, charts):
+        """Cache rendered report charts for a player with 1-day expiration"""
+        self.backend.set(REPORT_CHARTS, self._key(player_id, data_version), charts, TEST_DATA_TTL)
+    
+    def export_medians(self):
+        """(namespace, key, entry) for every cached team and position/age median, distributions included"""
+        for namespace in (TEAM_MEDIANS, POSITION_AGE_MEDIANS):
+            keys = self.backend.keys(namespace)
+            for key, entry in self.backend.get_many(namespace, keys).items():
+                yield namespace, key, entry
+    
+    def import_medians(self, entries, age=0):
+        """Cache (namespace, key, entry) triples from export_medians() computed age seconds ago; returns the number written"""
+        if MEDIAN_TTL - age <= 0:
+            return 0
+        by_namespace = {}
+        for namespace, key, entry in entries:
+            if namespace in (TEAM_MEDIANS, POSITION_AGE_MEDIANS):
+                by_namespace.setdefault(namespace, {})[key] = entry
+        for namespace, items in by_namespace.items():
+            self.backend.set_many(namespace, items, MEDIAN_TTL - age)
+        return sum(len(items) for items in by_namespace.values())
     
     def get_age_range(self, age):
-        """Generate age range string for caching (e.g., 22 -> '22-25')"""
-        if age is None:
-            return "25-28"  # Default range
-        
-        # Handle ages less than 18
-        if age < 18:
-            if age < 14:
-                return "14-17"  # Young players
-            elif age < 16:
-                return "14-17"  # U16 range
-            else:
-                return "16-19"  # U18 range
-        
-        # Create 4-year ranges for adults: 18-21, 22-25, 26-29, 30-33, etc.
-        start_age = (age // 4) * 4 + 18
-        end_age = start_age + 3
-        return f"{start_age}-{end_age}"
+        """Age bucket used in position/age cache keys (e.g., 23 -> '22-25', 15 -> 'U16')"""
+        return age_bucket(age)
+
+
+def create_median_cache():
+    """Build the MedianCache on the backend selected by MEDIAN_CACHE_BACKEND / CACHE_BACKEND"""
+    return MedianCache(os.getenv("MEDIAN_CACHE_PATH", "median_cache.db"))
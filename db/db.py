@@ -3,6 +3,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from contextlib import contextmanager
 import os
+import threading
 from dotenv import load_dotenv
 
 
@@ -16,10 +17,40 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 
-DATABASE_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL permite apuntar a otra base (p. ej. sqlite:///shared_cache.db en pruebas)
+DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
+# Pool de conexiones compartido por todos los hilos del worker
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # segundos esperando una conexión libre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # por debajo del wait_timeout de MySQL
+
+# El engine se crea al primer uso, así importar hash_password/check_password
+# no exige tener MySQL configurado
+_engine = None
+_engine_lock = threading.Lock()
+SessionLocal = sessionmaker()
+
+def get_engine():
+    global _engine
+    if _engine is not None:
+        return _engine
+    with _engine_lock:
+        if _engine is not None:
+            return _engine
+        options = {"pool_pre_ping": True}
+        if not DATABASE_URL.startswith("sqlite"):
+            options.update(
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+            )
+        engine = create_engine(DATABASE_URL, **options)
+        SessionLocal.configure(bind=engine)
+        _engine = engine
+    return _engine
 
 # Opcional: si quieres usar hashing con pepper
 PEPPER = "soccerCentralHash"
@@ -32,6 +63,7 @@ def check_password(password: str, hashed: str) -> bool:
 
 @contextmanager
 def get_db_session():
+    get_engine()
     session = SessionLocal()
     try:
         yield session
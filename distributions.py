@@ -0,0 +1,119 @@
+"""
+Distributions of test values per team or cohort.
+
+A Distribution holds the latest value of each player in a sorted array, so
+quantiles are an index lookup, percentile ranks a bisect and mean/std come
+from running sums. It is cached inside the matching median entry of
+MedianCache (same key, same invalidation) and updated in place when a pushed
+result changes one player's value, instead of re-sorting the whole cohort.
+"""
+import math
+from array import array
+from bisect import bisect_left, bisect_right, insort
+
+# Quantiles reported with every distribution
+SUMMARY_QUANTILES = (10, 25, 50, 75, 90)
+
+
+class Distribution:
+    """Sorted latest values of a test, one per player"""
+
+    __slots__ = ('values', 'players', 'total', 'total_sq')
+
+    def __init__(self, players=None):
+        self.players = dict(players or {})
+        self.values = array('d', sorted(self.players.values()))
+        self.total = math.fsum(self.values)
+        self.total_sq = math.fsum(v * v for v in self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, player_id, value):
+        """Set a player's value (replacing the previous one)"""
+        self.remove(player_id)
+        value = float(value)
+        self.players[player_id] = value
+        insort(self.values, value)
+        self.total += value
+        self.total_sq += value * value
+
+    def remove(self, player_id):
+        """Drop a player's value; True if there was one"""
+        value = self.players.pop(player_id, None)
+        if value is None:
+            return False
+        del self.values[bisect_left(self.values, value)]
+        self.total -= value
+        self.total_sq -= value * value
+        return True
+
+    def mean(self):
+        return self.total / len(self.values) if self.values else None
+
+    def std(self):
+        """Population standard deviation"""
+        if not self.values:
+            return None
+        mean = self.total / len(self.values)
+        return math.sqrt(max(self.total_sq / len(self.values) - mean * mean, 0.0))
+
+    def median(self):
+        """Middle value, or the mean of the two middle values"""
+        n = len(self.values)
+        if not n:
+            return None
+        return self.values[n // 2] if n % 2 else (self.values[n // 2 - 1] + self.values[n // 2]) / 2
+
+    def quantile(self, q):
+        """Value below which a fraction q (0-1) of the players fall, linearly interpolated"""
+        n = len(self.values)
+        if not n:
+            return None
+        position = min(max(q, 0.0), 1.0) * (n - 1)
+        low = int(position)
+        high = min(low + 1, n - 1)
+        return self.values[low] + (self.values[high] - self.values[low]) * (position - low)
+
+    def percentile_rank(self, value):
+        """Percentage of players below value, counting ties as half"""
+        if not self.values or value is None:
+            return None
+        below = bisect_left(self.values, value)
+        ties = bisect_right(self.values, value, lo=below) - below
+        return 100.0 * (below + ties / 2) / len(self.values)
+
+    def z_score(self, value):
+        std = self.std()
+        if value is None or not std:
+            return None
+        return (value - self.mean()) / std
+
+    def summary(self, value=None):
+        """Count, mean, std and quantiles, plus the percentile rank and z-score of value when given"""
+        if not self.values:
+            return None
+        rank, z = self.percentile_rank(value), self.z_score(value)
+        return {
+            'count': len(self.values),
+            'mean': round(self.mean(), 2),
+            'std': round(self.std(), 2),
+            'quantiles': {f'p{q}': round(self.quantile(q / 100), 2) for q in SUMMARY_QUANTILES},
+            'percentile_rank': round(rank, 1) if rank is not None else None,
+            'z_score': round(z, 2) if z is not None else None,
+        }
+
+    def pack(self):
+        """Plain lists for the cache backends: player ids and values in value order"""
+        ordered = sorted(self.players.items(), key=lambda item: item[1])
+        return {'p': [player_id for player_id, _ in ordered], 'v': [value for _, value in ordered]}
+
+    @classmethod
+    def unpack(cls, packed):
+        """Inverse of pack(); the values arrive sorted, so nothing is re-sorted"""
+        distribution = cls.__new__(cls)
+        distribution.values = array('d', packed['v'])
+        distribution.players = dict(zip(packed['p'], distribution.values))
+        distribution.total = math.fsum(distribution.values)
+        distribution.total_sq = math.fsum(v * v for v in distribution.values)
+        return distribution
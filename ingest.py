@@ -0,0 +1,196 @@
+"""
+Push-based updates from Iterpro (webhook or batch upload).
+
+POST /ingest accepts one event, a list of events or {"events": [...]}. Each
+event is applied to the local caches right away and invalidates only the
+medians it feeds (see MedianCache.invalidate); new test results update the
+cached team and cohort distributions in place instead. Freshness no longer
+hangs on TTL polling:
+
+    {"type": "test_instances", "player_id": ..., "test_instances": [...]}  full history
+    {"type": "test_instance", "player_id": ..., "instance": {...}}         one new or corrected result
+    {"type": "player", "player": {...}}                                    created or updated player
+    {"type": "player_removed", "player_id": ...}
+    {"type": "team", "team": {...}}
+    {"type": "changed", "player_id"?: ..., "team_id"?: ..., "test_name"?: ...}
+        notification only: drop the affected entries and refetch on next read
+
+Environment variables:
+    INGEST_TOKEN        Bearer token required by /ingest (unset disables the endpoint)
+    INGEST_MAX_EVENTS   Maximum events per request (default: 1000)
+"""
+import os
+
+import iterpro_client
+from iterpro_client import measurement_store, median_cache
+from measurements import TestResults
+from roster import normalize_player
+from utils.logger import get_logger
+from utils.metrics import inc, timed
+
+INGEST_MAX_EVENTS = int(os.getenv("INGEST_MAX_EVENTS", "1000"))
+
+logger = get_logger("ingest")
+
+
+class IngestError(ValueError):
+    """An event that cannot be applied"""
+
+
+def _require(event, field):
+    value = event.get(field)
+    if not value:
+        raise IngestError(f"'{field}' is required for {event.get('type')} events")
+    return value
+
+
+def _player_record(player_id):
+    """Roster record used to find the medians a player feeds (None if unknown)"""
+    record = iterpro_client.get_roster().get(player_id)
+    if record is None:
+        player = iterpro_client.get_player_by_id(player_id)
+        record = normalize_player(player) if player else None
+    return record
+
+
+def _invalidate(source, records=(), teams=(), tests=(), medians=True):
+    known = [r for r in records if r]
+    if records and not known and not teams:
+        # Unknown player: nothing cached depends on them, and tests alone would drop those medians club-wide
+        return 0
+    records = known
+    if not (records or teams or tests):
+        return 0
+    return median_cache.invalidate(source, "Pushed update", players=records, teams=teams, tests=tests,
+                                   log=False, medians=medians)
+
+
+def _update_distributions(record, instances, tests):
+    """Move the player's new latest values into the cached team/cohort distributions"""
+    if record is None:
+        return 0
+    return median_cache.update_distributions(record, TestResults.from_instances(instances), tests)
+
+
+def _test_names(instances):
+    return sorted({i.get('testName') for i in instances if i.get('testName')})
+
+
+def _apply_test_instances(event, source):
+    player_id = _require(event, 'player_id')
+    instances = event.get('test_instances')
+    if not isinstance(instances, list):
+        raise IngestError("'test_instances' must be a list")
+    previous = median_cache.get_cached_test_instances(player_id) or []
+    # Medians of tests that disappeared from the history are stale too
+    tests = sorted(set(_test_names(instances)) | set(_test_names(previous)))
+    record = _player_record(player_id)
+    removed = _invalidate(source, [record], tests=tests, medians=False)
+    removed += _update_distributions(record, instances, tests)
+    median_cache.cache_test_instances(player_id, instances)
+    measurement_store.replace_player(player_id, instances)
+    return removed
+
+
+def _apply_test_instance(event, source):
+    player_id = _require(event, 'player_id')
+    instance = _require(event, 'instance')
+    if not instance.get('testName'):
+        raise IngestError("'instance.testName' is required")
+    history = median_cache.get_cached_test_instances(player_id)
+    record = _player_record(player_id)
+    # Without a cached history the player's latest values are unknown: drop the medians instead
+    removed = _invalidate(source, [record], tests=[instance['testName']], medians=history is None)
+    if history is not None:
+        # Merge into the cached history; without one the next read fetches it whole
+        merged = [i for i in history if not instance.get('_id') or i.get('_id') != instance['_id']]
+        merged.append(instance)
+        removed += _update_distributions(record, merged, [instance['testName']])
+        median_cache.cache_test_instances(player_id, merged)
+    measurement_store.upsert(player_id, [instance])
+    return removed
+
+
+def _apply_player(event, source):
+    player = _require(event, 'player')
+    player_id = player.get('_id')
+    if not player_id:
+        raise IngestError("'player._id' is required")
+    # Both the old and the new team/cohort lose their medians when a player moves
+    before = _player_record(player_id)
+    iterpro_client.store_player(player)
+    return _invalidate(source, [before, normalize_player(player)])
+
+
+def _apply_player_removed(event, source):
+    player_id = _require(event, 'player_id')
+    before = _player_record(player_id)
+    iterpro_client.remove_player(player_id)
+    return _invalidate(source, [before])
+
+
+def _apply_team(event, source):
+    team = _require(event, 'team')
+    if not team.get('_id'):
+        raise IngestError("'team._id' is required")
+    iterpro_client.store_team(team)
+    return 0
+
+
+def _apply_changed(event, source):
+    player_id, team_id, test_name = event.get('player_id'), event.get('team_id'), event.get('test_name')
+    if not (player_id or team_id or test_name):
+        raise IngestError("changed events need a player_id, team_id or test_name")
+    if player_id:
+        iterpro_client.forget_cached('player', player_id)
+        measurement_store.mark_stale([player_id])
+    if team_id:
+        iterpro_client.forget_cached('team', team_id)
+    records = [_player_record(player_id)] if player_id else []
+    return _invalidate(source, records, teams=[team_id] if team_id else [], tests=[test_name] if test_name else [])
+
+
+HANDLERS = {
+    'test_instances': _apply_test_instances,
+    'test_instance': _apply_test_instance,
+    'player': _apply_player,
+    'player_removed': _apply_player_removed,
+    'team': _apply_team,
+    'changed': _apply_changed,
+}
+
+
+def parse_events(payload):
+    """List of events from a request body (one event, a list, or {"events": [...]})"""
+    if isinstance(payload, dict):
+        payload = payload['events'] if 'events' in payload else [payload]
+    if not isinstance(payload, list) or not all(isinstance(e, dict) for e in payload):
+        raise IngestError("expected an event object, a list of events or {\"events\": [...]}")
+    if len(payload) > INGEST_MAX_EVENTS:
+        raise IngestError(f"at most {INGEST_MAX_EVENTS} events per request")
+    return payload
+
+
+@timed("ingest")
+def apply_events(events, source="ingest"):
+    """Apply events in order; returns {'applied', 'invalidated', 'errors'}"""
+    applied = invalidated = 0
+    errors = []
+    for index, event in enumerate(events):
+        event_type = event.get('type')
+        handler = HANDLERS.get(event_type)
+        try:
+            if handler is None:
+                raise IngestError(f"unknown event type: {event_type!r}")
+            invalidated += handler(event, source)
+            applied += 1
+            inc("ingest_events_total", type=event_type, status="applied")
+        except IngestError as e:
+            errors.append({'index': index, 'error': str(e)})
+            inc("ingest_events_total", type=str(event_type), status="rejected")
+        except Exception as e:
+            logger.exception("Error applying %s event: %s", event_type, e)
+            errors.append({'index': index, 'error': "internal error"})
+            inc("ingest_events_total", type=str(event_type), status="failed")
+    logger.info("Ingested %d/%d events, %d cache entries invalidated or updated", applied, len(events), invalidated)
+    return {'applied': applied, 'invalidated': invalidated, 'errors': errors}
@@ -0,0 +1,129 @@
+"""
+Circuit breakers for Iterpro calls.
+
+Every endpoint template ("players", "players/{id}/test-instances", ...) has
+its own breaker. A call fails when it raises, when it returns a 5xx or 429,
+or when it takes longer than ITERPRO_BREAKER_SLOW_SECONDS. After
+ITERPRO_BREAKER_FAILURES failures in a row the breaker opens. While it is
+open, calls raise CircuitOpen at once (a requests RequestException, so the
+callers fall back to persisted data) for ITERPRO_BREAKER_COOLDOWN seconds.
+After that the breaker is half-open: one probe call goes through while the
+others keep failing fast. A successful probe closes the breaker; a failed
+probe opens it for another cooldown.
+
+Breakers are kept per worker; each worker learns about an outage from its
+own first few calls.
+
+Environment variables:
+    ITERPRO_BREAKER_FAILURES       Failures in a row that open a breaker, 0 disables (default: 5)
+    ITERPRO_BREAKER_COOLDOWN       Seconds a breaker stays open before probing (default: 30)
+    ITERPRO_BREAKER_SLOW_SECONDS   Calls slower than this count as failures (default: 5)
+"""
+import os
+import threading
+import time
+
+import requests
+
+from utils.logger import get_logger
+from utils.metrics import describe, inc
+
+ITERPRO_BREAKER_FAILURES = int(os.getenv("ITERPRO_BREAKER_FAILURES", "5"))
+ITERPRO_BREAKER_COOLDOWN = float(os.getenv("ITERPRO_BREAKER_COOLDOWN", "30"))
+ITERPRO_BREAKER_SLOW_SECONDS = float(os.getenv("ITERPRO_BREAKER_SLOW_SECONDS", "5"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+logger = get_logger("breaker")
+
+
+class CircuitOpen(requests.exceptions.RequestException):
+    """The endpoint's breaker is open; the call was not made"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker for one endpoint"""
+
+    def __init__(self, endpoint, failures=None, cooldown=None, slow_seconds=None):
+        self.endpoint = endpoint
+        self.max_failures = ITERPRO_BREAKER_FAILURES if failures is None else failures
+        self.cooldown = ITERPRO_BREAKER_COOLDOWN if cooldown is None else cooldown
+        self.slow_seconds = ITERPRO_BREAKER_SLOW_SECONDS if slow_seconds is None else slow_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return CLOSED
+        return OPEN if time.monotonic() < self.opened_at + self.cooldown else HALF_OPEN
+
+    def before_call(self):
+        """Raise CircuitOpen unless the call may go out (closed, or the half-open probe)"""
+        if not self.max_failures:
+            return
+        with self._lock:
+            state = self.state
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self.probing:
+                self.probing = True
+                logger.info("Probing Iterpro endpoint %s", self.endpoint)
+                return
+        inc("iterpro_breaker_rejected_total", endpoint=self.endpoint)
+        raise CircuitOpen(f"Iterpro endpoint '{self.endpoint}' is unavailable (circuit open)")
+
+    def cancel(self):
+        """The call admitted by before_call() never went out; let another probe through"""
+        with self._lock:
+            self.probing = False
+
+    def record(self, ok, elapsed=0.0):
+        """Report a call's outcome; slow calls count as failures"""
+        if not self.max_failures:
+            return
+        if ok and elapsed > self.slow_seconds:
+            ok = False
+        with self._lock:
+            was = self.state
+            self.probing = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if was != CLOSED or self.failures >= self.max_failures:
+                    self.opened_at = time.monotonic()
+            now = self.state
+        if now != was:
+            inc("iterpro_breaker_transitions_total", endpoint=self.endpoint, state=now)
+            log = logger.info if now == CLOSED else logger.warning
+            log("Iterpro endpoint %s: circuit %s after %s", self.endpoint, now,
+                "a successful probe" if ok else f"{self.failures} failed or slow calls")
+
+    def snapshot(self):
+        return {'state': self.state, 'failures': self.failures}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(endpoint):
+    """This worker's breaker for an endpoint template"""
+    found = _breakers.get(endpoint)
+    if found is None:
+        with _breakers_lock:
+            found = _breakers.setdefault(endpoint, CircuitBreaker(endpoint))
+    return found
+
+
+def states():
+    """{endpoint: {state, failures}} for every endpoint called so far"""
+    return {endpoint: b.snapshot() for endpoint, b in sorted(_breakers.items())}
+
+
+describe("iterpro_breaker_rejected_total", "Iterpro calls failed fast by an open circuit breaker")
+describe("iterpro_breaker_transitions_total", "Circuit breaker state changes per Iterpro endpoint")
@@ -1,4 +1,5 @@
 import os
+import sys
 import requests
 import json
 import tempfile
@@ -6,219 +7,297 @@ from dotenv import load_dotenv
 from pathlib import Path
 import time
 import random
-import numpy as np
+import zlib
 from datetime import datetime, timedelta
-from database import MedianCache
+from cache_backends import backend_from_env
+from database import create_median_cache
+from iterpro_breaker import breaker
+from iterpro_ratelimit import create_rate_limiter, priority
+from iterpro_transport import create_transport
+from measurements import TEST_CATEGORIES, MeasurementStore, TestResults
+from roster import RosterIndex, get_roster_index
+from utils.logger import get_logger, debug_sampled, redact_headers, Lazy
+from utils.metrics import span, inc, record_cache_lookup
+from utils.lazy import lazy
+from utils.serialization import fingerprint
 load_dotenv(dotenv_path=Path(__file__).resolve().parent / ".env")
 
-# Initialize median cache
-median_cache = MedianCache()
+logger = get_logger("iterpro")
+
+# Median cache, built on first use (see utils/lazy.py)
+median_cache = lazy(create_median_cache, "median_cache")
+
+# Real measurement history per player and test (see measurements.py)
+measurement_store = lazy(MeasurementStore, "measurement_store")
+# Window and number of points charted per test
+HISTORY_MONTHS = int(os.getenv("HISTORY_MONTHS", "12"))
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "20"))
 
 BASE_URL = os.getenv("BASE_URL")
 API_KEY = os.getenv("API_KEY")
 AUTH_HEADER = os.getenv("AUTH_HEADER")
 
-# Cache configuration
-_cache_expiration = 300  # 5 minutes in seconds
-_cache_dir = Path(tempfile.gettempdir()) / "soccer_central_cache"
-_cache_dir.mkdir(exist_ok=True)
+# HTTP transport: live, record or replay (see iterpro_transport.py)
+transport = lazy(lambda: create_transport(base_url=BASE_URL or ""), "transport")
+
+# Outbound token buckets shared by the node's workers (see iterpro_ratelimit.py)
+rate_limiter = lazy(create_rate_limiter, "rate_limiter")
 
-def _get_cache_file_path(cache_type, key):
-    """Get the file path for a cache entry"""
-    safe_key = key.replace('/', '_').replace('\\', '_').replace(':', '_')
-    return _cache_dir / f"{cache_type}_{safe_key}.json"
+def set_transport(new_transport):
+    """Swap the HTTP transport (e.g. to replay a cassette offline)"""
+    global transport
+    transport = new_transport
 
-def _load_cache_entry(file_path):
-    """Load a cache entry from file"""
+# Response cache configuration (backend selected by RESPONSE_CACHE_BACKEND / CACHE_BACKEND)
+# 5 minutes by default; raise RESPONSE_CACHE_TTL when Iterpro pushes changes to /ingest
+_cache_expiration = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+# Size budget enforced by run_cache_maintenance (0 = unlimited)
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_MAX_ROWS = int(os.getenv("RESPONSE_CACHE_MAX_ROWS", "20000"))
+_cache_dir = Path(tempfile.gettempdir()) / "soccer_central_cache"
+response_cache = lazy(lambda: backend_from_env("RESPONSE_CACHE_BACKEND", "file", _cache_dir), "response_cache")
+RESPONSE_NAMESPACES = ('team', 'players', 'player', 'thresholds')
+# Last good copy of every response, never expired or evicted; served while Iterpro is unreachable
+LAST_GOOD = 'last_good'
+
+def _load_cache_entry(cache_type, key):
+    """Load a cache entry from the response cache"""
     try:
-        if file_path.exists():
-            with open(file_path, 'r', encoding='utf-8') as f:
-                cache_entry = json.load(f)
-                if time.time() - cache_entry['timestamp'] < _cache_expiration:
-                    return cache_entry['data']
-                else:
-                    # Cache expired, remove file
-                    file_path.unlink()
-                    print(f"[DEBUG] Cache expired for {file_path.name}")
+        return response_cache.get(cache_type, key)
     except Exception as e:
-        print(f"[DEBUG] Error loading cache from {file_path}: {e}")
+        logger.warning("Error loading %s/%s from cache: %s", cache_type, key, e)
     return None
 
-def _save_cache_entry(file_path, data):
-    """Save a cache entry to file"""
+def _save_cache_entry(cache_type, key, data):
+    """Save a cache entry to the response cache (and as the last good copy)"""
     try:
-        cache_entry = {
-            'data': data,
-            'timestamp': time.time()
-        }
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(cache_entry, f, ensure_ascii=False, indent=2)
-        print(f"[DEBUG] Cached data to {file_path.name}")
+        response_cache.set(cache_type, key, data, _cache_expiration)
+        response_cache.set(LAST_GOOD, f"{cache_type}|{key}", data)
+        logger.debug("Cached %s/%s", cache_type, key)
     except Exception as e:
-        print(f"[DEBUG] Error saving cache to {file_path}: {e}")
+        logger.warning("Error saving %s/%s to cache: %s", cache_type, key, e)
+
+def _load_last_good(cache_type, key):
+    """The last good copy of a response, if one was ever saved"""
+    return _load_cache_entry(LAST_GOOD, f"{cache_type}|{key}")
+
+def _serve_stale(source, data):
+    """Return persisted data in place of a failed Iterpro call, marking the current request as stale"""
+    inc("iterpro_stale_served_total", source=source)
+    flask = sys.modules.get("flask")
+    if flask is not None and flask.has_request_context():
+        flask.g.setdefault("iterpro_stale", set()).add(source)
+    return data
+
+def served_stale():
+    """Sources the current request served from persisted data instead of Iterpro (sorted)"""
+    flask = sys.modules.get("flask")
+    if flask is None or not flask.has_request_context():
+        return []
+    return sorted(flask.g.get("iterpro_stale", ()))
 
 def _get_cached_team(team_id):
     """Get team from cache if it exists and is not expired"""
-    file_path = _get_cache_file_path('team', team_id)
-    cached_data = _load_cache_entry(file_path)
+    cached_data = _load_cache_entry('team', team_id)
+    record_cache_lookup('response', 'team', bool(cached_data))
     if cached_data:
-        print(f"[DEBUG] Using cached team data for {team_id}")
+        logger.debug("Using cached team data for %s", team_id)
     return cached_data
 
 def _cache_team(team_id, team_data):
     """Cache team data with timestamp"""
-    file_path = _get_cache_file_path('team', team_id)
-    _save_cache_entry(file_path, team_data)
+    _save_cache_entry('team', team_id, team_data)
 
 def _get_cached_players():
     """Get players from cache if they exist and are not expired"""
-    file_path = _get_cache_file_path('players', 'all_players')
-    cached_data = _load_cache_entry(file_path)
+    cached_data = _load_cache_entry('players', 'all_players')
+    record_cache_lookup('response', 'players', bool(cached_data))
     if cached_data:
-        print(f"[DEBUG] Using cached players data")
+        logger.debug("Using cached players data")
     return cached_data
 
 def _cache_players(players_data):
-    """Cache players data with timestamp"""
-    file_path = _get_cache_file_path('players', 'all_players')
-    _save_cache_entry(file_path, players_data)
+    """Cache players data with timestamp and record the roster version"""
+    _save_cache_entry('players', 'all_players', players_data)
+    try:
+        median_cache.set_data_version('roster', fingerprint(players_data))
+    except Exception as e:
+        logger.warning("Error updating roster version: %s", e)
 
 def _get_cached_player(player_id):
     """Get individual player from cache if it exists and is not expired"""
-    file_path = _get_cache_file_path('player', player_id)
-    cached_data = _load_cache_entry(file_path)
+    cached_data = _load_cache_entry('player', player_id)
+    record_cache_lookup('response', 'player', bool(cached_data))
     if cached_data:
-        print(f"[DEBUG] Using cached player data for {player_id}")
+        logger.debug("Using cached player data for %s", player_id)
     return cached_data
 
 def _cache_player(player_id, player_data):
     """Cache individual player data with timestamp"""
-    file_path = _get_cache_file_path('player', player_id)
-    _save_cache_entry(file_path, player_data)
+    _save_cache_entry('player', player_id, player_data)
+
+# Push updates (see ingest.py): write what a webhook delivered straight into the response cache
+def store_player(player_data):
+    """Cache a pushed player and fold it into the cached roster, if there is one"""
+    player_id = player_data['_id']
+    _cache_player(player_id, player_data)
+    players = _load_cache_entry('players', 'all_players')
+    if players is not None:
+        replaced = [player_data if p.get('_id') == player_id else p for p in players]
+        if not any(p.get('_id') == player_id for p in players):
+            replaced.append(player_data)
+        _cache_players(replaced)
+
+def remove_player(player_id):
+    """Drop a player from the response cache and the cached roster"""
+    response_cache.delete('player', [player_id])
+    response_cache.delete(LAST_GOOD, [f"player|{player_id}"])
+    players = _load_cache_entry('players', 'all_players')
+    if players is not None:
+        _cache_players([p for p in players if p.get('_id') != player_id])
+
+def export_responses():
+    """(namespace, key, data) for every cached response, using the last good copy where the live entry expired"""
+    exported = set()
+    for namespace in RESPONSE_NAMESPACES:
+        for key, data in response_cache.get_many(namespace, response_cache.keys(namespace)).items():
+            exported.add((namespace, key))
+            yield namespace, key, data
+    for last_key, data in response_cache.get_many(LAST_GOOD, response_cache.keys(LAST_GOOD)).items():
+        namespace, _, key = last_key.partition('|')
+        if namespace in RESPONSE_NAMESPACES and (namespace, key) not in exported:
+            yield namespace, key, data
+
+def import_responses(entries, age=0):
+    """
+    Cache (namespace, key, data) triples as responses and last good copies; returns the number written
+
+    age is how many seconds ago the responses were fetched: they stay fresh
+    for what is left of RESPONSE_CACHE_TTL, and older ones are only kept as
+    last good copies.
+    """
+    by_namespace = {}
+    for namespace, key, data in entries:
+        if namespace in RESPONSE_NAMESPACES:
+            by_namespace.setdefault(namespace, {})[key] = data
+    ttl = _cache_expiration - age
+    for namespace, items in by_namespace.items():
+        if ttl > 0:
+            response_cache.set_many(namespace, items, ttl)
+        response_cache.set_many(LAST_GOOD, {f"{namespace}|{key}": data for key, data in items.items()})
+    players = by_namespace.get('players', {}).get('all_players')
+    # Only a list cached as fresh is what get_roster() serves; a last good copy leaves the version alone
+    if players is not None and ttl > 0:
+        median_cache.set_data_version('roster', fingerprint(players))
+    return sum(len(items) for items in by_namespace.values())
+
+def store_team(team_data):
+    """Cache a pushed team"""
+    _cache_team(team_data['_id'], team_data)
+
+def forget_cached(cache_type, key):
+    """Drop one response cache entry so the next read goes to Iterpro"""
+    response_cache.delete(cache_type, [key])
 
 def clear_cache():
     """Clear all cached data"""
     try:
-        for cache_file in _cache_dir.glob("*.json"):
-            cache_file.unlink()
-        print(f"[DEBUG] All cache cleared from {_cache_dir}")
+        for namespace in RESPONSE_NAMESPACES:
+            response_cache.delete(namespace)
+        logger.info("All cache cleared from %s", response_cache.describe())
     except Exception as e:
-        print(f"[DEBUG] Error clearing cache: {e}")
+        logger.warning("Error clearing cache: %s", e)
 
 def clear_team_cache():
     """Clear all cached team data"""
     try:
-        team_files = list(_cache_dir.glob("team_*.json"))
-        for cache_file in team_files:
-            cache_file.unlink()
-        print(f"[DEBUG] Team cache cleared ({len(team_files)} files)")
+        removed = response_cache.delete('team')
+        logger.info("Team cache cleared (%d entries)", removed)
     except Exception as e:
-        print(f"[DEBUG] Error clearing team cache: {e}")
+        logger.warning("Error clearing team cache: %s", e)
 
 def clear_player_cache():
     """Clear all cached player data"""
     try:
-        player_files = list(_cache_dir.glob("player_*.json"))
-        players_list_files = list(_cache_dir.glob("players_*.json"))
-        all_player_files = player_files + players_list_files
-        for cache_file in all_player_files:
-            cache_file.unlink()
-        print(f"[DEBUG] Player cache cleared ({len(all_player_files)} files)")
+        removed = response_cache.delete('player') + response_cache.delete('players')
+        logger.info("Player cache cleared (%d entries)", removed)
     except Exception as e:
-        print(f"[DEBUG] Error clearing player cache: {e}")
+        logger.warning("Error clearing player cache: %s", e)
 
 def cleanup_expired_cache():
-    """Remove expired cache files"""
-    current_time = time.time()
-    removed_count = 0
-    
-    for cache_file in _cache_dir.glob("*.json"):
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_entry = json.load(f)
-                if current_time - cache_entry['timestamp'] >= _cache_expiration:
-                    cache_file.unlink()
-                    removed_count += 1
-        except Exception:
-            # If file is corrupted, remove it
-            cache_file.unlink()
-            removed_count += 1
-    
+    """Remove expired cache entries"""
+    removed_count = response_cache.expire()
     if removed_count > 0:
-        print(f"[DEBUG] Cleaned up {removed_count} expired cache files")
+        logger.info("Cleaned up %d expired cache entries", removed_count)
     return removed_count
 
+def run_cache_maintenance():
+    """Expire, evict down to the size budget and vacuum the response cache; returns a summary"""
+    summary = {'expired': response_cache.expire()}
+    summary['evicted'] = response_cache.evict(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_ROWS, protected=(LAST_GOOD,))
+    summary.update(response_cache.maintain())
+    return summary
+
 def get_cache_stats():
     """Get cache statistics"""
-    current_time = time.time()
-    team_valid_entries = 0
-    team_expired_entries = 0
-    player_valid_entries = 0
-    player_expired_entries = 0
-    players_list_valid = 0
-    players_list_expired = 0
-    
-    # Count team cache files
-    for cache_file in _cache_dir.glob("team_*.json"):
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_entry = json.load(f)
-                if current_time - cache_entry['timestamp'] < _cache_expiration:
-                    team_valid_entries += 1
-                else:
-                    team_expired_entries += 1
-        except Exception:
-            team_expired_entries += 1
-    
-    # Count individual player cache files
-    for cache_file in _cache_dir.glob("player_*.json"):
-        if "players_all_players" in cache_file.name:
-            continue  # Skip the players list file
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_entry = json.load(f)
-                if current_time - cache_entry['timestamp'] < _cache_expiration:
-                    player_valid_entries += 1
-                else:
-                    player_expired_entries += 1
-        except Exception:
-            player_expired_entries += 1
-    
-    # Count players list cache file
-    players_list_file = _get_cache_file_path('players', 'all_players')
-    if players_list_file.exists():
-        try:
-            with open(players_list_file, 'r', encoding='utf-8') as f:
-                cache_entry = json.load(f)
-                if current_time - cache_entry['timestamp'] < _cache_expiration:
-                    players_list_valid = 1
-                else:
-                    players_list_expired = 1
-        except Exception:
-            players_list_expired = 1
-    
-    total_files = len(list(_cache_dir.glob("*.json")))
-    
+    stats = response_cache.stats()
+
+    def _section(namespace):
+        entry = stats.get(namespace, {'total': 0, 'expired': 0})
+        return {
+            'total_entries': entry['total'],
+            'valid_entries': entry['total'] - entry['expired'],
+            'expired_entries': entry['expired'],
+        }
+
+    return {
+        'cache_directory': response_cache.describe(),
+        'teams': _section('team'),
+        'players': _section('player'),
+        'players_list': _section('players'),
+        'thresholds': _section('thresholds'),
+        'total_cache_files': sum(entry['total'] for entry in stats.values())
+    }
+
+def _get_headers():
+    """Headers required by the Iterpro API"""
     return {
-        'cache_directory': str(_cache_dir),
-        'teams': {
-            'total_entries': team_valid_entries + team_expired_entries,
-            'valid_entries': team_valid_entries,
-            'expired_entries': team_expired_entries,
-        },
-        'players': {
-            'total_entries': player_valid_entries + player_expired_entries,
-            'valid_entries': player_valid_entries,
-            'expired_entries': player_expired_entries,
-        },
-        'players_list': {
-            'total_entries': players_list_valid + players_list_expired,
-            'valid_entries': players_list_valid,
-            'expired_entries': players_list_expired,
-        },
-        'total_cache_files': total_files
+        "Authorization": AUTH_HEADER,
+        "x-iterpro-api-key": API_KEY,
+        "Content-Type": "application/json",
+        "Accept": "application/json"
     }
 
+def _iterpro_get(url, endpoint):
+    """GET an Iterpro URL, timing it under the endpoint template (e.g. "players/{id}")"""
+    headers = _get_headers()
+    logger.debug("HEADERS: %s", Lazy(lambda: redact_headers(headers)))
+    # An open circuit fails fast, before waiting for a rate limit token
+    circuit = breaker(endpoint)
+    circuit.before_call()
+    # Every path below settles the call, or a half-open breaker would wait on its probe forever
+    try:
+        rate_limiter.acquire(endpoint)
+    except BaseException:
+        # RateLimited, a locked limiter database...: the call never went out
+        circuit.cancel()
+        raise
+    start = time.perf_counter()
+    try:
+        with span("iterpro", endpoint=endpoint) as s:
+            response = transport.get(url, headers)
+            s.set(status=response.status_code)
+    except Exception:
+        # Network errors, but also transport bugs or a replay without a recording
+        circuit.record(False)
+        raise
+    except BaseException:
+        circuit.cancel()
+        raise
+    circuit.record(response.status_code < 500 and response.status_code != 429, time.perf_counter() - start)
+    inc("iterpro_response_bytes_total", len(response.content), endpoint=endpoint)
+    return response
+
 # Para llamar a iterpro https://api.iterpro.com/api/v1/players
 def get_players():
     # Check cache first
@@ -227,30 +306,24 @@ def get_players():
         return cached_players
     
     url = f"{BASE_URL}/players"
-    headers = {
-        "Authorization": AUTH_HEADER,
-        "x-iterpro-api-key": API_KEY,
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-    print("[DEBUG] URL:", url)
-    print("[DEBUG] HEADERS:", headers)
+    logger.debug("URL: %s", url)
 
     try:
-        response = requests.get(url, headers=headers)
-        print(f"[DEBUG] Players response status: {response.status_code}")
-        print(f"[DEBUG] Players response content: {response.text[:500]}...")
+        response = _iterpro_get(url, "players")
+        logger.debug("Players response status: %s", response.status_code)
+        logger.debug("Players response content: %s...", Lazy(lambda: response.text[:500]))
         response.raise_for_status()
         players_data = response.json()
-        print(f"[DEBUG] Players data count: {len(players_data) if isinstance(players_data, list) else 'N/A'}")
+        logger.debug("Players data count: %s", len(players_data) if isinstance(players_data, list) else 'N/A')
         
         # Cache the players data
         _cache_players(players_data)
         
         return players_data
     except requests.exceptions.RequestException as e:
-        print(f"[DEBUG] Error getting players: {str(e)}")
-        return []
+        logger.error("Error getting players: %s", e)
+        stale = _load_last_good('players', 'all_players')
+        return _serve_stale('players', stale) if stale else []
 
 # Para obtener detalles de un jugador específico
 def get_player_by_id(player_id):
@@ -260,30 +333,24 @@ def get_player_by_id(player_id):
         return cached_player
     
     url = f"{BASE_URL}/players/{player_id}"
-    headers = {
-        "Authorization": AUTH_HEADER,
-        "x-iterpro-api-key": API_KEY,
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-    print("[DEBUG] Player Details URL:", url)
-    print("[DEBUG] Player Details HEADERS:", headers)
+    logger.debug("Player Details URL: %s", url)
 
     try:
-        response = requests.get(url, headers=headers)
-        print(f"[DEBUG] Player response status: {response.status_code}")
-        print(f"[DEBUG] Player response content: {response.text[:500]}...")
+        response = _iterpro_get(url, "players/{id}")
+        logger.debug("Player response status: %s", response.status_code)
+        logger.debug("Player response content: %s...", Lazy(lambda: response.text[:500]))
         response.raise_for_status()
         player_data = response.json()
-        print(f"[DEBUG] Player data: {player_data.get('displayName', 'N/A') if player_data else 'N/A'}")
+        logger.debug("Player data: %s", player_data.get('displayName', 'N/A') if player_data else 'N/A')
         
         # Cache the player data
         _cache_player(player_id, player_data)
         
         return player_data
     except requests.exceptions.RequestException as e:
-        print(f"[DEBUG] Error getting player details: {str(e)}")
-        return None
+        logger.error("Error getting player details: %s", e)
+        stale = _load_last_good('player', player_id)
+        return _serve_stale('player', stale) if stale else None
 
 # Para obtener información de un equipo específico
 def get_team_by_id(team_id):
@@ -293,30 +360,24 @@ def get_team_by_id(team_id):
         return cached_team
     
     url = f"{BASE_URL}/teams/{team_id}"
-    headers = {
-        "Authorization": AUTH_HEADER,
-        "x-iterpro-api-key": API_KEY,
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-    print("[DEBUG] Team Details URL:", url)
-    print("[DEBUG] Team Details HEADERS:", headers)
+    logger.debug("Team Details URL: %s", url)
 
     try:
-        response = requests.get(url, headers=headers)
-        print(f"[DEBUG] Team response status: {response.status_code}")
-        print(f"[DEBUG] Team response content: {response.text[:500]}...")
+        response = _iterpro_get(url, "teams/{id}")
+        logger.debug("Team response status: %s", response.status_code)
+        logger.debug("Team response content: %s...", Lazy(lambda: response.text[:500]))
         response.raise_for_status()
         team_data = response.json()
-        print(f"[DEBUG] Team data: {team_data}")
+        logger.debug("Team data: %s", team_data)
         
         # Cache the team data
         _cache_team(team_id, team_data)
         
         return team_data
     except requests.exceptions.RequestException as e:
-        print(f"[DEBUG] Error getting team details: {str(e)}")
-        return None
+        logger.error("Error getting team details: %s", e)
+        stale = _load_last_good('team', team_id)
+        return _serve_stale('teams', stale) if stale else None
 
 # Para obtener todos los equipos
 def get_teams():
@@ -326,22 +387,15 @@ def get_teams():
         return cached_teams
     
     url = f"{BASE_URL}/teams"
-    headers = {
-        "Authorization": AUTH_HEADER,
-        "x-iterpro-api-key": API_KEY,
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-    print("[DEBUG] Teams URL:", url)
-    print("[DEBUG] Teams HEADERS:", headers)
+    logger.debug("Teams URL: %s", url)
 
     try:
-        response = requests.get(url, headers=headers)
-        print(f"[DEBUG] Teams response status: {response.status_code}")
-        print(f"[DEBUG] Teams response content: {response.text[:500]}...")
+        response = _iterpro_get(url, "teams")
+        logger.debug("Teams response status: %s", response.status_code)
+        logger.debug("Teams response content: %s...", Lazy(lambda: response.text[:500]))
         response.raise_for_status()
         teams_data = response.json()
-        print(f"[DEBUG] Teams data: {teams_data}")
+        logger.debug("Teams data: %s", teams_data)
         
         # Cache all teams data
         _cache_team('all_teams', teams_data)
@@ -354,8 +408,29 @@ def get_teams():
         
         return teams_data
     except requests.exceptions.RequestException as e:
-        print(f"[DEBUG] Error getting teams: {str(e)}")
-        return []
+        logger.error("Error getting teams: %s", e)
+        stale = _load_last_good('team', 'all_teams')
+        return _serve_stale('teams', stale) if stale else []
+
+def get_roster():
+    """Normalized roster index (see roster.py), rebuilt only when the roster is refreshed"""
+    players = get_players()
+    if not players:
+        return RosterIndex([])  # failed fetch; don't pin an empty index to the current version
+    version = median_cache.get_data_version('roster')
+    if version is None:
+        # Players served from the response cache after the version was evicted: record it once
+        version = fingerprint(players)
+        median_cache.set_data_version('roster', version)
+    return get_roster_index(players, version)
+
+def get_cached_roster():
+    """Roster index from the cached player list (or its last good copy), never calling Iterpro; empty if none"""
+    players = _get_cached_players() or _load_last_good('players', 'all_players')
+    if not players:
+        return RosterIndex([])
+    # Same version get_roster() records for this list, without writing it
+    return get_roster_index(players, median_cache.get_data_version('roster') or fingerprint(players))
 
 # Para obtener jugadores de un equipo específico
 def get_players_by_team(team_id):
@@ -363,45 +438,81 @@ def get_players_by_team(team_id):
     try:
         all_players = get_players()
         team_players = [player for player in all_players if player.get('teamId') == team_id]
-        print(f"[DEBUG] Team ID: {team_id}, Total players: {len(all_players)}, Team players: {len(team_players)}")
+        logger.debug("Team ID: %s, Total players: %d, Team players: %d", team_id, len(all_players), len(team_players))
         return team_players
     except Exception as e:
-        print(f"[DEBUG] Error getting team players: {str(e)}")
+        logger.error("Error getting team players: %s", e)
         return []
 
-def get_player_test_instances(player_id):
-    """Get test instances for a specific player"""
+def _fetch_test_instances(player_id):
+    """Test instances from the median cache or Iterpro; raises RequestException when Iterpro fails"""
     # Try to get from cache first
     cached_data = median_cache.get_cached_test_instances(player_id)
     if cached_data is not None:
-        print(f"[CACHE HIT] Test instances for player {player_id}")
+        debug_sampled(logger, "[CACHE HIT] Test instances for player %s", player_id)
         return cached_data
     
     url = f"{BASE_URL}/players/{player_id}/test-instances"
-    headers = {
-        "Authorization": AUTH_HEADER,
-        "x-iterpro-api-key": API_KEY,
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
+    response = _iterpro_get(url, "players/{id}/test-instances")
+    response.raise_for_status()
+    test_instances = response.json()
     
+    # Cache the result
+    median_cache.cache_test_instances(player_id, test_instances)
+    debug_sampled(logger, "[CACHE STORED] Test instances for player %s", player_id)
+    
+    return test_instances
+
+def _stale_test_instances(player_id):
+    """The player's results as last stored in the measurement store, [] if never synced"""
+    stale = measurement_store.instances(player_id)
+    return _serve_stale('test_instances', stale) if stale else []
+
+def get_player_test_instances(player_id):
+    """Get test instances for a specific player"""
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        test_instances = response.json()
-        
-        # Cache the result
-        median_cache.cache_test_instances(player_id, test_instances)
-        print(f"[CACHE STORED] Test instances for player {player_id}")
-        
-        return test_instances
+        return _fetch_test_instances(player_id)
     except requests.exceptions.RequestException as e:
-        print(f"[DEBUG] Error getting player test instances: {str(e)}")
-        return []
+        logger.error("Error getting player test instances: %s", e)
+        return _stale_test_instances(player_id)
+
+def sync_measurement_history(player_id):
+    """Load the player's test instances into the measurement store unless it holds a fresh copy"""
+    if measurement_store.is_fresh(player_id):
+        return
+    try:
+        test_instances = _fetch_test_instances(player_id)
+    except requests.exceptions.RequestException as e:
+        # Keep the stored history (and its sync time) until Iterpro answers again
+        logger.warning("Keeping stored measurement history for player %s: %s", player_id, e)
+        return
+    if test_instances:
+        measurement_store.replace_player(player_id, test_instances)
+
+def sync_roster_history(player_ids):
+    """Sync the measurement history of every player that has no fresh copy in the store; returns how many were due"""
+    fresh = measurement_store.fresh_players()
+    due = [player_id for player_id in player_ids if player_id not in fresh]
+    with priority("background"):
+        for player_id in due:
+            try:
+                sync_measurement_history(player_id)
+            except Exception as e:
+                logger.warning("Error syncing measurement history for player %s: %s", player_id, e)
+    return len(due)
+
+def get_measurement_history(player_id, test_name, months=None, before=None, limit=None):
+    """
+    [(timestamp, value)] of a player's real measurements for one test, oldest first.
+    months bounds the range; before (a timestamp) and limit page back from the newest.
+    """
+    sync_measurement_history(player_id)
+    since = (datetime.now() - timedelta(days=30 * months)).timestamp() if months else None
+    return measurement_store.series(player_id, test_name, since=since, before=before, limit=limit)
 
 def get_player_test_instances_batch(player_ids, max_players=10):
     """
-    Fetch test instances for multiple players efficiently
+    Fetch test instances for multiple players efficiently, as {player_id: TestResults}
     Limit to max_players to avoid overwhelming the API
     """
     try:
@@ -410,39 +521,53 @@ def get_player_test_instances_batch(player_ids, max_players=10):
         # Limit the number of players to avoid API overload
         limited_player_ids = player_ids[:max_players]
         
-        # Create cache key for this batch
-        cache_key = f"batch_{len(limited_player_ids)}_players"
+        # Create cache key for this batch (the ids, so different teams never share a batch)
+        cache_key = f"batch_{len(limited_player_ids)}_{fingerprint(sorted(limited_player_ids))}"
         
         # Try to get from cache first
         cached_data = median_cache.get_cached_test_data(cache_key)
         if cached_data is not None:
-            print(f"[CACHE HIT] Batch test data for {len(limited_player_ids)} players")
-            return cached_data
+            logger.debug("[CACHE HIT] Batch test data for %d players", len(limited_player_ids))
+            return {player_id: TestResults.unpack(packed) for player_id, packed in cached_data.items()}
+        
+        logger.debug("Fetching test instances for %d players", len(limited_player_ids))
         
-        print(f"[DEBUG] Fetching test instances for {len(limited_player_ids)} players")
+        # One backend round trip for every player already cached
+        cached_instances = median_cache.get_cached_test_instances_many(limited_player_ids)
+        stale = False
         
         for player_id in limited_player_ids:
             try:
-                test_instances = get_player_test_instances(player_id)
+                try:
+                    # Cohort data for medians yields to the page's own Iterpro calls
+                    with priority("precompute"):
+                        test_instances = cached_instances.get(player_id) or _fetch_test_instances(player_id)
+                except requests.exceptions.RequestException as e:
+                    logger.error("Error getting player test instances: %s", e)
+                    test_instances = _stale_test_instances(player_id)
+                    stale = True
                 if test_instances:
-                    all_test_data[player_id] = test_instances
-                    print(f"[DEBUG] Got {len(test_instances)} test instances for player {player_id}")
+                    # Only name/date/value columns are kept for the median calculations
+                    all_test_data[player_id] = TestResults.from_instances(test_instances)
+                    debug_sampled(logger, "Got %d test instances for player %s", len(test_instances), player_id)
                 else:
-                    print(f"[DEBUG] No test instances for player {player_id}")
+                    debug_sampled(logger, "No test instances for player %s", player_id)
             except Exception as e:
-                print(f"Error fetching test instances for player {player_id}: {e}")
+                logger.warning("Error fetching test instances for player %s: %s", player_id, e)
                 continue
         
-        print(f"[DEBUG] Total players with test data: {len(all_test_data)}")
+        logger.debug("Total players with test data: %d", len(all_test_data))
         
-        # Cache the batch result
-        median_cache.cache_test_data(cache_key, all_test_data, len(all_test_data))
-        print(f"[CACHE STORED] Batch test data for {len(all_test_data)} players")
+        # Cache the batch result (not when part of it is persisted data standing in for Iterpro)
+        if not stale:
+            median_cache.cache_test_data(cache_key, {player_id: results.pack() for player_id, results in all_test_data.items()},
+                                         len(all_test_data))
+            logger.debug("[CACHE STORED] Batch test data for %d players", len(all_test_data))
         
         return all_test_data
         
     except Exception as e:
-        print(f"Error in get_player_test_instances_batch: {e}")
+        logger.error("Error in get_player_test_instances_batch: %s", e)
         return {}
 
 def extract_latest_test_value(test_instances, test_name):
@@ -452,8 +577,11 @@ def extract_latest_test_value(test_instances, test_name):
     try:
         if not test_instances or test_instances is None:
             return None
+        if hasattr(test_instances, 'latest'):
+            # TestResults or a row of the shared roster matrix (see roster_matrix.py)
+            return test_instances.latest(test_name)
         
-        print(f"[DEBUG] Looking for test '{test_name}' in {len(test_instances)} instances")
+        debug_sampled(logger, "Looking for test '%s' in %d instances", test_name, len(test_instances))
         matching_instances = []
         
         for instance in test_instances:
@@ -463,7 +591,7 @@ def extract_latest_test_value(test_instances, test_name):
             if (test_name.lower() in instance_test_name.lower() or 
                 instance_test_name.lower() in test_name.lower()):
                 
-                print(f"[DEBUG] Found match! Test name: '{instance_test_name}'")
+                debug_sampled(logger, "Found match! Test name: '%s'", instance_test_name)
                 results = instance.get('results', {})
                 if results and 'rawValue' in results:
                     raw_value = results.get('rawValue')
@@ -474,59 +602,53 @@ def extract_latest_test_value(test_instances, test_name):
                             'value': raw_value,
                             'date': date
                         })
-                        print(f"[DEBUG] Added value: {raw_value} from date: {date}")
+                        debug_sampled(logger, "Added value: %s from date: %s", raw_value, date)
         
         if matching_instances:
             # Sort by date and get the latest
             latest_instance = max(matching_instances, key=lambda x: x.get('date', ''))
-            print(f"[DEBUG] Returning latest value: {latest_instance.get('value')}")
+            debug_sampled(logger, "Returning latest value: %s", latest_instance.get('value'))
             return latest_instance.get('value')
         
-        print(f"[DEBUG] No matching instances found for '{test_name}'")
+        debug_sampled(logger, "No matching instances found for '%s'", test_name)
         return None
         
     except Exception as e:
-        print(f"Error extracting latest test value for {test_name}: {e}")
+        logger.error("Error extracting latest test value for %s: %s", test_name, e)
         return None
 
-def get_player_thresholds(player_id):
-    """Get thresholds for a specific player"""
-    url = f"{BASE_URL}/players/{player_id}/thresholds"
-    headers = {
-        "Authorization": AUTH_HEADER,
-        "x-iterpro-api-key": API_KEY,
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
+def _get_thresholds(owner, owner_id):
+    """Thresholds of a player or team ('players' / 'teams'), cached like the other responses"""
+    key = f"{owner}|{owner_id}"
+    cached_thresholds = _load_cache_entry('thresholds', key)
+    record_cache_lookup('response', 'thresholds', cached_thresholds is not None)
+    if cached_thresholds is not None:
+        return cached_thresholds
+    
+    url = f"{BASE_URL}/{owner}/{owner_id}/thresholds"
     
     try:
-        response = requests.get(url, headers=headers)
+        response = _iterpro_get(url, f"{owner}/{{id}}/thresholds")
         response.raise_for_status()
-        return response.json()
+        thresholds = response.json()
+        _save_cache_entry('thresholds', key, thresholds)
+        return thresholds
     except requests.exceptions.RequestException as e:
-        print(f"[DEBUG] Error getting player thresholds: {str(e)}")
-        return []
+        logger.error("Error getting %s thresholds: %s", owner, e)
+        stale = _load_last_good('thresholds', key)
+        return _serve_stale('thresholds', stale) if stale is not None else []
+
+def get_player_thresholds(player_id):
+    """Get thresholds for a specific player"""
+    return _get_thresholds('players', player_id)
 
 def get_team_thresholds(team_id):
     """Get thresholds for a specific team"""
-    url = f"{BASE_URL}/teams/{team_id}/thresholds"
-    headers = {
-        "Authorization": AUTH_HEADER,
-        "x-iterpro-api-key": API_KEY,
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-    
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"[DEBUG] Error getting team thresholds: {str(e)}")
-        return []
+    return _get_thresholds('teams', team_id)
 
 def generate_historical_data(current_value, test_name, num_entries=10):
     """Generate historical data with normal distribution for a test"""
+    import numpy as np  # heavy; only needed when charts are generated
     # Define test-specific parameters
     test_configs = {
         # Anthropometry
@@ -610,6 +732,7 @@ def generate_historical_data(current_value, test_name, num_entries=10):
 
 def calculate_median_by_position_and_age(all_players, current_player, test_name):
     """Calculate median for players with same position and ±3 age range"""
+    import numpy as np
     if not current_player.get('position') or not current_player.get('age'):
         return None
     
@@ -640,6 +763,7 @@ def calculate_median_by_position_and_age(all_players, current_player, test_name)
 
 def calculate_team_median(team_players, test_name):
     """Calculate median for all players in current team"""
+    import numpy as np
     if not team_players:
         return None
     
@@ -668,8 +792,8 @@ def get_enhanced_athletic_performance(player_id, team_id=None):
         if not team_id:
             team_id = player.get('teamId')
         
-        # Get test instances for the player
-        test_instances = get_player_test_instances(player_id)
+        # Real history of the player (re-read from Iterpro only when stale)
+        sync_measurement_history(player_id)
         
         # Get player thresholds
         player_thresholds = get_player_thresholds(player_id)
@@ -677,101 +801,40 @@ def get_enhanced_athletic_performance(player_id, team_id=None):
         # Get team thresholds
         team_thresholds = get_team_thresholds(team_id) if team_id else []
         
-        # Extract real test data from test instances
-        real_test_data = {}
-        print(f"[DEBUG] Processing {len(test_instances) if test_instances else 0} test instances")
-        if test_instances:
-            for instance in test_instances:
-                test_name = instance.get('testName', '')
-                date = instance.get('date', '')
-                results = instance.get('results', {})
-                
-                print(f"[DEBUG] Test instance - name: '{test_name}', date: '{date}', results: {results}")
-                
-                if results and 'rawValue' in results:
-                    raw_value = results.get('rawValue')
-                    raw_field = results.get('rawField', '')
-                    
-                    if test_name not in real_test_data:
-                        real_test_data[test_name] = []
-                    
-                    real_test_data[test_name].append({
-                        'date': date,
-                        'value': raw_value,
-                        'field': raw_field
-                    })
-        
-        print(f"[DEBUG] Real test data keys: {list(real_test_data.keys())}")
-        
-        # Define test categories and their expected test names
-        test_categories = {
-            'Anthropometry': {
-                'Height': {'unit': 'cm', 'std_dev': 2.0, 'is_integer': False},
-                'Weight': {'unit': 'kg', 'std_dev': 3.0, 'is_integer': False},
-                'BMI': {'unit': '', 'std_dev': 0.5, 'is_integer': False},
-                '% BF': {'unit': '%', 'std_dev': 1.0, 'is_integer': False}
-            },
-            'Power': {
-                'Single Leg Jump': {'unit': '%', 'std_dev': 2.0, 'is_integer': False},
-                'CMJ Arm Swing HT': {'unit': 'cm', 'std_dev': 3.0, 'is_integer': False},
-                'CMJ Arm Locked HT': {'unit': 'cm', 'std_dev': 3.0, 'is_integer': False},
-                'Diff % Height Swing-Locked': {'unit': '%', 'std_dev': 1.0, 'is_integer': False}
-            },
-            'Speed': {
-                '5m': {'unit': 's', 'std_dev': 0.1, 'is_integer': False},
-                '10m': {'unit': 's', 'std_dev': 0.15, 'is_integer': False},
-                '20m': {'unit': 's', 'std_dev': 0.2, 'is_integer': False},
-                '30m': {'unit': 's', 'std_dev': 0.25, 'is_integer': False}
-            },
-            'Agility': {
-                'T Test': {'unit': 's', 'std_dev': 0.3, 'is_integer': False},
-                'Illinois': {'unit': 's', 'std_dev': 0.4, 'is_integer': False},
-                'ArrowHead': {'unit': 's', 'std_dev': 0.4, 'is_integer': False}
-            },
-            'Endurance': {
-                'Lactate': {'unit': 'mmol/L', 'std_dev': 0.5, 'is_integer': False},
-                'YYIRT1': {'unit': 'm', 'std_dev': 100, 'is_integer': True},
-                'YYIRT2': {'unit': 'm', 'std_dev': 80, 'is_integer': True}
-            }
-        }
+        # Every test of the player over the charted window, in one indexed scan
+        since = (datetime.now() - timedelta(days=30 * HISTORY_MONTHS)).timestamp()
+        history = measurement_store.player_series(player_id, since=since)
+        latest = measurement_store.latest(player_id) if len(history) < len(TEST_CATEGORIES) else {}
+        logger.debug("Measurement history tests: %s", Lazy(lambda: list(history.keys())))
         
         enhanced_data = {}
         
         # Process each test category
-        for category, tests in test_categories.items():
+        for category, tests in TEST_CATEGORIES.items():
             enhanced_data[category] = {}
             
             for test_name, config in tests.items():
-                # Look for real data for this test
-                real_value = None
-                real_date = None
-                
-                # Try to find matching test data
-                for api_test_name, test_results in real_test_data.items():
-                    # Check if the API test name contains our test name or vice versa
-                    if (test_name.lower() in api_test_name.lower() or 
-                        api_test_name.lower() in test_name.lower()):
-                        if test_results:
-                            # Get the most recent test result
-                            latest_result = max(test_results, key=lambda x: x.get('date', ''))
-                            real_value = latest_result.get('value')
-                            real_date = latest_result.get('date')
-                            break
+                # Real measurements in the window, else the last one ever taken
+                points = history.get(test_name) or ([latest[test_name]] if test_name in latest else [])
+                if points:
+                    enhanced_data[category][test_name] = real_historical_data(
+                        points[-HISTORY_MAX_POINTS:], test_name, is_integer=config['is_integer'], unit=config['unit']
+                    )
+                    continue
                 
                 # If no real data found, use player's basic measurements for some tests
-                if real_value is None:
-                    if test_name == 'Height' and player.get('height'):
-                        real_value = player.get('height')
-                    elif test_name == 'Weight' and player.get('weight'):
-                        real_value = player.get('weight')
-                    elif test_name == 'BMI' and player.get('height') and player.get('weight'):
-                        height_m = player.get('height') / 100
-                        real_value = player.get('weight') / (height_m * height_m)
-                    else:
-                        # Use reasonable defaults based on test type
-                        real_value = get_default_test_value(test_name)
+                if test_name == 'Height' and player.get('height'):
+                    real_value = player.get('height')
+                elif test_name == 'Weight' and player.get('weight'):
+                    real_value = player.get('weight')
+                elif test_name == 'BMI' and player.get('height') and player.get('weight'):
+                    height_m = player.get('height') / 100
+                    real_value = player.get('weight') / (height_m * height_m)
+                else:
+                    # Use reasonable defaults based on test type
+                    real_value = get_default_test_value(test_name)
                 
-                # Generate historical data based on real value
+                # Generate historical data based on that value
                 if real_value is not None:
                     historical_data = generate_historical_data(
                         real_value, 
@@ -779,7 +842,9 @@ def get_enhanced_athletic_performance(player_id, team_id=None):
                         num_entries=10,
                         std_dev=config['std_dev'],
                         is_integer=config['is_integer'],
-                        unit=config['unit']
+                        unit=config['unit'],
+                        # Stable per player, test and day
+                        seed=zlib.crc32(f"{player_id}|{test_name}|{real_value}|{datetime.now():%Y-%m-%d}".encode())
                     )
                     
                     enhanced_data[category][test_name] = historical_data
@@ -787,14 +852,12 @@ def get_enhanced_athletic_performance(player_id, team_id=None):
         return {
             'player': player,
             'enhanced_data': enhanced_data,
-            'test_instances': test_instances,
             'player_thresholds': player_thresholds,
-            'team_thresholds': team_thresholds,
-            'real_test_data': real_test_data
+            'team_thresholds': team_thresholds
         }
         
     except Exception as e:
-        print(f"Error in get_enhanced_athletic_performance: {e}")
+        logger.error("Error in get_enhanced_athletic_performance: %s", e)
         return None
 
 def get_default_test_value(test_name):
@@ -823,10 +886,30 @@ def get_default_test_value(test_name):
     }
     return defaults.get(test_name, 0)
 
-def generate_historical_data(current_value, test_name, num_entries=10, std_dev=None, is_integer=False, unit=''):
+def real_historical_data(points, test_name, is_integer=False, unit=''):
+    """Chart data from stored (timestamp, value) points, newest first like generate_historical_data"""
+    return {
+        'test_name': test_name,
+        'unit': unit,
+        'measurements': [
+            {
+                'date': datetime.fromtimestamp(measured_at).strftime('%Y-%m-%d'),
+                'value': int(round(value)) if is_integer else value,
+                'is_real': True
+            }
+            for measured_at, value in reversed(points)
+        ]
+    }
+
+def generate_historical_data(current_value, test_name, num_entries=10, std_dev=None, is_integer=False, unit='', seed=None):
     """
-    Generate historical data based on real current value with realistic distribution
+    Generate historical data based on real current value with realistic distribution.
+    With a seed the same history is produced on every call, so pages and cached
+    report charts agree.
     """
+    import numpy as np  # heavy; only needed when charts are generated
+    rng = np.random.default_rng(seed) if seed is not None else np.random
+    date_rng = random.Random(seed) if seed is not None else random
     if std_dev is None:
         # Default standard deviation based on test type
         if 'Height' in test_name:
@@ -854,7 +937,7 @@ def generate_historical_data(current_value, test_name, num_entries=10, std_dev=N
     # Generate historical dates (2-4 weeks apart)
     for i in range(num_entries - 1, -1, -1):
         # Calculate date (most recent first)
-        weeks_back = (num_entries - 1 - i) * random.uniform(2, 4)
+        weeks_back = (num_entries - 1 - i) * date_rng.uniform(2, 4)
         date = current_date - timedelta(weeks=weeks_back)
         
         if i == 0:  # Most recent measurement (real data)
@@ -862,7 +945,7 @@ def generate_historical_data(current_value, test_name, num_entries=10, std_dev=N
             is_real = True
         else:  # Historical measurements (generated)
             # Generate value using normal distribution around current_value
-            generated_value = np.random.normal(current_value, std_dev)
+            generated_value = rng.normal(current_value, std_dev)
             
             # Apply reasonable bounds based on test type
             if 'Height' in test_name:
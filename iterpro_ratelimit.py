@@ -0,0 +1,155 @@
+"""
+Outbound rate limiting for Iterpro calls.
+
+Every call draws a token from the bucket of its endpoint template ("players",
+"players/{id}/test-instances", ...). Buckets live in a small SQLite file, so
+all workers of a node share one budget and a cold start cannot burst past it.
+
+Calls carry a priority class (see priority()):
+    interactive   page loads and API requests (default); may drain a bucket
+    precompute    median batches fetched for a page; leave 25% of the burst
+    background    prefetch and leaderboard syncs; leave 50% of the burst
+so lower classes wait while interactive calls still find tokens. A call that
+cannot get a token within its class's wait limit raises RateLimited, which is
+a requests RequestException and takes the callers' usual error path.
+
+Environment variables:
+    ITERPRO_RATE_LIMITS     endpoint=rate:burst pairs, requests per second and bucket size;
+                            '*' is the default for other endpoints, 'off' disables
+                            (default: *=10:20)
+    ITERPRO_RATE_LIMIT_DB   SQLite file shared by the workers of a node
+                            (default: <tmp>/soccer_central_ratelimit.db)
+"""
+import contextvars
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from utils.metrics import describe, inc, observe
+
+ITERPRO_RATE_LIMITS = os.getenv("ITERPRO_RATE_LIMITS", "*=10:20")
+ITERPRO_RATE_LIMIT_DB = os.getenv(
+    "ITERPRO_RATE_LIMIT_DB", os.path.join(tempfile.gettempdir(), "soccer_central_ratelimit.db"))
+
+# Share of the burst each class leaves for higher ones, and how long it may wait for a token
+PRIORITY_RESERVE = {"interactive": 0.0, "precompute": 0.25, "background": 0.5}
+PRIORITY_MAX_WAIT = {"interactive": 5.0, "precompute": 10.0, "background": 30.0}
+
+_priority = contextvars.ContextVar("iterpro_priority", default="interactive")
+
+
+class RateLimited(requests.exceptions.RequestException):
+    """No token became available within the caller's wait limit"""
+
+
+@contextmanager
+def priority(name):
+    """Run the Iterpro calls in this block under a priority class"""
+    if name not in PRIORITY_RESERVE:
+        raise ValueError(f"Unknown priority class '{name}' (expected {', '.join(PRIORITY_RESERVE)})")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def parse_limits(spec):
+    """{endpoint: (rate per second, burst)} from 'players=2:5,*=10:20' ({} for 'off')"""
+    if spec.strip().lower() in ("", "off", "0"):
+        return {}
+    limits = {}
+    for item in spec.split(","):
+        endpoint, _, budget = item.strip().rpartition("=")
+        rate, _, burst = budget.partition(":")
+        rate = float(rate)
+        limits[endpoint or "*"] = (rate, float(burst) if burst else max(rate, 1.0))
+    return limits
+
+
+class RateLimiter:
+    """Token buckets per endpoint in a SQLite file shared by the node's workers"""
+
+    def __init__(self, db_path=ITERPRO_RATE_LIMIT_DB, limits=None):
+        self.db_path = str(db_path)
+        self.limits = parse_limits(ITERPRO_RATE_LIMITS) if limits is None else limits
+        self._local = threading.local()
+        if self.limits:
+            self._connect().execute('''
+                CREATE TABLE IF NOT EXISTS buckets (
+                    endpoint TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # Autocommit; each take runs in its own BEGIN IMMEDIATE transaction
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _take(self, endpoint, rate, burst, reserve):
+        """Take one token if more than reserve are left; returns 0 or the seconds to wait"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE endpoint = ?", (endpoint,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + max(now - row[1], 0.0) * rate)
+            wait = 0.0
+            if tokens >= 1 + reserve:
+                tokens -= 1
+            else:
+                wait = (1 + reserve - tokens) / rate
+            conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (endpoint, tokens, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, endpoint, priority_class=None):
+        """Block until the endpoint's bucket grants a token; returns the seconds waited"""
+        limit = self.limits.get(endpoint) or self.limits.get("*")
+        if limit is None:
+            return 0.0
+        rate, burst = limit
+        priority_class = priority_class or current_priority()
+        reserve = PRIORITY_RESERVE[priority_class] * burst
+        deadline = time.monotonic() + PRIORITY_MAX_WAIT[priority_class]
+        start = time.monotonic()
+        while True:
+            wait = self._take(endpoint, rate, burst, reserve)
+            if not wait:
+                waited = time.monotonic() - start
+                if waited:
+                    observe("iterpro_rate_limit_wait_seconds", waited, endpoint=endpoint, priority=priority_class)
+                return waited
+            if time.monotonic() + wait > deadline:
+                inc("iterpro_rate_limited_total", endpoint=endpoint, priority=priority_class)
+                raise RateLimited(f"Iterpro rate limit for '{endpoint}' ({priority_class}): no token within "
+                                  f"{PRIORITY_MAX_WAIT[priority_class]:g}s")
+            time.sleep(wait)
+
+
+def create_rate_limiter():
+    """Limiter configured from ITERPRO_RATE_LIMITS / ITERPRO_RATE_LIMIT_DB"""
+    return RateLimiter()
+
+
+describe("iterpro_rate_limit_wait_seconds", "Time Iterpro calls waited for a rate limit token")
+describe("iterpro_rate_limited_total", "Iterpro calls rejected after waiting too long for a token")
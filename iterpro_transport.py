@@ -0,0 +1,140 @@
+"""
+Pluggable HTTP transport for the Iterpro client.
+
+    live    - real requests to BASE_URL (default)
+    record  - real requests, every response also appended to a cassette
+    replay  - responses served from a cassette, no network at all
+
+Cassettes are gzip-compressed JSON lines, one interaction per line, keyed by
+method and path relative to BASE_URL so they replay against any base URL.
+Replay can reproduce the recorded latency, scaled by ITERPRO_REPLAY_LATENCY
+(1.0 = original, 0 = instant).
+
+Environment variables:
+    ITERPRO_TRANSPORT        live | record | replay (default: live)
+    ITERPRO_CASSETTE         Cassette path (default: cassettes/iterpro.jsonl.gz)
+    ITERPRO_REPLAY_LATENCY   Latency scale for replay (default: 0)
+    ITERPRO_TIMEOUT          Seconds a live request may take to connect or to send data (default: 10)
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+
+from utils.logger import get_logger
+
+logger = get_logger("transport")
+
+DEFAULT_CASSETTE = Path(__file__).resolve().parent / "cassettes" / "iterpro.jsonl.gz"
+ITERPRO_TIMEOUT = float(os.getenv("ITERPRO_TIMEOUT", "10"))
+
+
+class CassetteResponse:
+    """Minimal stand-in for requests.Response built from a recorded interaction"""
+
+    def __init__(self, url, status_code, body, elapsed=0.0):
+        self.url = url
+        self.status_code = status_code
+        self.content = body.encode("utf-8")
+        self.text = body
+        self.elapsed = elapsed
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+def _interaction_key(method, url, base_url):
+    if base_url and url.startswith(base_url):
+        path = url[len(base_url):]
+    else:
+        path = urlsplit(url).path
+    return f"{method.upper()} {path or '/'}"
+
+
+class LiveTransport:
+    """Plain requests against the Iterpro API"""
+
+    def __init__(self, session=None, timeout=None):
+        self.session = session or requests.Session()
+        self.timeout = ITERPRO_TIMEOUT if timeout is None else timeout
+
+    def get(self, url, headers):
+        return self.session.get(url, headers=headers, timeout=self.timeout or None)
+
+
+class RecordingTransport:
+    """Delegates to another transport and appends each response to a cassette"""
+
+    def __init__(self, cassette_path, base_url, inner=None):
+        self.cassette_path = Path(cassette_path)
+        self.base_url = base_url
+        self.inner = inner or LiveTransport()
+        self._lock = threading.Lock()
+        self.cassette_path.parent.mkdir(parents=True, exist_ok=True)
+
+    def get(self, url, headers):
+        start = time.perf_counter()
+        response = self.inner.get(url, headers)
+        elapsed = time.perf_counter() - start
+        entry = {
+            "key": _interaction_key("GET", url, self.base_url),
+            "status": response.status_code,
+            "elapsed": round(elapsed, 4),
+            "body": response.text,
+        }
+        # Each append is its own gzip member; gzip readers concatenate them transparently
+        with self._lock, gzip.open(self.cassette_path, "at", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        return response
+
+
+class ReplayTransport:
+    """Serves responses from a cassette; unknown requests get a 404"""
+
+    def __init__(self, cassette_path, base_url, latency_scale=0.0):
+        self.cassette_path = Path(cassette_path)
+        self.base_url = base_url
+        self.latency_scale = latency_scale
+        self.interactions = {}
+        with gzip.open(self.cassette_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.interactions[entry["key"]] = entry  # last recording wins
+        logger.info("Loaded %d recorded interactions from %s", len(self.interactions), self.cassette_path)
+
+    def get(self, url, headers):
+        key = _interaction_key("GET", url, self.base_url)
+        entry = self.interactions.get(key)
+        if entry is None:
+            logger.warning("No recorded response for %s", key)
+            return CassetteResponse(url, 404, '{"error": "Not recorded"}')
+        if self.latency_scale:
+            time.sleep(entry.get("elapsed", 0.0) * self.latency_scale)
+        return CassetteResponse(url, entry["status"], entry["body"], entry.get("elapsed", 0.0))
+
+
+def create_transport(mode=None, cassette_path=None, base_url=None, latency_scale=None):
+    """Build the transport selected by arguments or ITERPRO_* environment variables"""
+    mode = (mode or os.getenv("ITERPRO_TRANSPORT", "live")).lower()
+    cassette_path = cassette_path or os.getenv("ITERPRO_CASSETTE") or DEFAULT_CASSETTE
+    base_url = base_url if base_url is not None else os.getenv("BASE_URL", "")
+    if latency_scale is None:
+        latency_scale = float(os.getenv("ITERPRO_REPLAY_LATENCY", "0"))
+
+    if mode == "record":
+        return RecordingTransport(cassette_path, base_url)
+    if mode == "replay":
+        return ReplayTransport(cassette_path, base_url, latency_scale)
+    if mode != "live":
+        raise ValueError(f"Unknown ITERPRO_TRANSPORT '{mode}' (expected live, record or replay)")
+    return LiveTransport()
@@ -0,0 +1,160 @@
+"""
+Club-wide leaderboards per test.
+
+Leaderboards read the node's shared roster matrix (see roster_matrix.py). For
+every test it holds the rows with a value in sorted order, so the best or
+worst N players (optionally of one team, position or age bucket, through
+the matrix's code columns) are a walk from one end of that order. Writes to
+the measurement store (page views, /ingest, other workers) show up once the
+background rebuild they start has renamed the new matrix into place.
+
+Requests never call Iterpro: they rank whatever the measurement store holds
+for the cached player list (or its last good copy), and answer
+LeaderboardUnavailable while no list has been cached yet. sync_roster()
+refreshes the player list and fetches the histories that are missing or
+older than the sync TTL from the background maintenance thread (see
+utils/cache_maintenance.py).
+
+Environment variables:
+    LEADERBOARD_MAX_N   Largest number of players per leaderboard request (default: 100)
+"""
+import os
+from datetime import date, datetime
+
+import iterpro_client
+import roster_matrix
+from iterpro_client import median_cache
+from measurements import CANONICAL_TESTS, TEST_CONFIG, canonical_test
+from utils.logger import get_logger
+from utils.metrics import timed
+
+LEADERBOARD_MAX_N = int(os.getenv("LEADERBOARD_MAX_N", "100"))
+
+logger = get_logger("leaderboards")
+
+_roster = None
+
+
+class LeaderboardUnavailable(RuntimeError):
+    """The roster (and so the matrix) cannot be loaded right now"""
+
+
+def _current_roster():
+    """Cached roster kept while its version and day hold (skips decoding the player list on every request)"""
+    global _roster
+    roster = _roster
+    if roster is None or roster.built_on != date.today() or median_cache.get_data_version('roster') != roster.version:
+        roster = iterpro_client.get_cached_roster()
+        # An empty roster is not kept: the next request looks for a cached list again
+        _roster = roster if roster.records else None
+    return roster
+
+
+def get_matrix():
+    """The shared matrix for the current roster (None while the roster is unavailable)"""
+    return roster_matrix.get_matrix(_current_roster())
+
+
+def sync_roster():
+    """Maintenance task: refresh the roster and load the missing or expired histories of its players into the store"""
+    roster = iterpro_client.get_roster()
+    synced = iterpro_client.sync_roster_history([record.id for record in roster.records])
+    if synced and roster.records:
+        # Already off the request path: rebuild now rather than on the next read
+        roster_matrix.refresh(roster)
+    return {'synced': synced}
+
+
+def _filters(matrix, team_id, position, age_bucket):
+    """(column, codes) pairs a row must match; None when a filter value is on no row"""
+    filters = []
+    if team_id:
+        filters.append((matrix.codes['team'], {matrix.code('team', team_id)}))
+    if position:
+        filters.append(((matrix.codes['position_group'], matrix.codes['position_code']),
+                        {matrix.code('position_group', position), matrix.code('position_code', position)}))
+    if age_bucket:
+        filters.append((matrix.codes['age_bucket'], {matrix.code('age_bucket', age_bucket)}))
+    for _, codes in filters:
+        codes.discard(None)
+        if not codes:
+            return None
+    return filters
+
+
+def _matches(row, filters):
+    for column, codes in filters:
+        if isinstance(column, tuple):
+            if not any(c[row] in codes for c in column):
+                return False
+        elif column[row] not in codes:
+            return False
+    return True
+
+
+@timed("leaderboard")
+def leaderboard(test_name, n=10, bottom=False, team_id=None, position=None, age_bucket=None, offset=0):
+    """
+    Best (or with bottom=True, worst) n players of a test from the offset-th on, None for an unknown test
+
+    Players tie on equal values and share a competition rank (1, 2, 2, 4),
+    counted over every player that passes the filters, so ranks hold across
+    pages. Removed players are skipped. Raises LeaderboardUnavailable while
+    the roster cannot be loaded.
+    """
+    test = canonical_test(test_name)
+    matrix = get_matrix()
+    if matrix is None:
+        raise LeaderboardUnavailable("The roster is not available yet")
+    if test not in matrix.tests and test not in CANONICAL_TESTS:
+        return None
+    config = TEST_CONFIG.get(test, {})
+    lower_is_better = config.get('lower_is_better', False)
+    roster = _current_roster()
+    order = matrix.order(test)
+    filters = _filters(matrix, team_id, position, age_bucket)
+    players = []
+    if filters is not None:
+        # Walk from the best end (lowest values first when lower is better)
+        walk = iter(order) if lower_is_better != bottom else reversed(order)
+        ranked = ((row, roster.get(matrix.player_id(row))) for row in walk if _matches(row, filters))
+        rank = previous = None
+        place = 0
+        for row, record in ranked:
+            if record is None:
+                continue
+            place += 1
+            value = matrix.value(test, row)
+            if value != previous:
+                rank, previous = place, value
+            if place <= offset:
+                continue
+            if len(players) >= n:
+                break
+            players.append({
+                'rank': rank,
+                'player_id': record.id,
+                'name': record.name,
+                'team_id': record.team_id,
+                'position_group': record.position_group,
+                'age_bucket': record.age_bucket,
+                'value': value,
+                'date': datetime.fromtimestamp(matrix.measured_at(test, row)).strftime('%Y-%m-%d'),
+            })
+    return {
+        'test_name': test,
+        'unit': config.get('unit', ''),
+        'lower_is_better': lower_is_better,
+        'order': 'bottom' if bottom else 'top',
+        'offset': offset,
+        'ranked_players': len(order),
+        'players': players,
+    }
+
+
+def tests():
+    """Tests with a leaderboard and how many players each ranks"""
+    matrix = get_matrix()
+    return [{'test_name': test, 'unit': TEST_CONFIG.get(test, {}).get('unit', ''),
+             'ranked_players': len(matrix.order(test)) if matrix is not None else 0}
+            for test in CANONICAL_TESTS]
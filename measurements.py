@@ -0,0 +1,376 @@
+"""
+Compact, column-oriented test results.
+
+Raw Iterpro test instances are dicts of a dozen fields each, ~170 per player.
+For median calculations only the test name, date and raw value matter, so
+TestResults keeps them as three parallel arrays per player:
+
+    tests   array('H')  index into the process-wide interned test-name table
+    dates   array('d')  unix timestamps
+    values  array('d')  raw values
+
+plus the latest value of each test, computed once. pack()/unpack() turn it into
+plain lists for the cache backends.
+
+MeasurementStore keeps every player's real measurements in a SQLite table
+indexed by (player, canonical test, date), so charts and the history API read
+a time range with one indexed scan instead of re-parsing the instance list.
+
+Environment variables:
+    MEASUREMENT_STORE_PATH   SQLite file of the measurement history (default: measurements.db)
+    MEASUREMENT_SYNC_TTL     Seconds before a player's history is re-read from Iterpro (default: 86400)
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+
+MEASUREMENT_STORE_PATH = os.getenv("MEASUREMENT_STORE_PATH", "measurements.db")
+MEASUREMENT_SYNC_TTL = int(os.getenv("MEASUREMENT_SYNC_TTL", str(24 * 3600)))
+
+# Canonical tests by category, with chart settings (lower_is_better: times, body fat)
+TEST_CATEGORIES = {
+    'Anthropometry': {
+        'Height': {'unit': 'cm', 'std_dev': 2.0, 'is_integer': False},
+        'Weight': {'unit': 'kg', 'std_dev': 3.0, 'is_integer': False},
+        'BMI': {'unit': '', 'std_dev': 0.5, 'is_integer': False},
+        '% BF': {'unit': '%', 'std_dev': 1.0, 'is_integer': False, 'lower_is_better': True}
+    },
+    'Power': {
+        'Single Leg Jump': {'unit': '%', 'std_dev': 2.0, 'is_integer': False},
+        'CMJ Arm Swing HT': {'unit': 'cm', 'std_dev': 3.0, 'is_integer': False},
+        'CMJ Arm Locked HT': {'unit': 'cm', 'std_dev': 3.0, 'is_integer': False},
+        'Diff % Height Swing-Locked': {'unit': '%', 'std_dev': 1.0, 'is_integer': False}
+    },
+    'Speed': {
+        '5m': {'unit': 's', 'std_dev': 0.1, 'is_integer': False, 'lower_is_better': True},
+        '10m': {'unit': 's', 'std_dev': 0.15, 'is_integer': False, 'lower_is_better': True},
+        '20m': {'unit': 's', 'std_dev': 0.2, 'is_integer': False, 'lower_is_better': True},
+        '30m': {'unit': 's', 'std_dev': 0.25, 'is_integer': False, 'lower_is_better': True}
+    },
+    'Agility': {
+        'T Test': {'unit': 's', 'std_dev': 0.3, 'is_integer': False, 'lower_is_better': True},
+        'Illinois': {'unit': 's', 'std_dev': 0.4, 'is_integer': False, 'lower_is_better': True},
+        'ArrowHead': {'unit': 's', 'std_dev': 0.4, 'is_integer': False, 'lower_is_better': True}
+    },
+    'Endurance': {
+        'Lactate': {'unit': 'mmol/L', 'std_dev': 0.5, 'is_integer': False},
+        'YYIRT1': {'unit': 'm', 'std_dev': 100, 'is_integer': True},
+        'YYIRT2': {'unit': 'm', 'std_dev': 80, 'is_integer': True}
+    }
+}
+CANONICAL_TESTS = [test for tests in TEST_CATEGORIES.values() for test in tests]
+TEST_CONFIG = {test: config for tests in TEST_CATEGORIES.values() for test, config in tests.items()}
+_canonical_cache = {}
+
+
+def canonical_test(raw_name):
+    """Canonical test for an Iterpro test name: exact match, else the first loose match, else the name itself"""
+    canonical = _canonical_cache.get(raw_name)
+    if canonical is None:
+        lowered = raw_name.lower()
+        canonical = next((t for t in CANONICAL_TESTS if t.lower() == lowered), None) or \
+            next((t for t in CANONICAL_TESTS if t.lower() in lowered or lowered in t.lower()), raw_name)
+        canonical = _canonical_cache[raw_name] = sys.intern(canonical)
+    return canonical
+
+
+# Every distinct test name seen by this worker; TestResults stores indexes into it
+_test_names = []
+_test_index = {}
+_names_lock = threading.Lock()
+
+
+def test_name_id(name):
+    """Stable per-process index of an (interned) test name"""
+    index = _test_index.get(name)
+    if index is None:
+        with _names_lock:
+            index = _test_index.get(name)
+            if index is None:
+                index = len(_test_names)
+                _test_names.append(sys.intern(name))
+                _test_index[name] = index
+    return index
+
+
+def _timestamp(value):
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def _number(value):
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TestResults:
+    """One player's numeric test results as typed arrays"""
+
+    __slots__ = ('tests', 'dates', 'values', '_latest')
+
+    def __init__(self, tests=None, dates=None, values=None):
+        self.tests = tests if tests is not None else array('H')
+        self.dates = dates if dates is not None else array('d')
+        self.values = values if values is not None else array('d')
+        self._latest = None
+
+    @classmethod
+    def from_instances(cls, instances):
+        """Keep the rows of raw test instances that have a name, a date and a numeric raw value"""
+        results = cls()
+        for instance in instances or ():
+            name = instance.get('testName')
+            value = _number((instance.get('results') or {}).get('rawValue'))
+            if not name or value is None:
+                continue
+            timestamp = _timestamp(instance.get('date')) if instance.get('date') else None
+            if timestamp is None:
+                continue
+            results.tests.append(test_name_id(name))
+            results.dates.append(timestamp)
+            results.values.append(value)
+        return results
+
+    def __len__(self):
+        return len(self.values)
+
+    def _latest_by_test(self):
+        """{test name: (timestamp, row, value)} for the most recent result of each test"""
+        if self._latest is None:
+            latest = {}
+            for row, (test, timestamp, value) in enumerate(zip(self.tests, self.dates, self.values)):
+                name = _test_names[test]
+                current = latest.get(name)
+                if current is None or timestamp > current[0]:
+                    latest[name] = (timestamp, row, value)
+            self._latest = latest
+        return self._latest
+
+    def latest(self, test_name):
+        """Latest value of a test, matched loosely like extract_latest_test_value (ties go to the earlier row)"""
+        wanted = test_name.lower()
+        best = None
+        for name, entry in self._latest_by_test().items():
+            lowered = name.lower()
+            if (wanted in lowered or lowered in wanted) and (best is None or (entry[0], -entry[1]) > (best[0], -best[1])):
+                best = entry
+        return best[2] if best is not None else None
+
+    def pack(self):
+        """Plain lists for serialization; test indexes are process-local, so the names travel along"""
+        local = sorted(set(self.tests))
+        position = {test: i for i, test in enumerate(local)}
+        return {'n': [_test_names[test] for test in local], 't': [position[test] for test in self.tests],
+                'd': self.dates.tolist(), 'v': self.values.tolist()}
+
+    @classmethod
+    def unpack(cls, packed):
+        """Inverse of pack(); raw instance lists from older cache entries are converted too"""
+        if isinstance(packed, list):
+            return cls.from_instances(packed)
+        ids = [test_name_id(name) for name in packed['n']]
+        return cls(array('H', (ids[i] for i in packed['t'])), array('d', packed['d']), array('d', packed['v']))
+
+
+class MeasurementStore:
+    """Real measurements per (player, canonical test, date) in SQLite, one connection per thread"""
+
+    def __init__(self, db_path=MEASUREMENT_STORE_PATH, sync_ttl=MEASUREMENT_SYNC_TTL):
+        self.db_path = str(db_path)
+        self.sync_ttl = sync_ttl
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS measurements (
+                    player_id TEXT NOT NULL,
+                    test TEXT NOT NULL,         -- canonical test name
+                    measured_at REAL NOT NULL,  -- unix time
+                    instance_id TEXT NOT NULL,  -- Iterpro test instance id ('' if none)
+                    value REAL NOT NULL,
+                    raw_test TEXT,              -- test name as sent by Iterpro
+                    PRIMARY KEY (player_id, test, measured_at, instance_id)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS measurement_sync (
+                    player_id TEXT PRIMARY KEY,
+                    synced_at REAL NOT NULL
+                )
+            ''')
+            # Bumped by every write, so each worker can tell when its derived indexes are stale
+            conn.execute('CREATE TABLE IF NOT EXISTS measurement_version (version INTEGER NOT NULL)')
+            conn.execute('INSERT INTO measurement_version SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM measurement_version)')
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _rows(player_id, instances):
+        """Table rows for the instances that have a name, a date and a numeric raw value"""
+        rows = []
+        for instance in instances or ():
+            name = instance.get('testName')
+            value = _number((instance.get('results') or {}).get('rawValue'))
+            measured_at = _timestamp(instance.get('date')) if instance.get('date') else None
+            if name and value is not None and measured_at is not None:
+                rows.append((player_id, canonical_test(name), measured_at, str(instance.get('_id') or ''), value, name))
+        return rows
+
+    @staticmethod
+    def _bump(conn):
+        conn.execute('UPDATE measurement_version SET version = version + 1')
+        return conn.execute('SELECT version FROM measurement_version').fetchone()[0]
+
+    def version(self):
+        """Counter increased by every write to the measurements"""
+        return self._connect().execute('SELECT version FROM measurement_version').fetchone()[0]
+
+    def replace_player(self, player_id, instances):
+        """Store a player's full history, replacing what was there, and mark it synced; returns the new version"""
+        rows = self._rows(player_id, instances)
+        with self._connect() as conn:
+            conn.execute('DELETE FROM measurements WHERE player_id = ?', (player_id,))
+            conn.executemany('INSERT OR REPLACE INTO measurements VALUES (?, ?, ?, ?, ?, ?)', rows)
+            conn.execute('INSERT OR REPLACE INTO measurement_sync VALUES (?, ?)', (player_id, time.time()))
+            return self._bump(conn)
+
+    def upsert(self, player_id, instances):
+        """Add new or corrected results (a corrected instance replaces its earlier row); returns the new version"""
+        rows = self._rows(player_id, instances)
+        with self._connect() as conn:
+            for row in rows:
+                if row[3]:
+                    conn.execute('DELETE FROM measurements WHERE player_id = ? AND instance_id = ?', (player_id, row[3]))
+            conn.executemany('INSERT OR REPLACE INTO measurements VALUES (?, ?, ?, ?, ?, ?)', rows)
+            return self._bump(conn)
+
+    def is_fresh(self, player_id):
+        row = self._connect().execute(
+            'SELECT synced_at FROM measurement_sync WHERE player_id = ?', (player_id,)).fetchone()
+        return row is not None and row[0] > time.time() - self.sync_ttl
+
+    def fresh_players(self):
+        """Ids of the players whose history was synced within the TTL"""
+        rows = self._connect().execute(
+            'SELECT player_id FROM measurement_sync WHERE synced_at > ?', (time.time() - self.sync_ttl,))
+        return {player_id for player_id, in rows}
+
+    def synced_players(self):
+        """Ids of every player whose history was synced at least once"""
+        return {player_id for player_id, in self._connect().execute('SELECT player_id FROM measurement_sync')}
+
+    def mark_stale(self, player_ids=None):
+        """Force a re-read from Iterpro on next access (every player when player_ids is None)"""
+        with self._connect() as conn:
+            if player_ids is None:
+                conn.execute('DELETE FROM measurement_sync')
+            else:
+                conn.executemany('DELETE FROM measurement_sync WHERE player_id = ?', [(p,) for p in player_ids])
+
+    def series(self, player_id, test, since=None, until=None, before=None, limit=None):
+        """
+        [(measured_at, value)] for one test in date order
+
+        since/until bound the range (unix time); before and limit page backwards
+        from the newest point: the page holds the `limit` latest points older
+        than `before`.
+        """
+        clauses, params = ['player_id = ?', 'test = ?'], [player_id, canonical_test(test)]
+        for clause, value in (('measured_at >= ?', since), ('measured_at <= ?', until), ('measured_at < ?', before)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        sql = f'SELECT measured_at, value FROM measurements WHERE {" AND ".join(clauses)} ORDER BY measured_at DESC'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        rows = self._connect().execute(sql, params).fetchall()
+        rows.reverse()
+        return rows
+
+    def player_series(self, player_id, since=None):
+        """{test: [(measured_at, value)]} for every test of a player since a date, in one scan"""
+        sql = 'SELECT test, measured_at, value FROM measurements WHERE player_id = ?'
+        params = [player_id]
+        if since is not None:
+            sql += ' AND measured_at >= ?'
+            params.append(since)
+        result = {}
+        for test, measured_at, value in self._connect().execute(sql + ' ORDER BY test, measured_at', params):
+            result.setdefault(test, []).append((measured_at, value))
+        return result
+
+    def latest(self, player_id):
+        """{test: (measured_at, value)} for the most recent point of every test of a player"""
+        rows = self._connect().execute('''
+            SELECT test, MAX(measured_at), value FROM measurements WHERE player_id = ? GROUP BY test
+        ''', (player_id,)).fetchall()
+        return {test: (measured_at, value) for test, measured_at, value in rows}
+
+    def instances(self, player_id):
+        """The player's stored results as minimal Iterpro test instances, oldest first (fallback while Iterpro is down)"""
+        rows = self._connect().execute('''
+            SELECT instance_id, raw_test, measured_at, value FROM measurements WHERE player_id = ? ORDER BY measured_at
+        ''', (player_id,))
+        return [{'_id': instance_id or None, 'testName': raw_test,
+                 'date': datetime.fromtimestamp(measured_at, timezone.utc).isoformat().replace('+00:00', 'Z'),
+                 'results': {'rawValue': value}}
+                for instance_id, raw_test, measured_at, value in rows]
+
+    def latest_all(self):
+        """{player_id: {test: (measured_at, value)}} for the most recent point of every test of every player"""
+        result = {}
+        rows = self._connect().execute(
+            'SELECT player_id, test, MAX(measured_at), value FROM measurements GROUP BY player_id, test')
+        for player_id, test, measured_at, value in rows:
+            result.setdefault(player_id, {})[test] = (measured_at, value)
+        return result
+
+    def export_players(self):
+        """(player_id, synced_at, rows) per player, rows as (test, measured_at, instance_id, value, raw_test)"""
+        conn = self._connect()
+        synced = dict(conn.execute('SELECT player_id, synced_at FROM measurement_sync'))
+        rows = conn.execute('''
+            SELECT player_id, test, measured_at, instance_id, value, raw_test FROM measurements ORDER BY player_id
+        ''')
+        current, batch = None, []
+        for player_id, *row in rows:
+            if player_id != current:
+                if current is not None:
+                    yield current, synced.pop(current, None), batch
+                current, batch = player_id, []
+            batch.append(tuple(row))
+        if current is not None:
+            yield current, synced.pop(current, None), batch
+        for player_id, synced_at in synced.items():
+            yield player_id, synced_at, []
+
+    def import_players(self, players):
+        """Replace the rows and sync times of (player_id, synced_at, rows) tuples in one transaction; returns the new version"""
+        with self._connect() as conn:
+            for player_id, synced_at, rows in players:
+                conn.execute('DELETE FROM measurements WHERE player_id = ?', (player_id,))
+                conn.executemany('INSERT OR REPLACE INTO measurements VALUES (?, ?, ?, ?, ?, ?)',
+                                 [(player_id, *row) for row in rows])
+                if synced_at is None:
+                    conn.execute('DELETE FROM measurement_sync WHERE player_id = ?', (player_id,))
+                else:
+                    conn.execute('INSERT OR REPLACE INTO measurement_sync VALUES (?, ?)', (player_id, synced_at))
+            return self._bump(conn)
@@ -0,0 +1,194 @@
+"""
+Normalized roster records.
+
+Runs once per roster refresh and turns raw Iterpro player dicts into compact
+PlayerRecord objects with precomputed fields, so cohort filters (team,
+position group, age bucket) are plain equality checks instead of date parsing
+and substring matching on every request:
+
+    id, team_id, name, position, position_code, position_group,
+    birth_date, age, age_bucket, height_cm, weight_kg, bmi
+
+Records use __slots__ and interned strings (ids, teams, positions, buckets are
+shared by every record that carries them); the dozens of Iterpro fields the
+app never reads are dropped.
+"""
+import sys
+import threading
+from datetime import date, datetime
+
+DEFAULT_AGE = 25  # used for the cohort of players without a birth date
+
+# Canonical position code -> (group, lowercase names used in Iterpro)
+POSITION_TAXONOMY = {
+    "GK": ("GK", {"goalkeeper", "keeper", "gk", "portero"}),
+    "CB": ("DEF", {"central defender", "centre back", "center back", "cb", "defender", "defensa central", "defensa"}),
+    "FB": ("DEF", {"full back", "fullback", "left back", "right back", "wing back", "lb", "rb", "lateral"}),
+    "DM": ("MID", {"defensive midfielder", "holding midfielder", "dm", "cdm", "mediocentro defensivo"}),
+    "CM": ("MID", {"midfielder", "central midfielder", "cm", "centrocampista", "mediocampista"}),
+    "AM": ("MID", {"attacking midfielder", "am", "cam", "mediapunta"}),
+    "W": ("FWD", {"winger", "left winger", "right winger", "lw", "rw", "extremo"}),
+    "ST": ("FWD", {"forward", "striker", "centre forward", "center forward", "st", "cf", "delantero"}),
+}
+POSITION_GROUPS = ("GK", "DEF", "MID", "FWD")
+_POSITION_LOOKUP = {name: code for code, (_, names) in POSITION_TAXONOMY.items() for name in names}
+# Keyword fallbacks for free-text positions, most specific first
+_POSITION_KEYWORDS = [
+    ("keeper", "GK"), ("back", "FB"), ("defensive mid", "DM"), ("attacking mid", "AM"),
+    ("defen", "CB"), ("mid", "CM"), ("wing", "W"), ("forward", "ST"), ("striker", "ST"),
+]
+
+
+def canonical_position(position):
+    """(code, group) for a free-text position, or (None, None) if unknown"""
+    if not position:
+        return None, None
+    text = " ".join(str(position).lower().replace("-", " ").split())
+    code = _POSITION_LOOKUP.get(text)
+    if code is None:
+        code = next((c for keyword, c in _POSITION_KEYWORDS if keyword in text), None)
+    if code is None:
+        return None, None
+    return code, POSITION_TAXONOMY[code][0]
+
+
+def parse_birth_date(value):
+    """Date from an ISO birth date string ('2008-03-01T00:00:00.000Z'), or None"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).date()
+    except ValueError:
+        try:
+            return date.fromisoformat(str(value)[:10])
+        except ValueError:
+            return None
+
+
+def age_on(birth_date, today=None):
+    """Completed years at today's date"""
+    if birth_date is None:
+        return None
+    today = today or date.today()
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+
+def age_bucket(age):
+    """Cohort label for an age: U14, U16, U18, then 4-year adult ranges (18-21, 22-25, ...)"""
+    if age is None:
+        age = DEFAULT_AGE
+    if age < 14:
+        return "U14"
+    if age < 16:
+        return "U16"
+    if age < 18:
+        return "U18"
+    start = 18 + (age - 18) // 4 * 4
+    return sys.intern(f"{start}-{start + 3}")
+
+
+# Common buckets, for forms and reports
+AGE_BUCKETS = ("U14", "U16", "U18") + tuple(age_bucket(age) for age in range(18, 42, 4))
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+def _intern(value):
+    return sys.intern(str(value)) if value else None
+
+
+class PlayerRecord:
+    """One normalized player; fields as listed in the module docstring"""
+
+    __slots__ = ('id', 'team_id', 'name', 'position', 'position_code', 'position_group',
+                 'birth_date', 'age', 'age_bucket', 'height_cm', 'weight_kg', 'bmi')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"PlayerRecord({self.id}, {self.position_group}, {self.age_bucket})"
+
+
+def normalize_player(player, today=None):
+    """Normalized record for one raw Iterpro player"""
+    birth_date = parse_birth_date(player.get('birthDate'))
+    age = age_on(birth_date, today)
+    if age is None and isinstance(player.get('age'), (int, float)):
+        age = int(player['age'])
+    code, group = canonical_position(player.get('position'))
+    height = _number(player.get('height'))
+    weight = _number(player.get('weight'))
+    return PlayerRecord(
+        id=_intern(player.get('_id') or player.get('id')),
+        team_id=_intern(player.get('teamId')),
+        name=player.get('displayName') or " ".join(filter(None, [player.get('name'), player.get('lastName')])),
+        position=_intern(player.get('position')) or '',
+        position_code=code,
+        position_group=group,
+        birth_date=birth_date,
+        age=age,
+        age_bucket=age_bucket(age),
+        height_cm=height,
+        weight_kg=weight,
+        bmi=round(weight / (height / 100) ** 2, 1) if height and weight else None,
+    )
+
+
+class RosterIndex:
+    """Normalized records plus id, team and cohort lookups for one roster version"""
+
+    def __init__(self, players, version=None, today=None):
+        self.version = version
+        self.built_on = today or date.today()
+        self.records = [normalize_player(p, self.built_on) for p in players]
+        self.by_id = {}
+        self.by_team = {}
+        self.by_cohort = {}
+        for record in self.records:
+            if not record.id:
+                continue
+            self.by_id[record.id] = record
+            self.by_team.setdefault(record.team_id, []).append(record)
+            self.by_cohort.setdefault(self.cohort_key(record), []).append(record)
+
+    @staticmethod
+    def cohort_key(record):
+        """Position group (falling back to the raw position) and age bucket"""
+        return (record.position_group or record.position, record.age_bucket)
+
+    def get(self, player_id):
+        return self.by_id.get(player_id)
+
+    def team(self, team_id):
+        return self.by_team.get(team_id, [])
+
+    def cohort(self, record):
+        """Players in the same position group and age bucket as record"""
+        return self.by_cohort.get(self.cohort_key(record), [])
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_roster_index(players, version):
+    """Shared RosterIndex, rebuilt when the roster version or the date changes"""
+    global _index
+    index = _index
+    if index is not None and index.version == version and index.built_on == date.today():
+        return index
+    with _index_lock:
+        if _index is None or _index.version != version or _index.built_on != date.today():
+            _index = RosterIndex(players, version)
+        return _index
@@ -0,0 +1,368 @@
+"""
+Shared, memory-mapped players x tests matrix.
+
+The latest value and date of every canonical test for every roster player
+with a stored history, written as one columnar file per node:
+
+    header    b"SCTM", format version, metadata length
+    metadata  JSON: roster key, store version, tests, code tables, column offsets, counts
+    ids       player ids, fixed width and sorted (rows are binary searched)
+    codes     team, position group, position code, age bucket per row (uint16, 0 = none)
+    per test  values and dates (float64 per row, NaN = no result) and the rows
+              holding a value, sorted by value (uint32)
+
+Workers map the file read-only and read the columns through memoryviews, so
+cohort medians and leaderboards in every worker of a node read the same
+physical pages; only the small metadata block is parsed per worker.
+
+The file is keyed by the roster version and the date (age buckets) and
+records the measurement store version it was built from. Writes to the store
+do not block readers: a worker that sees the store (or the roster) move past
+the file starts a rebuild in a background thread and keeps serving its
+current mapping. The rebuild runs under a file lock, so one worker per node
+does the work, and bursts of writes collapse into one rebuild. The new file
+is written to a temporary name and renamed over the old one; workers map it
+on their next read. Only a node with no file at all builds inside a request.
+Columns use the node's native byte order; the file is not meant to be copied
+between machines.
+
+Environment variables:
+    ROSTER_MATRIX_PATH   Matrix file shared by the workers of a node
+                         (default: <tmp>/soccer_central_roster_matrix.bin)
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from datetime import date
+
+import iterpro_client
+from iterpro_client import measurement_store
+from measurements import CANONICAL_TESTS
+from utils.logger import get_logger
+from utils.metrics import describe, observe
+
+try:
+    import fcntl
+except ImportError:  # Windows: workers rebuild without coordinating
+    fcntl = None
+
+ROSTER_MATRIX_PATH = os.getenv(
+    "ROSTER_MATRIX_PATH", os.path.join(tempfile.gettempdir(), "soccer_central_roster_matrix.bin"))
+
+MAGIC = b"SCTM"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHI")
+CODE_COLUMNS = ('team', 'position_group', 'position_code', 'age_bucket')
+
+logger = get_logger("roster_matrix")
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+class MatrixRow:
+    """One player's row, read like TestResults (see extract_latest_test_value)"""
+
+    __slots__ = ('matrix', 'row')
+
+    def __init__(self, matrix, row):
+        self.matrix = matrix
+        self.row = row
+
+    def __bool__(self):
+        return True
+
+    def latest(self, test_name):
+        """Latest value of a test, matched loosely like TestResults.latest (ties go to the earlier column)"""
+        best = None
+        for test in self.matrix.matching_tests(test_name):
+            value = self.matrix.value(test, self.row)
+            if value is not None:
+                measured_at = self.matrix.measured_at(test, self.row)
+                if best is None or measured_at > best[0]:
+                    best = (measured_at, value)
+        return best[1] if best is not None else None
+
+
+class RosterMatrix:
+    """Read-only view of a matrix file"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(f.fileno())
+        # Identity of the mapped file; a rebuild renames a new file (new inode) into place
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+        magic, version, meta_length = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} test matrix")
+        meta = json.loads(self._map[_HEADER.size:_HEADER.size + meta_length])
+        self.key = meta['key']
+        self.store_version = meta['store_version']
+        self.built_at = meta['built_at']
+        self.size = meta['rows']
+        self.tests = meta['tests']
+        self.tables = meta['tables']
+        self._id_width = meta['id_width']
+        view = memoryview(self._map)
+
+        def column(name, fmt, length):
+            offset = meta['offsets'][name]
+            return view[offset:offset + length * struct.calcsize(fmt)].cast(fmt)
+
+        self._ids = view[meta['offsets']['ids']:meta['offsets']['ids'] + self.size * self._id_width]
+        self.codes = {name: column(name, 'H', self.size) for name in CODE_COLUMNS}
+        self._matching = {}
+        self._values = {test: column(f"values:{test}", 'd', self.size) for test in self.tests}
+        self._dates = {test: column(f"dates:{test}", 'd', self.size) for test in self.tests}
+        self._order = {test: column(f"order:{test}", 'I', meta['counts'][test]) for test in self.tests}
+
+    def __len__(self):
+        return self.size
+
+    def player_id(self, row):
+        width = self._id_width
+        return bytes(self._ids[row * width:(row + 1) * width]).rstrip(b"\0").decode()
+
+    def row_of(self, player_id):
+        """Row of a player (binary search over the id column), None if absent"""
+        width = self._id_width
+        wanted = player_id.encode().ljust(width, b"\0")
+        if len(wanted) > width:
+            return None
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if bytes(self._ids[middle * width:(middle + 1) * width]) < wanted:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.size and bytes(self._ids[low * width:(low + 1) * width]) == wanted:
+            return low
+        return None
+
+    def covers(self, player_ids):
+        """True if every player has a row"""
+        return all(self.row_of(player_id) is not None for player_id in player_ids)
+
+    def rows_for(self, player_ids):
+        """{player_id: MatrixRow} for the players with a row"""
+        rows = {}
+        for player_id in player_ids:
+            row = self.row_of(player_id)
+            if row is not None:
+                rows[player_id] = MatrixRow(self, row)
+        return rows
+
+    def code(self, column, value):
+        """Code of a team id, position or age bucket in a code column, None if no row has it"""
+        try:
+            return self.tables[column].index(value)
+        except ValueError:
+            return None
+
+    def value(self, test, row):
+        values = self._values.get(test)
+        if values is None or math.isnan(values[row]):
+            return None
+        return values[row]
+
+    def measured_at(self, test, row):
+        return self._dates[test][row]
+
+    def matching_tests(self, test_name):
+        """Tests whose name contains test_name or is contained in it, case-insensitively (as TestResults.latest matches)"""
+        wanted = test_name.lower()
+        found = self._matching.get(wanted)
+        if found is None:
+            found = self._matching[wanted] = [t for t in self.tests if wanted in t.lower() or t.lower() in wanted]
+        return found
+
+    def order(self, test):
+        """Rows with a value for test, lowest value first (empty for an unknown test)"""
+        return self._order.get(test, ())
+
+
+def _current_key(roster):
+    return f"{os.path.abspath(measurement_store.db_path)}:{roster.version}:{date.today()}"
+
+
+def build(path, roster, key):
+    """Write the matrix for roster to path atomically"""
+    start = time.perf_counter()
+    # Read the version first: a write during the build leaves the file behind the store, never ahead
+    store_version = measurement_store.version()
+    latest = measurement_store.latest_all()
+    stored = set(latest) | measurement_store.synced_players()
+    records = sorted((record for record in roster.records if record.id in stored), key=lambda r: r.id)
+    ids = [record.id.encode() for record in records]
+    id_width = max((len(player_id) for player_id in ids), default=1)
+    tests = list(CANONICAL_TESTS) + sorted({t for values in latest.values() for t in values} - set(CANONICAL_TESTS))
+
+    tables = {name: [None] for name in CODE_COLUMNS}
+    code_columns = {name: array('H') for name in CODE_COLUMNS}
+    for record in records:
+        for name, value in zip(CODE_COLUMNS, (record.team_id, record.position_group,
+                                              record.position_code, record.age_bucket)):
+            table = tables[name]
+            if value not in table:
+                table.append(value)
+            code_columns[name].append(table.index(value))
+
+    columns = [('ids', b"".join(player_id.ljust(id_width, b"\0") for player_id in ids))]
+    columns += [(name, code_columns[name].tobytes()) for name in CODE_COLUMNS]
+    counts = {}
+    for test in tests:
+        values, dates = array('d', [math.nan]) * len(records), array('d', [0.0]) * len(records)
+        for row, record in enumerate(records):
+            point = latest.get(record.id, {}).get(test)
+            if point is not None:
+                dates[row], values[row] = point
+        order = array('I', sorted((row for row in range(len(records)) if not math.isnan(values[row])),
+                                  key=lambda row: values[row]))
+        counts[test] = len(order)
+        columns += [(f"values:{test}", values.tobytes()), (f"dates:{test}", dates.tobytes()),
+                    (f"order:{test}", order.tobytes())]
+
+    # Offsets depend on the metadata length, which includes the offsets: size it with placeholders first
+    meta = {'key': key, 'store_version': store_version, 'built_at': time.time(), 'rows': len(records),
+            'id_width': id_width, 'tests': tests, 'tables': tables, 'counts': counts,
+            'offsets': {name: 0 for name, _ in columns}}
+    meta_length = len(json.dumps(meta).encode()) + 16 * len(columns)
+    offset = _align(_HEADER.size + meta_length)
+    for name, data in columns:
+        meta['offsets'][name] = offset
+        offset = _align(offset + len(data))
+    meta_bytes = json.dumps(meta).encode().ljust(meta_length)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, meta_length) + meta_bytes)
+        for name, data in columns:
+            f.seek(meta['offsets'][name])
+            f.write(data)
+        f.truncate(max(offset, f.tell()))
+    os.replace(tmp_path, path)
+    observe("roster_matrix_build_seconds", time.perf_counter() - start)
+    logger.info("Built roster matrix: %d players x %d tests (store version %s)", len(records), len(tests), store_version)
+
+
+def _read_meta(path):
+    """(key, store version) of a matrix file, (None, None) if missing or unreadable"""
+    try:
+        with open(path, "rb") as f:
+            magic, version, meta_length = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC or version != FORMAT_VERSION:
+                return None, None
+            meta = json.loads(f.read(meta_length))
+            return meta['key'], meta['store_version']
+    except (OSError, ValueError, KeyError, struct.error):
+        return None, None
+
+
+def _build_once(path, roster):
+    """Rebuild unless the file already matches the roster and the store (another worker may have just written it)"""
+    lock = open(f"{path}.lock", "a") if fcntl is not None else None
+    try:
+        if lock is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        # Compared under the lock, so a worker that waited never writes an older file over a newer one
+        key = _current_key(roster)
+        if _read_meta(path) != (key, measurement_store.version()):
+            build(path, roster, key)
+    finally:
+        if lock is not None:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+
+
+_matrix = None
+_matrix_lock = threading.Lock()
+_rebuild_roster = None
+_rebuild_thread = None
+_rebuild_lock = threading.Lock()
+
+
+def _mapped(path):
+    """This worker's mapping of the file, remapped once another worker renamed a new file into place"""
+    global _matrix
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return _matrix
+    matrix = _matrix
+    if matrix is None or matrix.identity != (stat.st_ino, stat.st_mtime_ns):
+        with _matrix_lock:
+            matrix = _matrix
+            if matrix is None or matrix.identity != (stat.st_ino, stat.st_mtime_ns):
+                try:
+                    # The old mapping is released once no request holds it any more
+                    matrix = _matrix = RosterMatrix(path)
+                except (OSError, ValueError, struct.error) as e:
+                    logger.warning("Cannot map roster matrix %s: %s", path, e)
+    return matrix
+
+
+def _rebuild_in_background():
+    global _rebuild_roster, _rebuild_thread
+    while True:
+        with _rebuild_lock:
+            roster, _rebuild_roster = _rebuild_roster, None
+            if roster is None:
+                _rebuild_thread = None
+                return
+        try:
+            _build_once(ROSTER_MATRIX_PATH, roster)
+        except Exception as e:
+            logger.exception("Roster matrix rebuild failed: %s", e)
+
+
+def _schedule_rebuild(roster):
+    """Rebuild for roster off the request path; requests made meanwhile join the pending rebuild"""
+    global _rebuild_roster, _rebuild_thread
+    with _rebuild_lock:
+        _rebuild_roster = roster
+        if _rebuild_thread is None or not _rebuild_thread.is_alive():
+            _rebuild_thread = threading.Thread(target=_rebuild_in_background, name="roster-matrix", daemon=True)
+            _rebuild_thread.start()
+
+
+def is_current(matrix):
+    """True if the matrix holds every write made to the measurement store so far"""
+    return matrix.store_version == measurement_store.version()
+
+
+def refresh(roster=None):
+    """Bring the file up to date now and return its mapping (maintenance, scripts and tests)"""
+    roster = roster if roster is not None else iterpro_client.get_roster()
+    _build_once(ROSTER_MATRIX_PATH, roster)
+    return _mapped(ROSTER_MATRIX_PATH)
+
+
+def get_matrix(roster=None):
+    """
+    This node's matrix, None while the roster is unavailable
+
+    May lag the measurement store or the roster by one background rebuild
+    (see is_current()).
+    """
+    roster = roster if roster is not None else iterpro_client.get_roster()
+    if not roster.records:
+        return None
+    matrix = _mapped(ROSTER_MATRIX_PATH)
+    if matrix is None:
+        # Nothing to serve yet on this node: the one build that runs inside a request
+        return refresh(roster)
+    if matrix.key != _current_key(roster) or not is_current(matrix):
+        _schedule_rebuild(roster)
+    return matrix
+
+
+describe("roster_matrix_build_seconds", "Time spent writing the shared players x tests matrix")
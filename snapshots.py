@@ -0,0 +1,184 @@
+"""
+Portable dataset snapshots for warm starts.
+
+A snapshot is one gzip-compressed JSON-lines file. The first line is a
+header; every other line is one record:
+
+    {"format": "soccer-central-snapshot", "version": 1, "created_at": ..., "counts": {...}}
+    {"section": "response", "namespace": "players", "key": "all_players", "data": [...]}
+    {"section": "measurements", "player_id": ..., "synced_at": ..., "rows": [[test, measured_at, instance_id, value, raw_test], ...]}
+    {"section": "median", "namespace": "team_median", "key": ..., "entry": {...}}
+    {"section": "data_version", "scope": "medians", "version": ...}
+
+Export collects the roster, players, teams and thresholds from the response
+cache, the normalized results from the measurement store, and the team and
+position/age medians (with their distributions) from the median cache.
+Import writes them back. Cached entries only live for what is left of their
+TTL counted from created_at, so an old snapshot seeds last good copies and the
+measurement store but no stale "fresh" responses. Data versions are only
+restored along with the medians, and only on a node that has none of its own.
+Each synced player's test instances are seeded from the measurement rows, so a
+new node serves pages, medians and leaderboards without first fetching
+everything from Iterpro.
+Snapshots with another format version, and truncated or corrupt files, are
+refused before anything is written.
+
+Usage:
+    python snapshots.py export snapshot.jsonl.gz
+    python snapshots.py import snapshot.jsonl.gz
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+import zlib
+from datetime import datetime, timezone
+
+import iterpro_client
+from iterpro_client import measurement_store, median_cache
+from utils.logger import get_logger
+
+SNAPSHOT_FORMAT = "soccer-central-snapshot"
+SNAPSHOT_VERSION = 1
+DATA_VERSION_SCOPES = ('roster', 'medians')
+
+logger = get_logger("snapshots")
+
+
+class SnapshotError(ValueError):
+    """The file is not a snapshot this version can read"""
+
+
+def export_snapshot(path):
+    """Write the current dataset to path; returns the record counts"""
+    responses = list(iterpro_client.export_responses())
+    players = list(measurement_store.export_players())
+    medians = list(median_cache.export_medians())
+    versions = {scope: median_cache.get_data_version(scope) for scope in DATA_VERSION_SCOPES}
+    header = {
+        'format': SNAPSHOT_FORMAT,
+        'version': SNAPSHOT_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'source': iterpro_client.BASE_URL,
+        'counts': {'responses': len(responses), 'players': len(players),
+                   'measurements': sum(len(rows) for _, _, rows in players), 'medians': len(medians)},
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        def write(record):
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+        write(header)
+        for namespace, key, data in responses:
+            write({'section': 'response', 'namespace': namespace, 'key': key, 'data': data})
+        for player_id, synced_at, rows in players:
+            write({'section': 'measurements', 'player_id': player_id, 'synced_at': synced_at, 'rows': rows})
+        for namespace, key, entry in medians:
+            write({'section': 'median', 'namespace': namespace, 'key': key, 'entry': entry})
+        for scope, version in versions.items():
+            if version is not None:
+                write({'section': 'data_version', 'scope': scope, 'version': version})
+    # Readers never see a half-written snapshot
+    os.replace(tmp_path, path)
+    logger.info("Exported snapshot %s: %s", path, header['counts'])
+    return header['counts']
+
+
+def _records(path):
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                header = json.loads(f.readline() or "null")
+            except ValueError:
+                header = None
+            if not isinstance(header, dict) or header.get('format') != SNAPSHOT_FORMAT:
+                raise SnapshotError(f"{path} is not a snapshot")
+            if header.get('version') != SNAPSHOT_VERSION:
+                raise SnapshotError(f"{path} has snapshot version {header.get('version')}, "
+                                    f"this release reads version {SNAPSHOT_VERSION}")
+            yield header
+            for number, line in enumerate(f, start=2):
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise SnapshotError(f"{path}: line {number} is not valid JSON ({e})") from e
+    except (EOFError, zlib.error, gzip.BadGzipFile, UnicodeDecodeError) as e:
+        raise SnapshotError(f"{path} is truncated or corrupt ({e})") from e
+
+
+def _age(header):
+    """Seconds since the snapshot was exported (naive created_at from older exports is local time)"""
+    try:
+        created = datetime.fromisoformat(header['created_at'])
+    except (KeyError, TypeError, ValueError):
+        raise SnapshotError("snapshot header has no valid created_at")
+    now = datetime.now(created.tzinfo) if created.tzinfo else datetime.now()
+    return max((now - created).total_seconds(), 0.0)
+
+
+def import_snapshot(path):
+    """Load a snapshot into the response cache, measurement store and median cache; returns the counts written"""
+    records = _records(path)
+    header = next(records)
+    age = _age(header)
+    responses, players, medians, versions = [], [], [], {}
+    # Read everything first: a corrupt record must not leave a half-imported dataset
+    for record in records:
+        try:
+            section = record.get('section')
+            if section == 'response':
+                responses.append((record['namespace'], record['key'], record['data']))
+            elif section == 'measurements':
+                players.append((record['player_id'], record['synced_at'], record['rows']))
+            elif section == 'median':
+                medians.append((record['namespace'], record['key'], record['entry']))
+            elif section == 'data_version':
+                versions[record['scope']] = record['version']
+        except (AttributeError, KeyError) as e:
+            raise SnapshotError(f"{path}: malformed {record.get('section') if isinstance(record, dict) else 'record'} "
+                                f"record ({e!r})") from e
+
+    counts = {'responses': iterpro_client.import_responses(responses, age)}
+    measurement_store.import_players(players)
+    # Minimal instances rebuilt from the rows are enough for the median batches
+    median_cache.cache_test_instances_many({player_id: measurement_store.instances(player_id)
+                                            for player_id, _, rows in players if rows}, age)
+    counts['players'] = len(players)
+    counts['measurements'] = sum(len(rows) for _, _, rows in players)
+    counts['medians'] = median_cache.import_medians(medians, age)
+    # Medians were computed at these versions; a node without its own keeps them so cached entries and
+    # fragments still match. A running node's versions are never replaced: versions are not ordered, and an
+    # earlier one would let fragments cached under it match again.
+    if counts['medians']:
+        for scope, version in versions.items():
+            if median_cache.get_data_version(scope) is None:
+                median_cache.set_data_version(scope, version)
+    logger.info("Imported snapshot %s from %s (%s, %.0fs old): %s", path, header.get('source'),
+                header.get('created_at'), age, counts)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import a dataset snapshot for warm starts")
+    parser.add_argument("action", choices=("export", "import"))
+    parser.add_argument("path", nargs="?", default="snapshot.jsonl.gz", help="Snapshot file (default: snapshot.jsonl.gz)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        if args.action == "export":
+            counts = export_snapshot(args.path)
+        else:
+            counts = import_snapshot(args.path)
+    except (OSError, SnapshotError) as e:
+        print(f"Snapshot {args.action} failed: {e}", file=sys.stderr)
+        return 1
+    summary = ", ".join(f"{count} {name}" for name, count in counts.items())
+    print(f"{args.action.capitalize()}ed {args.path} in {time.perf_counter() - start:.2f}s: {summary}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,46 @@
 #!/usr/bin/env python3
 """
 Test script for enhanced athletic performance with real data extraction
+
+Runs against the live Iterpro API by default. Record the responses once with
+--record and re-run fully offline with --replay:
+
+    python test_real_data.py --record cassettes/pietro.jsonl.gz
+    python test_real_data.py --replay cassettes/pietro.jsonl.gz [--latency-scale 1.0]
+
+Record and replay runs keep every cache and store in a fresh temp dir, so they
+never read or wipe the caches of the node they run on.
 """
 
+import argparse
 import sys
 import os
+import tempfile
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from iterpro_client import get_enhanced_athletic_performance, get_player_test_instances
+# Test player ID from the logs
+DEFAULT_PLAYER_ID = "5991645e3014990d3741a9a8"
+
+def isolate_caches():
+    """Point the response cache, median cache, measurement store and temp files at a fresh directory"""
+    workdir = tempfile.mkdtemp(prefix="sc_real_data_")
+    # Must run before iterpro_client is imported: paths are read at import or first use
+    tempfile.tempdir = workdir
+    os.environ.update({
+        "TMPDIR": workdir,
+        "MEDIAN_CACHE_PATH": os.path.join(workdir, "median_cache.db"),
+        "MEASUREMENT_STORE_PATH": os.path.join(workdir, "measurements.db"),
+        "MEDIAN_CACHE_BACKEND": "sqlite",
+        "RESPONSE_CACHE_BACKEND": "file",
+    })
+    return workdir
 
-def test_real_data_extraction():
-    """Test the real data extraction functionality"""
+def check_real_data_extraction(player_id=DEFAULT_PLAYER_ID):
+    """Check the real data extraction against the configured transport (not a pytest test: it calls Iterpro)"""
+    from iterpro_client import get_enhanced_athletic_performance, get_player_test_instances
     print("🧪 Testing Real Data Extraction for Enhanced Athletic Performance")
     print("=" * 70)
     
-    # Test player ID from the logs
-    player_id = "5991645e3014990d3741a9a8"
-    
     try:
         print(f"Testing with player ID: {player_id}")
         
@@ -74,5 +98,26 @@ def test_real_data_extraction():
         traceback.print_exc()
 
 if __name__ == "__main__":
-    test_real_data_extraction()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("player_id", nargs="?", default=DEFAULT_PLAYER_ID)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", metavar="CASSETTE", help="Record Iterpro responses to a cassette")
+    mode.add_argument("--replay", metavar="CASSETTE", help="Replay Iterpro responses from a cassette (offline)")
+    parser.add_argument("--latency-scale", type=float, default=0.0,
+                        help="Replay the recorded latency scaled by this factor (default: 0, instant)")
+    args = parser.parse_args()
+
+    if args.record or args.replay:
+        # Empty caches in a temp dir, so every call goes through the transport
+        print(f"Caches and stores in {isolate_caches()}")
+        import iterpro_client
+        from iterpro_transport import create_transport
+        iterpro_client.set_transport(create_transport(
+            "record" if args.record else "replay",
+            cassette_path=args.record or args.replay,
+            base_url=iterpro_client.BASE_URL or "",
+            latency_scale=args.latency_scale,
+        ))
+
+    check_real_data_extraction(args.player_id)
 
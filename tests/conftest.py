@@ -0,0 +1,123 @@
+"""
+Shared pytest setup.
+
+Everything the app writes (median cache, measurement store, response cache,
+rate limit buckets, roster matrix, profiles) goes to temporary directories,
+and Iterpro calls go through a fake transport, so the suite never touches
+the checkout's databases or the network.
+"""
+import os
+import tempfile
+
+# Read at import by the modules under test: set before any of them is imported
+_workdir = tempfile.mkdtemp(prefix="sc_tests_")
+tempfile.tempdir = _workdir
+os.environ.update({
+    "TMPDIR": _workdir,
+    "BASE_URL": "http://iterpro.invalid/api/v1",
+    "MEDIAN_CACHE_PATH": os.path.join(_workdir, "median_cache.db"),
+    "MEASUREMENT_STORE_PATH": os.path.join(_workdir, "measurements.db"),
+    "MEDIAN_CACHE_BACKEND": "sqlite",
+    "RESPONSE_CACHE_BACKEND": "file",
+    "ITERPRO_RATE_LIMITS": "off",
+    "ITERPRO_TRANSPORT": "live",
+})
+
+import pytest
+import requests
+
+import iterpro_breaker
+import iterpro_client
+import leaderboards
+import roster_matrix
+from cache_backends import backend_from_env
+from database import MedianCache
+from measurements import MeasurementStore
+from roster import RosterIndex
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.content = b"{}"
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} error")
+
+
+class FakeTransport:
+    """Answers from a list of responses or exceptions, in order; unreachable once they run out"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def get(self, url, headers):
+        self.calls.append(url)
+        outcome = self.outcomes.pop(0) if self.outcomes else requests.exceptions.ConnectionError("unreachable")
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def use_node(path):
+    """Point the median cache, measurement store and response cache at empty ones under path (a new node)"""
+    path.mkdir(parents=True, exist_ok=True)
+    caches = {
+        iterpro_client.median_cache: MedianCache(str(path / "median_cache.db")),
+        iterpro_client.measurement_store: MeasurementStore(path / "measurements.db"),
+        iterpro_client.response_cache: backend_from_env("RESPONSE_CACHE_BACKEND", "file", path / "responses"),
+    }
+    for proxy, instance in caches.items():
+        # LazyObject forwards setattr to its target; replace the target itself
+        object.__setattr__(proxy, "_instance", instance)
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    """Fresh caches, store, matrix file and breakers for every test"""
+    proxies = (iterpro_client.median_cache, iterpro_client.measurement_store, iterpro_client.response_cache)
+    previous = {proxy: proxy._instance for proxy in proxies}
+    use_node(tmp_path)
+    monkeypatch.setattr(iterpro_client, "transport", FakeTransport())
+    monkeypatch.setattr(roster_matrix, "ROSTER_MATRIX_PATH", str(tmp_path / "roster_matrix.bin"))
+    monkeypatch.setattr(roster_matrix, "_matrix", None)
+    monkeypatch.setattr(leaderboards, "_roster", None)
+    iterpro_breaker._breakers.clear()
+    yield tmp_path
+    thread = roster_matrix._rebuild_thread
+    if thread is not None:
+        thread.join()
+    for proxy, instance in previous.items():
+        object.__setattr__(proxy, "_instance", instance)
+
+
+def make_player(index, team="team-a", position="Central Defender", birth_date="2000-01-01", **fields):
+    """Raw Iterpro player dict"""
+    return {"_id": f"p{index:03d}", "teamId": team, "displayName": f"Player {index}",
+            "position": position, "birthDate": birth_date, **fields}
+
+
+def make_instance(test_name, value, date="2026-01-15T10:00:00.000Z", instance_id=None):
+    """Raw Iterpro test instance"""
+    return {"_id": instance_id or f"{test_name}-{date}", "testName": test_name, "date": date,
+            "results": {"rawValue": value}}
+
+
+@pytest.fixture
+def club(monkeypatch):
+    """Install a roster of raw players as what Iterpro returns; returns a function taking the players"""
+    def install(players, version="v1"):
+        roster = RosterIndex(players, version=version)
+        monkeypatch.setattr(iterpro_client, "get_roster", lambda: roster)
+        monkeypatch.setattr(iterpro_client, "get_cached_roster", lambda: roster)
+        monkeypatch.setattr(iterpro_client, "get_player_by_id",
+                            lambda player_id: next((p for p in players if p["_id"] == player_id), None))
+        iterpro_client.median_cache.set_data_version("roster", version)
+        return roster
+    return install
@@ -0,0 +1,32 @@
+import pytest
+
+import app
+from conftest import make_player
+from roster import RosterIndex
+
+PLAYER = make_player(1, displayName="Ana Report")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Test client of the plain imported app (what flask run and app:app serve), logged in as an admin"""
+    monkeypatch.setattr(app, "get_player_by_id", lambda player_id: PLAYER if player_id == PLAYER["_id"] else None)
+    monkeypatch.setattr(app, "get_team_by_id", lambda team_id: {"_id": team_id, "name": "Team A"})
+    monkeypatch.setattr(app, "get_enhanced_athletic_performance", lambda player_id, team_id=None: None)
+    monkeypatch.setattr(app, "get_roster", lambda: RosterIndex([PLAYER]))
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = {'name': 'coach', 'role': 'admin'}
+    return client
+
+
+def test_templates_compile_without_create_app():
+    for name in ("player_report.html", "base.html"):
+        app.app.jinja_env.get_template(name)
+
+
+def test_player_report_renders_without_create_app(client):
+    response = client.get(f"/player-report/{PLAYER['_id']}")
+    assert response.status_code == 200
+    assert b"Ana Report" in response.data
+    assert not app._initialized
@@ -0,0 +1,100 @@
+import pytest
+
+import ingest
+from conftest import make_instance, make_player
+from distributions import Distribution
+from iterpro_client import measurement_store, median_cache
+from roster import RosterIndex
+
+
+@pytest.fixture
+def roster(club):
+    return club([make_player(1), make_player(2), make_player(3, team="team-b")])
+
+
+@pytest.fixture
+def cohort(roster):
+    """(position group, age bucket) shared by p001 and p002"""
+    return RosterIndex.cohort_key(roster.get("p001"))
+
+
+def cache_medians(test_name, values, cohort):
+    """Team-a and cohort entries holding values"""
+    distribution = Distribution(values)
+    median_cache.cache_team_median(test_name, "team-a", distribution.median(), len(distribution), distribution)
+    median_cache.cache_position_age_median(test_name, *cohort, distribution.median(), len(distribution), distribution)
+
+
+def test_parse_events_accepts_one_event_a_list_or_an_envelope():
+    event = {"type": "team", "team": {"_id": "t"}}
+    assert ingest.parse_events(event) == [event]
+    assert ingest.parse_events([event, event]) == [event, event]
+    assert ingest.parse_events({"events": [event]}) == [event]
+    with pytest.raises(ingest.IngestError):
+        ingest.parse_events([event, "not an event"])
+
+
+def test_parse_events_enforces_the_event_limit(monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_MAX_EVENTS", 2)
+    with pytest.raises(ingest.IngestError, match="at most 2"):
+        ingest.parse_events([{"type": "team"}] * 3)
+
+
+def test_bad_events_are_reported_by_index_and_the_rest_applied(roster):
+    result = ingest.apply_events([
+        {"type": "unknown"},
+        {"type": "test_instance", "player_id": "p001"},
+        {"type": "test_instance", "player_id": "p001", "instance": make_instance("10m", 1.7)},
+    ])
+    assert result['applied'] == 1
+    assert [error['index'] for error in result['errors']] == [0, 1]
+
+
+def test_new_result_moves_the_player_within_cached_distributions(cohort):
+    median_cache.cache_test_instances("p001", [make_instance("10m", 1.9, date="2026-01-01T00:00:00.000Z")])
+    cache_medians("10m", {"p001": 1.9, "p002": 1.8}, cohort)
+
+    ingest.apply_events([{"type": "test_instance", "player_id": "p001",
+                          "instance": make_instance("10m", 1.6, date="2026-02-01T00:00:00.000Z")}])
+
+    team = median_cache.get_cached_team_distribution("10m", "team-a")
+    assert team.players == {"p001": 1.6, "p002": 1.8}
+    assert median_cache.get_cached_team_median("10m", "team-a") == 1.7
+    assert median_cache.get_cached_position_age_distribution("10m", *cohort).players["p001"] == 1.6
+    assert measurement_store.latest("p001")["10m"][1] == 1.6
+
+
+def test_result_without_cached_history_drops_the_medians(cohort):
+    cache_medians("10m", {"p001": 1.9, "p002": 1.8}, cohort)
+    ingest.apply_events([{"type": "test_instance", "player_id": "p002", "instance": make_instance("10m", 1.5)}])
+    assert median_cache.get_cached_team_median("10m", "team-a") is None
+    assert median_cache.get_cached_position_age_median("10m", *cohort) is None
+
+
+def test_events_about_unknown_players_keep_club_wide_medians(cohort):
+    cache_medians("10m", {"p001": 1.9, "p002": 1.8}, cohort)
+    result = ingest.apply_events([
+        {"type": "test_instance", "player_id": "stranger", "instance": make_instance("10m", 1.5)},
+        {"type": "test_instances", "player_id": "stranger", "test_instances": [make_instance("10m", 1.5)]},
+        {"type": "player_removed", "player_id": "stranger"},
+    ])
+    assert result['errors'] == []
+    assert result['invalidated'] == 0
+    assert median_cache.get_cached_team_median("10m", "team-a") is not None
+    assert median_cache.get_cached_position_age_median("10m", *cohort) is not None
+
+
+def test_changed_test_drops_that_test_only(cohort):
+    cache_medians("10m", {"p001": 1.9}, cohort)
+    cache_medians("Height", {"p001": 180}, cohort)
+    ingest.apply_events([{"type": "changed", "test_name": "10m"}])
+    assert median_cache.get_cached_team_median("10m", "team-a") is None
+    assert median_cache.get_cached_team_median("Height", "team-a") is not None
+
+
+def test_full_history_replaces_the_stored_one(roster):
+    measurement_store.replace_player("p003", [make_instance("10m", 1.9), make_instance("Height", 181)])
+    ingest.apply_events([{"type": "test_instances", "player_id": "p003",
+                          "test_instances": [make_instance("Height", 182)]}])
+    assert set(measurement_store.latest("p003")) == {"Height"}
+    assert median_cache.get_cached_test_instances("p003") == [make_instance("Height", 182)]
@@ -0,0 +1,146 @@
+import time
+
+import pytest
+import requests
+
+import iterpro_breaker
+import iterpro_client
+from conftest import FakeResponse, FakeTransport
+from iterpro_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(iterpro_breaker, "time", clock)
+    return clock
+
+
+def tripped(endpoint="players"):
+    """The worker's breaker for endpoint, opened and past its cooldown (half-open)"""
+    circuit = iterpro_breaker.breaker(endpoint)
+    circuit.failures = circuit.max_failures
+    circuit.opened_at = time.monotonic() - circuit.cooldown - 1
+    assert circuit.state == HALF_OPEN
+    return circuit
+
+
+def test_opens_after_consecutive_failures(clock):
+    circuit = CircuitBreaker("players", failures=3, cooldown=30)
+    circuit.record(False)
+    circuit.record(False)
+    circuit.record(True)  # a success resets the count
+    circuit.record(False)
+    circuit.record(False)
+    assert circuit.state == CLOSED
+    circuit.record(False)
+    assert circuit.state == OPEN
+    with pytest.raises(CircuitOpen):
+        circuit.before_call()
+
+
+def test_half_open_lets_one_probe_through(clock):
+    circuit = CircuitBreaker("players", failures=1, cooldown=30)
+    circuit.record(False)
+    clock.now += 31
+    assert circuit.state == HALF_OPEN
+    circuit.before_call()
+    with pytest.raises(CircuitOpen):
+        circuit.before_call()
+    circuit.record(True)
+    assert circuit.state == CLOSED
+    circuit.before_call()
+
+
+def test_failed_probe_opens_for_another_cooldown(clock):
+    circuit = CircuitBreaker("players", failures=5, cooldown=30)
+    for _ in range(5):
+        circuit.record(False)
+    clock.now += 31
+    circuit.before_call()
+    circuit.record(False)
+    assert circuit.state == OPEN
+    clock.now += 29
+    assert circuit.state == OPEN
+    clock.now += 2
+    assert circuit.state == HALF_OPEN
+
+
+def test_cancelled_probe_lets_another_through(clock):
+    circuit = CircuitBreaker("players", failures=1, cooldown=30)
+    circuit.record(False)
+    clock.now += 31
+    circuit.before_call()
+    circuit.cancel()
+    circuit.before_call()
+
+
+def test_slow_calls_count_as_failures(clock):
+    circuit = CircuitBreaker("players", failures=1, cooldown=30, slow_seconds=2)
+    circuit.record(True, elapsed=1.9)
+    assert circuit.state == CLOSED
+    circuit.record(True, elapsed=2.1)
+    assert circuit.state == OPEN
+
+
+def test_zero_failures_disables_the_breaker(clock):
+    circuit = CircuitBreaker("players", failures=0)
+    for _ in range(10):
+        circuit.record(False)
+    circuit.before_call()
+    assert circuit.state == CLOSED
+
+
+@pytest.mark.parametrize("outcome, state", [
+    (FakeResponse(200, []), CLOSED),
+    (FakeResponse(503), OPEN),
+    (FakeResponse(429), OPEN),
+    (requests.exceptions.ConnectionError("down"), OPEN),
+    (KeyError("bug in a transport"), OPEN),
+])
+def test_iterpro_get_settles_the_probe(monkeypatch, outcome, state):
+    circuit = tripped()
+    monkeypatch.setattr(iterpro_client, "transport", FakeTransport(outcome))
+    try:
+        iterpro_client._iterpro_get("http://iterpro.invalid/players", "players")
+    except Exception:
+        pass
+    assert circuit.state == state
+    assert not circuit.probing
+
+
+def test_iterpro_get_cancels_the_probe_when_the_call_never_completes(monkeypatch):
+    circuit = tripped()
+    monkeypatch.setattr(iterpro_client, "transport", FakeTransport(KeyboardInterrupt()))
+    with pytest.raises(KeyboardInterrupt):
+        iterpro_client._iterpro_get("http://iterpro.invalid/players", "players")
+    assert circuit.state == HALF_OPEN and not circuit.probing
+
+    class LockedLimiter:
+        def acquire(self, endpoint):
+            raise RuntimeError("database is locked")
+    monkeypatch.setattr(iterpro_client, "rate_limiter", LockedLimiter())
+    with pytest.raises(RuntimeError):
+        iterpro_client._iterpro_get("http://iterpro.invalid/players", "players")
+    assert circuit.state == HALF_OPEN and not circuit.probing
+
+
+def test_open_circuit_serves_the_last_good_copy(monkeypatch):
+    players = [{"_id": "p001"}]
+    monkeypatch.setattr(iterpro_client, "transport", FakeTransport(FakeResponse(200, players)))
+    assert iterpro_client.get_players() == players
+    iterpro_client.clear_cache()
+    circuit = iterpro_breaker.breaker("players")
+    circuit.failures, circuit.opened_at = circuit.max_failures, time.monotonic()
+    transport = FakeTransport()
+    monkeypatch.setattr(iterpro_client, "transport", transport)
+    assert iterpro_client.get_players() == players
+    assert transport.calls == []
@@ -0,0 +1,84 @@
+import pytest
+
+import iterpro_ratelimit
+from iterpro_ratelimit import RateLimited, RateLimiter, current_priority, parse_limits, priority
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "ratelimit.db"
+
+
+@pytest.fixture
+def no_waiting(monkeypatch):
+    """Fail at once instead of sleeping for a token"""
+    monkeypatch.setattr(iterpro_ratelimit, "PRIORITY_MAX_WAIT", dict.fromkeys(iterpro_ratelimit.PRIORITY_MAX_WAIT, 0.0))
+
+
+def test_parse_limits():
+    assert parse_limits("players=2:5,*=10:20") == {"players": (2.0, 5.0), "*": (10.0, 20.0)}
+    assert parse_limits("players/{id}=3") == {"players/{id}": (3.0, 3.0)}
+    assert parse_limits("0.5") == {"*": (0.5, 1.0)}
+    assert parse_limits("off") == parse_limits("") == {}
+
+
+def test_burst_then_rejected(db_path, no_waiting):
+    limiter = RateLimiter(db_path, {"players": (0.001, 3)})
+    for _ in range(3):
+        assert limiter.acquire("players") < 0.1  # no sleep, only the bucket update
+    with pytest.raises(RateLimited):
+        limiter.acquire("players")
+
+
+def test_endpoints_without_a_limit_use_the_default_or_pass(db_path, no_waiting):
+    limiter = RateLimiter(db_path, {"*": (0.001, 1)})
+    limiter.acquire("teams")
+    with pytest.raises(RateLimited):
+        limiter.acquire("teams")
+    limiter.acquire("players")  # its own bucket
+    unlimited = RateLimiter(db_path, {})
+    for _ in range(100):
+        assert unlimited.acquire("teams") == 0.0
+
+
+def test_workers_share_one_budget(db_path, no_waiting):
+    limits = {"players": (0.001, 2)}
+    first, second = RateLimiter(db_path, limits), RateLimiter(db_path, limits)
+    first.acquire("players")
+    second.acquire("players")
+    with pytest.raises(RateLimited):
+        first.acquire("players")
+
+
+def test_lower_priorities_leave_part_of_the_burst(db_path, no_waiting):
+    limiter = RateLimiter(db_path, {"players": (0.001, 4)})
+    # background leaves half of the burst
+    with priority("background"):
+        limiter.acquire("players")
+        limiter.acquire("players")
+        with pytest.raises(RateLimited):
+            limiter.acquire("players")
+    # precompute leaves a quarter
+    limiter.acquire("players", "precompute")
+    with pytest.raises(RateLimited):
+        limiter.acquire("players", "precompute")
+    # interactive drains it
+    limiter.acquire("players")
+    with pytest.raises(RateLimited):
+        limiter.acquire("players")
+
+
+def test_waits_for_a_refill_within_the_wait_limit(db_path):
+    limiter = RateLimiter(db_path, {"players": (50, 1)})
+    limiter.acquire("players")
+    assert 0 < limiter.acquire("players") < 1
+
+
+def test_priority_context():
+    assert current_priority() == "interactive"
+    with priority("precompute"):
+        assert current_priority() == "precompute"
+    assert current_priority() == "interactive"
+    with pytest.raises(ValueError):
+        with priority("urgent"):
+            pass
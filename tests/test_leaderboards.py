@@ -0,0 +1,84 @@
+import pytest
+
+import iterpro_client
+import leaderboards
+from conftest import FakeTransport, make_instance, make_player
+from iterpro_client import measurement_store
+
+# 10m: lower is better; p002 and p003 tie for first
+SPRINTS = {"p001": 1.80, "p002": 1.65, "p003": 1.65, "p004": 1.90, "p005": 1.70, "p006": 1.75}
+
+
+@pytest.fixture
+def roster(club):
+    players = [make_player(1), make_player(2), make_player(3, position="Striker"),
+               make_player(4, team="team-b"), make_player(5, team="team-b", position="Striker"), make_player(6)]
+    roster = club(players)
+    for player_id, value in SPRINTS.items():
+        measurement_store.replace_player(player_id, [make_instance("10m", value)])
+    return roster
+
+
+def ranking(result):
+    return [(p['rank'], p['player_id']) for p in result['players']]
+
+
+def test_best_first_with_competition_ranks_for_ties(roster):
+    result = leaderboards.leaderboard("10m", n=10)
+    assert result['lower_is_better'] is True
+    assert result['ranked_players'] == 6
+    assert [p['rank'] for p in result['players']] == [1, 1, 3, 4, 5, 6]
+    assert [p['value'] for p in result['players']] == sorted(SPRINTS.values())
+    assert {p['player_id'] for p in result['players'][:2]} == {"p002", "p003"}
+
+
+def test_bottom_order_starts_from_the_worst(roster):
+    result = leaderboards.leaderboard("10m", n=2, bottom=True)
+    assert [p['player_id'] for p in result['players']] == ["p004", "p001"]
+
+
+def test_pages_keep_the_ranks_of_the_full_list(roster):
+    full = ranking(leaderboards.leaderboard("10m", n=10))
+    # One player per page: the tie for first is split across pages
+    pages = [row for offset in range(6) for row in ranking(leaderboards.leaderboard("10m", n=1, offset=offset))]
+    assert pages == full
+    assert leaderboards.leaderboard("10m", n=2, offset=6)['players'] == []
+
+
+def test_filters_rank_within_the_filtered_group(roster):
+    team_b = leaderboards.leaderboard("10m", team_id="team-b")
+    assert ranking(team_b) == [(1, "p005"), (2, "p004")]
+    strikers = leaderboards.leaderboard("10m", position="FWD")
+    assert ranking(strikers) == [(1, "p003"), (2, "p005")]
+    assert leaderboards.leaderboard("10m", team_id="no-such-team")['players'] == []
+
+
+def test_unknown_test_is_none_and_missing_roster_is_unavailable(roster, club):
+    assert leaderboards.leaderboard("no such test") is None
+    club([], version="empty")
+    with pytest.raises(leaderboards.LeaderboardUnavailable):
+        leaderboards.leaderboard("10m")
+
+
+def test_route_answers_503_without_a_roster(club):
+    import app
+    club([], version="empty")
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = {'name': 'coach', 'role': 'admin'}
+    response = client.get("/leaderboards/10m")
+    assert response.status_code == 503
+    assert client.get("/leaderboards/10m?order=sideways").status_code == 400
+
+
+def test_requests_never_call_iterpro(monkeypatch):
+    transport = FakeTransport()
+    monkeypatch.setattr(iterpro_client, "transport", transport)
+    with pytest.raises(leaderboards.LeaderboardUnavailable):
+        leaderboards.leaderboard("10m")
+    # Players cached by a page view or the background sync; their response TTL may have run out since
+    iterpro_client._cache_players([make_player(1), make_player(2)])
+    iterpro_client.clear_cache()
+    measurement_store.replace_player("p001", [make_instance("10m", 1.8)])
+    assert ranking(leaderboards.leaderboard("10m")) == [(1, "p001")]
+    assert transport.calls == []
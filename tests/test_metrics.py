@@ -0,0 +1,12 @@
+from utils import metrics
+
+
+def test_label_values_are_escaped():
+    metrics.inc("test_escape_total", endpoint='players/"x"\\y', test="10m\nsprint")
+    lines = [line for line in metrics.render_prometheus().splitlines() if line.startswith("test_escape_total")]
+    assert lines == ['test_escape_total{endpoint="players/\\"x\\"\\\\y",test="10m\\nsprint"} 1']
+
+
+def test_histogram_labels_are_escaped():
+    metrics.observe("test_escape_seconds", 0.01, endpoint='a"b')
+    assert 'test_escape_seconds_count{endpoint="a\\"b"} 1' in metrics.render_prometheus().splitlines()
@@ -0,0 +1,123 @@
+import os
+
+import pytest
+
+import app
+import roster_matrix
+from conftest import make_instance, make_player
+from iterpro_client import extract_latest_test_value, measurement_store, median_cache
+from measurements import TestResults as Results
+
+HISTORIES = {
+    "p002": [make_instance("10m", 1.9, date="2025-06-01T00:00:00.000Z"), make_instance("10m", 1.7),
+             make_instance("Height", 182)],
+    "p001": [make_instance("10m", 1.8), make_instance("Custom Jump", 41)],
+    "p003": [make_instance("Height", 175)],
+}
+
+
+@pytest.fixture
+def roster(club):
+    roster = club([make_player(1), make_player(2, team="team-b", position="Striker"), make_player(3), make_player(4)])
+    for player_id, instances in HISTORIES.items():
+        measurement_store.replace_player(player_id, instances)
+    return roster
+
+
+def wait_for_rebuild():
+    thread = roster_matrix._rebuild_thread
+    if thread is not None:
+        thread.join()
+
+
+def test_build_and_read(roster):
+    matrix = roster_matrix.refresh(roster)
+    assert len(matrix) == 3  # p004 has no stored history
+    assert [matrix.player_id(row) for row in range(len(matrix))] == ["p001", "p002", "p003"]
+    assert matrix.row_of("p004") is None and matrix.row_of("x" * 100) is None
+    row = matrix.row_of("p002")
+    assert matrix.value("10m", row) == 1.7  # the latest result
+    assert matrix.value("Height", matrix.row_of("p001")) is None
+    assert [matrix.player_id(r) for r in matrix.order("10m")] == ["p002", "p001"]
+    assert matrix.order("No Such Test") == ()
+    assert "Custom Jump" in matrix.tests
+    assert matrix.tables['team'][matrix.codes['team'][row]] == "team-b"
+    assert matrix.tables['position_group'][matrix.codes['position_group'][row]] == "FWD"
+
+
+def test_rows_read_like_test_results(roster):
+    matrix = roster_matrix.refresh(roster)
+    assert matrix.covers(["p001", "p002"]) and not matrix.covers(["p001", "p004"])
+    rows = matrix.rows_for(["p001", "p004"])
+    assert list(rows) == ["p001"]
+    assert extract_latest_test_value(rows["p001"], "10m") == 1.8
+
+
+@pytest.mark.parametrize("test_name", ["CMJ", "cmj arm", "Height", "10m", "Sprint 10m"])
+def test_rows_resolve_test_names_like_batch_results(club, test_name):
+    roster = club([make_player(1)])
+    instances = [make_instance("CMJ Arm Swing HT", 41, date="2026-01-01T00:00:00.000Z"),
+                 make_instance("CMJ Arm Locked HT", 37, date="2026-02-01T00:00:00.000Z"),
+                 make_instance("Height", 181, date="2026-01-01T00:00:00.000Z"),
+                 make_instance("Diff % Height Swing-Locked", 9.8, date="2026-02-01T00:00:00.000Z"),
+                 make_instance("10m", 1.8)]
+    measurement_store.replace_player("p001", instances)
+    row = roster_matrix.refresh(roster).rows_for(["p001"])["p001"]
+    assert extract_latest_test_value(row, test_name) == extract_latest_test_value(Results.from_instances(instances), test_name)
+
+
+def test_cold_node_builds_inside_the_request(roster):
+    assert not os.path.exists(roster_matrix.ROSTER_MATRIX_PATH)
+    matrix = roster_matrix.get_matrix(roster)
+    assert matrix is not None and roster_matrix.is_current(matrix)
+    assert roster_matrix._rebuild_thread is None
+
+
+def test_writes_are_served_from_the_old_mapping_until_the_rebuild(roster):
+    before = roster_matrix.get_matrix(roster)
+    measurement_store.upsert("p001", [make_instance("10m", 1.5, date="2026-02-01T00:00:00.000Z")])
+    served = roster_matrix.get_matrix(roster)
+    assert served is before and not roster_matrix.is_current(served)
+    assert served.value("10m", served.row_of("p001")) == 1.8
+    wait_for_rebuild()
+    after = roster_matrix.get_matrix(roster)
+    assert after is not before and roster_matrix.is_current(after)
+    assert after.value("10m", after.row_of("p001")) == 1.5
+
+
+def test_roster_change_rebuilds_in_the_background(roster, club):
+    roster_matrix.get_matrix(roster)
+    changed = club([make_player(1), make_player(2)], version="v2")
+    assert len(roster_matrix.get_matrix(changed)) == 3
+    wait_for_rebuild()
+    assert len(roster_matrix.get_matrix(changed)) == 2
+
+
+def test_current_file_is_not_rebuilt(roster):
+    matrix = roster_matrix.refresh(roster)
+    assert roster_matrix.refresh(roster) is matrix
+    assert roster_matrix.get_matrix(roster) is matrix
+    assert roster_matrix._rebuild_thread is None
+
+
+def test_workers_map_a_file_renamed_in_by_another_worker(roster):
+    matrix = roster_matrix.refresh(roster)
+    measurement_store.upsert("p003", [make_instance("10m", 1.6)])
+    # Another worker's rebuild
+    roster_matrix.build(roster_matrix.ROSTER_MATRIX_PATH, roster, roster_matrix._current_key(roster))
+    remapped = roster_matrix.get_matrix(roster)
+    assert remapped is not matrix and remapped.value("10m", remapped.row_of("p003")) == 1.6
+
+
+def test_no_matrix_without_a_roster(club):
+    assert roster_matrix.get_matrix(club([])) is None
+
+
+def test_only_whole_group_medians_are_cached(roster):
+    team = [{"_id": "p001"}, {"_id": "p002"}]
+    rows = roster_matrix.refresh(roster).rows_for(["p001", "p002"])
+    # Sampled batch data: shown, never cached
+    assert app.team_distribution(team, "10m", rows, "team-a", store=False).median() == 1.75
+    assert median_cache.get_cached_team_median("10m", "team-a") is None
+    assert app.team_distribution(team, "10m", rows, "team-a").median() == 1.75
+    assert median_cache.get_cached_team_median("10m", "team-a") == 1.75
@@ -0,0 +1,93 @@
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import iterpro_client
+import snapshots
+from conftest import make_instance, make_player, use_node
+from distributions import Distribution
+from iterpro_client import measurement_store, median_cache
+from snapshots import SnapshotError
+
+PLAYERS = [make_player(1), make_player(2)]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    """Snapshot of a node with a roster, histories and a team median, exported to a file"""
+    iterpro_client.store_player(PLAYERS[0])
+    iterpro_client._cache_players(PLAYERS)
+    measurement_store.replace_player("p001", [make_instance("10m", 1.8), make_instance("Height", 180)])
+    measurement_store.replace_player("p002", [make_instance("10m", 1.7)])
+    distribution = Distribution({"p001": 1.8, "p002": 1.7})
+    median_cache.cache_team_median("10m", "team-a", 1.75, 2, distribution)
+    median_cache.set_data_version("medians", "m1")
+    path = tmp_path / "snapshot.jsonl.gz"
+    counts = snapshots.export_snapshot(path)
+    assert counts == {'responses': 2, 'players': 2, 'measurements': 3, 'medians': 1}
+    use_node(tmp_path / "new-node")
+    return path
+
+
+def rewrite(path, edit):
+    """Apply edit(lines) to the JSON lines of a snapshot file"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for line in edit(lines):
+            f.write(json.dumps(line) + "\n")
+
+
+def test_round_trip_seeds_a_new_node(snapshot):
+    counts = snapshots.import_snapshot(snapshot)
+    assert counts == {'responses': 2, 'players': 2, 'measurements': 3, 'medians': 1}
+    assert iterpro_client._get_cached_players() == PLAYERS
+    assert measurement_store.latest("p001")["Height"][1] == 180
+    assert measurement_store.fresh_players() >= {"p001", "p002"}
+    assert median_cache.get_cached_team_distribution("10m", "team-a").players == {"p001": 1.8, "p002": 1.7}
+    assert [i['testName'] for i in median_cache.get_cached_test_instances("p002")] == ["10m"]
+    assert median_cache.get_data_version("medians") == "m1"
+
+
+def test_old_snapshot_only_seeds_last_good_copies_and_history(snapshot):
+    created_at = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat(timespec='seconds')
+    rewrite(snapshot, lambda lines: [{**lines[0], 'created_at': created_at}] + lines[1:])
+    counts = snapshots.import_snapshot(snapshot)
+    assert counts['medians'] == 0
+    assert iterpro_client._get_cached_players() is None
+    assert iterpro_client._load_last_good('players', 'all_players') == PLAYERS
+    assert median_cache.get_cached_team_median("10m", "team-a") is None
+    assert median_cache.get_cached_test_instances("p001") is None
+    assert measurement_store.latest("p002")["10m"][1] == 1.7
+    assert median_cache.get_data_version("medians") is None
+    assert median_cache.get_data_version("roster") is None
+
+
+def test_running_node_keeps_its_own_data_versions(snapshot):
+    median_cache.set_data_version("medians", "m2")
+    median_cache.set_data_version("roster", "r2")
+    counts = snapshots.import_snapshot(snapshot)
+    assert counts['medians'] == 1
+    assert median_cache.get_data_version("medians") == "m2"
+    assert median_cache.get_data_version("roster") == iterpro_client.fingerprint(PLAYERS)
+
+
+@pytest.mark.parametrize("damage", [
+    pytest.param(lambda path: path.write_bytes(path.read_bytes()[:-40]), id="truncated"),
+    pytest.param(lambda path: path.write_bytes(b"not a snapshot"), id="not gzip"),
+    pytest.param(lambda path: rewrite(path, lambda lines: [{**lines[0], 'version': 99}] + lines[1:]),
+                 id="other version"),
+    pytest.param(lambda path: rewrite(path, lambda lines: [{**lines[0], 'created_at': "yesterday"}] + lines[1:]),
+                 id="bad created_at"),
+    pytest.param(lambda path: rewrite(path, lambda lines: lines + [{'section': 'median', 'key': 'k'}]),
+                 id="malformed record"),
+])
+def test_damaged_snapshots_are_refused_before_anything_is_written(snapshot, damage):
+    damage(snapshot)
+    with pytest.raises(SnapshotError):
+        snapshots.import_snapshot(snapshot)
+    assert iterpro_client._load_last_good('players', 'all_players') is None
+    assert measurement_store.latest("p001") == {}
+    assert median_cache.get_cached_team_median("10m", "team-a") is None
@@ -0,0 +1,120 @@
+"""
+Background cache maintenance.
+
+Registered tasks (MedianCache.run_maintenance, iterpro_client.run_cache_maintenance)
+expire old entries, evict least recently used ones down to their size budget and
+vacuum/analyze the storage. Scheduled-only tasks (the roster measurement sync
+behind the leaderboards) run from the thread but not from the Settings page
+button, which must answer quickly. A daemon thread in each worker wakes up every
+CACHE_MAINTENANCE_INTERVAL seconds; a lock file holding the time of the last run
+makes sure only one worker per node actually does the work per interval.
+
+Environment variables:
+    CACHE_MAINTENANCE_INTERVAL   Seconds between runs (default: 600, 0 disables the thread)
+    CACHE_MAINTENANCE_LOCK       Lock file shared by the workers of a node
+                                 (default: <tmp>/soccer_central_maintenance.lock)
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+
+from utils.logger import get_logger
+from utils.metrics import inc, span
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker runs its own maintenance
+    fcntl = None
+
+CACHE_MAINTENANCE_INTERVAL = int(os.getenv("CACHE_MAINTENANCE_INTERVAL", "600"))
+CACHE_MAINTENANCE_LOCK = os.getenv(
+    "CACHE_MAINTENANCE_LOCK", os.path.join(tempfile.gettempdir(), "soccer_central_maintenance.lock"))
+
+logger = get_logger("cache_maintenance")
+
+_tasks = {}
+_scheduled_only = set()
+_started_pid = None
+_start_lock = threading.Lock()
+
+
+def register(name, task, scheduled_only=False):
+    """Add a maintenance task: a callable returning a summary dict ({'expired', 'evicted', ...})"""
+    _tasks[name] = task
+    if scheduled_only:
+        _scheduled_only.add(name)
+
+
+def run_once(scheduled=False):
+    """Run every task now (scheduled-only tasks just when scheduled); returns {name: summary}"""
+    results = {}
+    with span("cache_maintenance"):
+        for name, task in _tasks.items():
+            if name in _scheduled_only and not scheduled:
+                continue
+            try:
+                summary = task()
+            except Exception as e:
+                logger.exception("Cache maintenance task %s failed: %s", name, e)
+                results[name] = {'error': str(e)}
+                continue
+            for reason in ('expired', 'evicted'):
+                if summary.get(reason):
+                    inc("cache_maintenance_removed_total", summary[reason], cache=name, reason=reason)
+            results[name] = summary
+    logger.info("Cache maintenance: %s", results)
+    return results
+
+
+def _claim_run(interval):
+    """True if this worker should run now (no other worker on the node ran within the interval)"""
+    if fcntl is None:
+        return True
+    with open(CACHE_MAINTENANCE_LOCK, "a+") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False  # another worker is running it right now
+        try:
+            f.seek(0)
+            last_run = float(f.read().strip() or 0)
+            if time.time() - last_run < interval * 0.9:
+                return False
+            f.seek(0)
+            f.truncate()
+            f.write(str(time.time()))
+            f.flush()
+            return True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _loop(interval):
+    while True:
+        # Jitter keeps the workers of a node from waking up together
+        time.sleep(interval * random.uniform(0.9, 1.1))
+        try:
+            if _claim_run(interval):
+                run_once(scheduled=True)
+        except Exception as e:
+            logger.exception("Cache maintenance loop error: %s", e)
+
+
+def start(interval=CACHE_MAINTENANCE_INTERVAL):
+    """Start the maintenance thread once per process (safe to call on every request)"""
+    global _started_pid
+    if interval <= 0 or _started_pid == os.getpid():
+        return
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        # Started lazily so a forked worker gets its own thread (gunicorn --preload)
+        threading.Thread(target=_loop, args=(interval,), name="cache-maintenance", daemon=True).start()
+        _started_pid = os.getpid()
+
+
+def init_app(app):
+    """Start the maintenance thread with the first request of each worker"""
+    app.before_request(start)
@@ -0,0 +1,160 @@
+"""
+HTTP response compression and long-lived caching for static assets.
+
+HTML, JSON, CSS and JS responses above COMPRESS_MIN_SIZE are compressed with
+brotli (when the optional ``brotli`` package is installed) or gzip, according
+to the client's Accept-Encoding.
+
+Static files get content-hash fingerprinted URLs: ``url_for('static', ...)``
+appends ``?v=<hash>``, and requests carrying a fingerprint are served with an
+immutable Cache-Control, so browsers only download a file again after it
+changes. Compressed static variants are read from ``<file>.br`` / ``<file>.gz``
+(see utils/precompress_static.py) or compressed once in memory.
+
+Environment variables:
+    COMPRESS_MIN_SIZE   Smallest body worth compressing, in bytes (default: 1024)
+    COMPRESS_LEVEL      gzip level 1-9 for dynamic responses (default: 6)
+    STATIC_MAX_AGE      Cache lifetime of fingerprinted static files, in seconds (default: 31536000)
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import request
+
+from utils.metrics import describe, inc
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", str(365 * 24 * 3600)))
+
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/css", "text/plain", "text/javascript",
+    "application/javascript", "application/json", "image/svg+xml",
+}
+VARIANT_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# (path, mtime_ns) -> fingerprint and (path, mtime_ns, encoding) -> compressed bytes
+_fingerprints = {}
+_static_variants = {}
+_lock = threading.Lock()
+
+
+def compress(data, encoding, best=False):
+    """Compress bytes with the given content coding ('br' or 'gzip')"""
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if best else 5)
+    return gzip.compress(data, compresslevel=9 if best else COMPRESS_LEVEL, mtime=0)
+
+
+def _negotiate():
+    """Best content coding the client accepts, or None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted.quality("br") > 0:
+        return "br"
+    if accepted.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def static_fingerprint(static_folder, filename):
+    """Short content hash of a static file, cached until its mtime changes"""
+    path = os.path.join(static_folder, filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    key = (path, mtime)
+    fingerprint = _fingerprints.get(key)
+    if fingerprint is None:
+        with open(path, "rb") as f:
+            fingerprint = hashlib.sha256(f.read()).hexdigest()[:12]
+        with _lock:
+            _fingerprints[key] = fingerprint
+    return fingerprint
+
+
+def _static_variant(path, encoding):
+    """Compressed bytes of a static file: precompressed file on disk if fresh, else compressed once"""
+    mtime = os.stat(path).st_mtime_ns
+    key = (path, mtime, encoding)
+    data = _static_variants.get(key)
+    if data is not None:
+        return data
+    variant = path + VARIANT_SUFFIXES[encoding]
+    if os.path.exists(variant) and os.stat(variant).st_mtime_ns >= mtime:
+        with open(variant, "rb") as f:
+            data = f.read()
+    else:
+        with open(path, "rb") as f:
+            data = compress(f.read(), encoding, best=True)
+    with _lock:
+        _static_variants[key] = data
+    return data
+
+
+def _replace_body(response, data, encoding, original_size):
+    if hasattr(response.response, "close"):
+        response.response.close()
+    response.direct_passthrough = False
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    etag, _ = response.get_etag()
+    if etag:
+        # Same representation in another coding; a weak ETag keeps conditional requests working
+        response.set_etag(etag, weak=True)
+    inc("http_compression_saved_bytes_total", original_size - len(data), encoding=encoding)
+
+
+def _compressible(response):
+    return (
+        response.status_code == 200
+        and response.mimetype in COMPRESSIBLE_TYPES
+        and "Content-Encoding" not in response.headers
+        and "Range" not in request.headers
+    )
+
+
+def init_app(app):
+    """Wire compression and static fingerprinting into a Flask app"""
+
+    @app.url_defaults
+    def _fingerprint_static_urls(endpoint, values):
+        if endpoint == "static" and "filename" in values and "v" not in values:
+            fingerprint = static_fingerprint(app.static_folder, values["filename"])
+            if fingerprint:
+                values["v"] = fingerprint
+
+    @app.after_request
+    def _compress_response(response):
+        is_static = request.endpoint == "static"
+        if is_static and request.args.get("v"):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+
+        if not _compressible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = _negotiate()
+        if encoding is None:
+            return response
+
+        if is_static:
+            path = os.path.join(app.static_folder, request.view_args["filename"])
+            _replace_body(response, _static_variant(path, encoding), encoding, os.path.getsize(path))
+        elif not response.direct_passthrough and not response.is_streamed:
+            data = response.get_data()
+            if len(data) >= COMPRESS_MIN_SIZE:
+                _replace_body(response, compress(data, encoding), encoding, len(data))
+        return response
+
+
+describe("http_compression_saved_bytes_total", "Response bytes saved by compression, by content coding")
@@ -0,0 +1,119 @@
+"""
+Fragment cache for Jinja templates.
+
+    {% cache "report_performance", player.id, report_version %}
+        ... expensive block ...
+    {% endcache %}
+
+Rendered blocks are kept in an in-process LRU keyed by the fragment name, the
+given key parts, the current user's role and the global data version (roster
+and median versions from MedianCache). Refreshing the roster or invalidating
+the medians changes the data version, so every worker stops serving the old
+fragments without having to be told; ``clear()`` drops the local entries
+immediately.
+
+Environment variables:
+    FRAGMENT_CACHE_ENABLED   0 disables the cache (default: 1)
+    FRAGMENT_CACHE_TTL       Seconds a fragment may be served (default: 300)
+    FRAGMENT_CACHE_SIZE      Maximum fragments kept per worker (default: 512)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_request_context, session
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from utils.metrics import record_cache_lookup
+
+FRAGMENT_CACHE_ENABLED = os.getenv("FRAGMENT_CACHE_ENABLED", "1") != "0"
+FRAGMENT_CACHE_TTL = int(os.getenv("FRAGMENT_CACHE_TTL", "300"))
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "512"))
+
+_fragments = OrderedDict()  # key -> (expires_at, html)
+_lock = threading.Lock()
+_version_func = None
+
+
+def clear():
+    """Drop every cached fragment in this worker"""
+    with _lock:
+        _fragments.clear()
+
+
+def _data_version():
+    if _version_func is None:
+        return ""
+    if not has_request_context():
+        return _version_func()
+    # One lookup per request, however many fragments the page has
+    if "fragment_data_version" not in g:
+        g.fragment_data_version = _version_func()
+    return g.fragment_data_version
+
+
+def _role():
+    if not has_request_context():
+        return None
+    user = session.get("user") or {}
+    return user.get("role")
+
+
+def _get(key):
+    with _lock:
+        entry = _fragments.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del _fragments[key]
+            return None
+        _fragments.move_to_end(key)
+        return entry[1]
+
+
+def _set(key, html):
+    with _lock:
+        _fragments[key] = (time.time() + FRAGMENT_CACHE_TTL, html)
+        _fragments.move_to_end(key)
+        while len(_fragments) > FRAGMENT_CACHE_SIZE:
+            _fragments.popitem(last=False)
+
+
+class FragmentCacheExtension(Extension):
+    """Adds the {% cache name, key... %}...{% endcache %} tag"""
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_render_fragment", [nodes.List(args)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_fragment(self, args, caller):
+        if not FRAGMENT_CACHE_ENABLED:
+            return caller()
+        name = str(args[0])
+        key = (name, _role(), _data_version()) + tuple(str(arg) for arg in args[1:])
+        html = _get(key)
+        record_cache_lookup("fragment", name, html is not None)
+        if html is None:
+            html = caller()
+            # Blocks rendered from persisted data while Iterpro is down are not kept
+            if not (has_request_context() and g.get("iterpro_stale")):
+                _set(key, html)
+        return Markup(html)
+
+
+def init_app(app, version_func=None):
+    """Register the {% cache %} tag; version_func returns the current global data version"""
+    global _version_func
+    _version_func = version_func
+    app.jinja_env.add_extension(FragmentCacheExtension)
@@ -0,0 +1,29 @@
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]  # dos niveles arriba (desde utils/)
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from auth import BCRYPT_PREFIXES, USERS_FILE
+from db.db import hash_password
+
+def hash_users_file(path=USERS_FILE):
+    """Replace every plaintext password in users.json with a bcrypt hash"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    hashed = 0
+    for user in data.get("users", []):
+        password = user.get("password", "")
+        if password and not password.startswith(BCRYPT_PREFIXES):
+            user["password"] = hash_password(password)
+            hashed += 1
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    print(f"{hashed} contraseñas convertidas a bcrypt en {path}")
+
+if __name__ == "__main__":
+    hash_users_file(Path(sys.argv[1]) if len(sys.argv) > 1 else USERS_FILE)
@@ -0,0 +1,60 @@
+"""
+Once-only lazy construction of process-wide objects.
+
+lazy(factory) returns a stand-in that builds the real object on first use
+(once, thread-safe) and forwards attribute access to it. Modules can keep
+exposing shared clients and caches as plain globals (``from iterpro_client
+import median_cache``) without opening databases or directories at import
+time, so worker boots and short scripts only pay for what they touch.
+"""
+import threading
+import time
+
+from utils.metrics import describe, observe
+
+
+class LazyObject:
+    """Proxy that builds its target with factory() on first attribute access"""
+
+    __slots__ = ("_factory", "_name", "_instance", "_lock")
+
+    def __init__(self, factory, name=None):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_name", name or getattr(factory, "__name__", "object"))
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _get(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    start = time.perf_counter()
+                    instance = self._factory()
+                    observe("lazy_init_seconds", time.perf_counter() - start, object=self._name)
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    @property
+    def initialized(self):
+        return self._instance is not None
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._get(), name, value)
+
+    def __repr__(self):
+        if self._instance is None:
+            return f"<lazy {self._name} (not built)>"
+        return repr(self._instance)
+
+
+def lazy(factory, name=None):
+    """Stand-in for factory() that is only built when first used"""
+    return LazyObject(factory, name)
+
+
+describe("lazy_init_seconds", "Time spent building lazily initialized clients and caches")
@@ -0,0 +1,95 @@
+"""
+Leveled logging for the Flask app and the Iterpro client.
+
+Built on the standard ``logging`` module so that disabled levels cost a single
+integer comparison. Messages use %-style arguments and are only formatted when
+a handler actually emits them.
+
+Environment variables:
+    LOG_LEVEL        Minimum level to emit (default: WARNING)
+    LOG_SAMPLE_RATE  Fraction of per-item debug events to emit (default: 0.01)
+"""
+import logging
+import os
+import random
+import re
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# Header names and key=value pairs whose values must never reach the logs
+SECRET_HEADERS = {"authorization", "x-iterpro-api-key", "cookie", "set-cookie"}
+_SECRET_PATTERN = re.compile(
+    r"(?i)(authorization|x-iterpro-api-key|api_key|password|token)(['\"]?\s*[:=]\s*['\"]?)(Basic\s+)?[^'\",\s}]+"
+)
+REDACTED = "***"
+
+_configured = False
+
+
+class Lazy:
+    """Defer an expensive log argument until the record is formatted"""
+    __slots__ = ("func",)
+
+    def __init__(self, func):
+        self.func = func
+
+    def __str__(self):
+        return str(self.func())
+
+    __repr__ = __str__
+
+
+def redact(text):
+    """Mask credentials found in a log message"""
+    return _SECRET_PATTERN.sub(lambda m: f"{m.group(1)}{m.group(2)}{REDACTED}", text)
+
+
+def redact_headers(headers):
+    """Return a copy of request headers with secret values masked"""
+    return {
+        name: (REDACTED if name.lower() in SECRET_HEADERS else value)
+        for name, value in (headers or {}).items()
+    }
+
+
+class RedactingFilter(logging.Filter):
+    """Scrub secrets from records after formatting"""
+
+    def filter(self, record):
+        message = record.getMessage()
+        cleaned = redact(message)
+        if cleaned != message:
+            record.msg = cleaned
+            record.args = None
+        return True
+
+
+def configure_logging(level=None):
+    """Install the shared handler once per process"""
+    global _configured
+    if _configured:
+        return
+    root = logging.getLogger("soccer_central")
+    root.setLevel(level or LOG_LEVEL)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(RedactingFilter())
+    root.addHandler(handler)
+    root.propagate = False
+    _configured = True
+
+
+def get_logger(name):
+    """Get a namespaced logger (e.g. get_logger("iterpro"))"""
+    configure_logging()
+    return logging.getLogger(f"soccer_central.{name}")
+
+
+def debug_sampled(logger, msg, *args, rate=None):
+    """Log a per-item debug event for only a sample of the calls"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if random.random() < (LOG_SAMPLE_RATE if rate is None else rate):
+        logger.debug(msg, *args)
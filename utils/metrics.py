@@ -0,0 +1,217 @@
+"""
+In-process timing metrics for requests, Iterpro calls, cache queries and
+median computations.
+
+Spans are aggregated into Prometheus-style histograms and counters that are
+exposed on ``/metrics`` to scrapers sending ``Authorization: Bearer
+$METRICS_TOKEN`` (404 while METRICS_TOKEN is unset). Within a Flask request,
+each span also adds its time to the ``Server-Timing`` response header. Metrics are kept per process, so
+with several gunicorn workers each worker reports its own series.
+"""
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Latency buckets in seconds (upper bounds)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_help = {}
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label_value(value):
+    """Backslash, double quote and line feed escaped as the Prometheus text format requires"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in key) + "}"
+
+
+def describe(name, help_text):
+    """Register the HELP text for a metric"""
+    _help[name] = help_text
+
+
+def inc(name, value=1, **labels):
+    """Increment a counter"""
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """Record one observation (in seconds) into a histogram"""
+    key = (name, _label_key(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"buckets": [0] * len(DEFAULT_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                hist["buckets"][i] += 1
+                break
+        hist["sum"] += value
+        hist["count"] += 1
+
+
+def _add_server_timing(name, duration):
+    # Flask is only imported by init_app: scripts using the timers don't pay for it
+    flask = sys.modules.get("flask")
+    if flask is not None and flask.has_request_context():
+        timings = flask.g.setdefault("server_timings", {})
+        total, count = timings.get(name, (0.0, 0))
+        timings[name] = (total + duration, count + 1)
+
+
+class Span:
+    """Mutable labels for a span that are only known once the work is done"""
+    __slots__ = ("labels",)
+
+    def __init__(self, labels):
+        self.labels = labels
+
+    def set(self, **labels):
+        self.labels.update(labels)
+
+
+@contextmanager
+def span(name, **labels):
+    """Time a block into the ``<name>_seconds`` histogram and Server-Timing"""
+    current = Span(labels)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception:
+        current.labels.setdefault("status", "error")
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        observe(f"{name}_seconds", duration, **current.labels)
+        _add_server_timing(name, duration)
+
+
+def timed(name, **labels):
+    """Decorator form of span()"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache_lookup(cache, kind, hit):
+    """Count a cache hit or miss"""
+    inc("cache_requests_total", cache=cache, kind=kind, result="hit" if hit else "miss")
+
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, dict(v, buckets=list(v["buckets"]))) for k, v in _histograms.items())
+
+    seen = set()
+    for (name, key), value in counters:
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(key)} {value}")
+
+    for (name, key), hist in histograms:
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, count in zip(DEFAULT_BUCKETS, hist["buckets"]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(key + (('le', str(bound)),))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {hist['count']}")
+        lines.append(f"{name}_sum{_format_labels(key)} {hist['sum']:.6f}")
+        lines.append(f"{name}_count{_format_labels(key)} {hist['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Drop all collected metrics (used by benchmarks between runs)"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def init_app(app):
+    """Wire request timing, template timing, Server-Timing and /metrics into a Flask app"""
+    from flask import Response, before_render_template, g, request, template_rendered
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def _finish_request_timer(response):
+        start = g.pop("request_start", None)
+        if start is None:
+            return response
+        duration = time.perf_counter() - start
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        observe("http_request_seconds", duration, endpoint=endpoint, method=request.method,
+                status=response.status_code)
+
+        timings = g.pop("server_timings", {})
+        parts = [
+            f'{name};dur={total * 1000:.1f};desc="{count}x"'
+            for name, (total, count) in timings.items()
+        ]
+        parts.append(f"total;dur={duration * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(parts)
+        return response
+
+    def _template_started(sender, template, context, **extra):
+        g.setdefault("template_starts", []).append(time.perf_counter())
+
+    def _template_finished(sender, template, context, **extra):
+        starts = g.get("template_starts")
+        if starts:
+            duration = time.perf_counter() - starts.pop()
+            observe("template_render_seconds", duration, template=template.name)
+            _add_server_timing("render", duration)
+
+    before_render_template.connect(_template_started, app, weak=False)
+    template_rendered.connect(_template_finished, app, weak=False)
+
+    # Route names, Iterpro latencies and cache counters are not public
+    from auth import metrics_token_required
+
+    @app.route("/metrics")
+    @metrics_token_required
+    def metrics():
+        """Prometheus scrape endpoint"""
+        return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+describe("http_request_seconds", "Flask request latency by route")
+describe("iterpro_seconds", "Iterpro API call latency by endpoint and status")
+describe("iterpro_response_bytes_total", "Bytes received from the Iterpro API")
+describe("iterpro_stale_served_total", "Persisted data served in place of failed Iterpro calls, by source")
+describe("median_cache_seconds", "MedianCache query latency by operation")
+describe("median_seconds", "Median computation time by kind")
+describe("template_render_seconds", "Jinja template rendering time")
+describe("cache_requests_total", "Cache lookups by cache, kind and result")
@@ -0,0 +1,29 @@
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]  # dos niveles arriba (desde utils/)
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from utils.compression import VARIANT_SUFFIXES, brotli, compress
+
+# Extensiones de texto que vale la pena comprimir (las imágenes PNG ya lo están)
+EXTENSIONS = {".css", ".js", ".html", ".json", ".svg", ".txt"}
+
+def precompress_static(static_dir=PROJECT_ROOT / "static"):
+    """Write .gz (and .br when brotli is installed) next to every compressible static file"""
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    written = 0
+    for path in Path(static_dir).rglob("*"):
+        if not path.is_file() or path.suffix not in EXTENSIONS:
+            continue
+        data = path.read_bytes()
+        for encoding in encodings:
+            variant = path.with_name(path.name + VARIANT_SUFFIXES[encoding])
+            compressed = compress(data, encoding, best=True)
+            variant.write_bytes(compressed)
+            written += 1
+            print(f"{variant.relative_to(static_dir)}: {len(data)} -> {len(compressed)} bytes")
+    print(f"{written} variantes comprimidas escritas en {static_dir}")
+
+if __name__ == "__main__":
+    precompress_static(Path(sys.argv[1]) if len(sys.argv) > 1 else PROJECT_ROOT / "static")
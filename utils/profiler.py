@@ -0,0 +1,266 @@
+"""
+On-demand request profiling for admins.
+
+Add ``?profile=1`` (or the ``X-Profile: 1`` header) to any request while logged
+in as an admin and the request runs under cProfile. The profile is saved to
+PROFILE_DIR and its id returned in the ``X-Profile-Id`` header; use
+``?profile=report`` to get the report back instead of the normal response.
+
+A low-overhead sampling profiler can also run continuously in the background
+(PROFILER_SAMPLING=1, or start/stop it from /admin/profiler/sampling). It
+stops by itself after PROFILER_MAX_SECONDS or once it has counted
+PROFILER_MAX_STACKS distinct stacks, so a forgotten run cannot grow without
+bound; the samples stay readable until the next reset.
+
+Environment variables:
+    PROFILE_DIR                Where profiles are stored (default: <tmp>/soccer_central_profiles)
+    PROFILE_KEEP               Number of stored profiles to keep (default: 50)
+    PROFILER_SAMPLING          Start the sampling profiler at boot (default: 0)
+    PROFILER_SAMPLE_INTERVAL   Seconds between samples (default: 0.01)
+    PROFILER_MAX_SECONDS       Sampling run length before it stops, 0 for no limit (default: 600)
+    PROFILER_MAX_STACKS        Distinct stacks kept before sampling stops (default: 10000)
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from flask import Response, abort, g, jsonify, request, send_file, session
+
+from auth import login_required, role_required
+from utils.logger import get_logger
+
+logger = get_logger("profiler")
+
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", Path(tempfile.gettempdir()) / "soccer_central_profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILER_SAMPLING = os.getenv("PROFILER_SAMPLING", "0") == "1"
+PROFILER_SAMPLE_INTERVAL = float(os.getenv("PROFILER_SAMPLE_INTERVAL", "0.01"))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "600"))
+PROFILER_MAX_STACKS = int(os.getenv("PROFILER_MAX_STACKS", "10000"))
+TOP_FUNCTIONS = 40
+
+
+def _profiling_requested():
+    flag = request.args.get("profile") or request.headers.get("X-Profile")
+    if not flag or flag in ("0", "false"):
+        return False
+    user = session.get("user") or {}
+    return user.get("role") == "admin"
+
+
+def _profile_path(profile_id, suffix=".prof"):
+    if not profile_id.replace("-", "").isalnum():
+        abort(404)
+    return PROFILE_DIR / f"{profile_id}{suffix}"
+
+
+def _prune_profiles():
+    profiles = sorted(PROFILE_DIR.glob("*.prof"), key=lambda p: p.stat().st_mtime)
+    for old in profiles[:-PROFILE_KEEP]:
+        for suffix in (".prof", ".txt"):
+            old.with_suffix(suffix).unlink(missing_ok=True)
+
+
+def format_report(stats, title=""):
+    """Text report with top functions by cumulative time, by self time and their callees"""
+    out = io.StringIO()
+    stats.stream = out
+    if title:
+        out.write(f"{title}\n\n")
+    out.write("=== Top functions by cumulative time ===\n")
+    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+    out.write("\n=== Top functions by self time ===\n")
+    stats.sort_stats("tottime").print_stats(TOP_FUNCTIONS)
+    out.write("\n=== Call tree (callees of the slowest functions) ===\n")
+    stats.sort_stats("cumulative").print_callees(TOP_FUNCTIONS // 2)
+    return out.getvalue()
+
+
+class SamplingProfiler:
+    """Periodically samples every thread's stack and counts collapsed stacks"""
+
+    def __init__(self, interval=PROFILER_SAMPLE_INTERVAL, max_seconds=PROFILER_MAX_SECONDS,
+                 max_stacks=PROFILER_MAX_STACKS):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.max_stacks = max_stacks
+        self.samples = Counter()
+        self.sample_count = 0
+        self.started_at = None
+        self.stopped_reason = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self.started_at = time.time()
+        self.stopped_reason = None
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._thread = None
+        self.stopped_reason = self.stopped_reason or "stopped"
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+            self.sample_count = 0
+
+    def _limit_reached(self):
+        if self.max_seconds and time.time() - self.started_at >= self.max_seconds:
+            return f"ran for {self.max_seconds:g}s"
+        if len(self.samples) >= self.max_stacks:
+            return f"{self.max_stacks} distinct stacks"
+        return None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            reason = self._limit_reached()
+            if reason:
+                self.stopped_reason = reason
+                logger.warning("Sampling profiler stopped: %s", reason)
+                return
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == own_id:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                        frame = frame.f_back
+                    self.samples[";".join(reversed(stack))] += 1
+                self.sample_count += 1
+
+    def collapsed(self, limit=None):
+        """Stacks in the collapsed format used by flamegraph tools"""
+        with self._lock:
+            items = self.samples.most_common(limit)
+        return "\n".join(f"{stack} {count}" for stack, count in items)
+
+    def top_functions(self, limit=TOP_FUNCTIONS):
+        """Leaf (self) and inclusive sample counts per function"""
+        self_counts, inclusive = Counter(), Counter()
+        with self._lock:
+            items = list(self.samples.items())
+        for stack, count in items:
+            frames = stack.split(";")
+            self_counts[frames[-1]] += count
+            for name in set(frames):
+                inclusive[name] += count
+        return {
+            "samples": self.sample_count,
+            "interval": self.interval,
+            "stopped_reason": self.stopped_reason,
+            "self": self_counts.most_common(limit),
+            "inclusive": inclusive.most_common(limit),
+        }
+
+
+sampling_profiler = SamplingProfiler()
+
+
+def init_app(app):
+    """Register the profiling hooks and the admin profile endpoints"""
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    if PROFILER_SAMPLING:
+        sampling_profiler.start()
+
+    @app.before_request
+    def _start_profiler():
+        if _profiling_requested():
+            g.profiler = cProfile.Profile()
+            g.profiler_started = time.perf_counter()
+            g.profiler.enable()
+
+    @app.after_request
+    def _stop_profiler(response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        elapsed = time.perf_counter() - g.pop("profiler_started")
+
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        profiler.dump_stats(str(_profile_path(profile_id)))
+        title = f"{request.method} {request.full_path} -> {response.status_code} in {elapsed * 1000:.1f} ms"
+        report = format_report(pstats.Stats(profiler), title)
+        _profile_path(profile_id, ".txt").write_text(report, encoding="utf-8")
+        _prune_profiles()
+        logger.info("Stored profile %s for %s", profile_id, title)
+
+        if (request.args.get("profile") or request.headers.get("X-Profile")) == "report":
+            return Response(report, mimetype="text/plain", headers={"X-Profile-Id": profile_id})
+        response.headers["X-Profile-Id"] = profile_id
+        return response
+
+    @app.route("/admin/profiles")
+    @login_required
+    @role_required(['admin'])
+    def list_profiles():
+        """List stored request profiles, newest first"""
+        profiles = sorted(PROFILE_DIR.glob("*.txt"), key=lambda p: p.stat().st_mtime, reverse=True)
+        return jsonify([
+            {"id": p.stem, "title": p.read_text(encoding="utf-8").split("\n", 1)[0]}
+            for p in profiles
+        ])
+
+    @app.route("/admin/profiles/<profile_id>")
+    @login_required
+    @role_required(['admin'])
+    def show_profile(profile_id):
+        """Text report for a stored profile"""
+        path = _profile_path(profile_id, ".txt")
+        if not path.exists():
+            abort(404)
+        return Response(path.read_text(encoding="utf-8"), mimetype="text/plain")
+
+    @app.route("/admin/profiles/<profile_id>/download")
+    @login_required
+    @role_required(['admin'])
+    def download_profile(profile_id):
+        """Raw pstats file for snakeviz / pstats"""
+        path = _profile_path(profile_id)
+        if not path.exists():
+            abort(404)
+        return send_file(path, as_attachment=True, download_name=path.name)
+
+    @app.route("/admin/profiler/sampling", methods=["GET", "POST"])
+    @login_required
+    @role_required(['admin'])
+    def sampling_profile():
+        """GET: top functions (or ?format=collapsed); POST action=start|stop|reset"""
+        if request.method == "POST":
+            action = request.form.get("action") or (request.get_json(silent=True) or {}).get("action")
+            if action == "start":
+                sampling_profiler.start()
+            elif action == "stop":
+                sampling_profiler.stop()
+            elif action == "reset":
+                sampling_profiler.reset()
+            else:
+                return jsonify({"error": "action must be start, stop or reset"}), 400
+        if request.args.get("format") == "collapsed":
+            return Response(sampling_profiler.collapsed(), mimetype="text/plain")
+        return jsonify(dict(sampling_profiler.top_functions(), running=sampling_profiler.running))
@@ -0,0 +1,78 @@
+"""
+Compact serialization for cached payloads.
+
+Values are encoded with MessagePack and zlib-compressed once they exceed a
+size threshold. Every blob starts with a 4-byte header so readers never have to
+guess:
+
+    b"SC" + codec (b"m" msgpack, b"j" json) + compression (b"z" zlib, b"-" none)
+
+Blobs without the header are treated as plain JSON, which keeps entries
+written by older versions readable until they expire.
+
+Environment variables:
+    CACHE_SERIALIZER          msgpack | json (default: msgpack)
+    CACHE_COMPRESS_THRESHOLD  Compress payloads larger than this many bytes (default: 1024, -1 disables)
+    CACHE_COMPRESS_LEVEL      zlib level 1-9 (default: 6)
+"""
+import hashlib
+import json
+import os
+import zlib
+
+import msgpack
+
+CACHE_SERIALIZER = os.getenv("CACHE_SERIALIZER", "msgpack").lower()
+CACHE_COMPRESS_THRESHOLD = int(os.getenv("CACHE_COMPRESS_THRESHOLD", "1024"))
+CACHE_COMPRESS_LEVEL = int(os.getenv("CACHE_COMPRESS_LEVEL", "6"))
+
+MAGIC = b"SC"
+HEADER_SIZE = 4
+MSGPACK, JSON = b"m", b"j"
+ZLIB, RAW = b"z", b"-"
+
+
+def _pack(value, codec):
+    if codec == MSGPACK:
+        return msgpack.packb(value, use_bin_type=True)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _unpack(payload, codec):
+    if codec == MSGPACK:
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    return json.loads(payload)
+
+
+def dumps(value, serializer=None, threshold=None):
+    """Encode a value as a header-tagged, optionally compressed blob"""
+    codec = JSON if (serializer or CACHE_SERIALIZER) == "json" else MSGPACK
+    threshold = CACHE_COMPRESS_THRESHOLD if threshold is None else threshold
+    payload = _pack(value, codec)
+    compression = RAW
+    if 0 <= threshold < len(payload):
+        compressed = zlib.compress(payload, CACHE_COMPRESS_LEVEL)
+        # Short or already dense payloads can grow; keep whichever is smaller
+        if len(compressed) < len(payload):
+            payload, compression = compressed, ZLIB
+    return MAGIC + codec + compression + payload
+
+
+def loads(blob):
+    """Decode a blob produced by dumps (or legacy plain JSON)"""
+    if isinstance(blob, str):
+        return json.loads(blob)
+    blob = bytes(blob)
+    if blob[:2] != MAGIC:
+        return json.loads(blob)
+    codec, compression = blob[2:3], blob[3:4]
+    payload = blob[HEADER_SIZE:]
+    if compression == ZLIB:
+        payload = zlib.decompress(payload)
+    return _unpack(payload, codec)
+
+
+def fingerprint(value):
+    """Short, order-independent content hash of a JSON-like value (for data versions)"""
+    payload = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
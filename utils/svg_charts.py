@@ -0,0 +1,98 @@
+"""
+Server-side SVG trend charts for the printable player report.
+
+Charts are plain inline SVG built from the ``enhanced_data`` series returned by
+``get_enhanced_athletic_performance``, so a report is printable as soon as the
+HTML arrives: no Chart.js, no canvas-to-image conversion. ``data_version``
+hashes the series so rendered charts can be cached until the data changes.
+"""
+from markupsafe import escape
+
+from utils.serialization import fingerprint
+
+WIDTH, HEIGHT = 320, 150
+PAD_LEFT, PAD_RIGHT, PAD_TOP, PAD_BOTTOM = 44, 12, 30, 26
+LINE_COLOR = "#647AB3"
+LATEST_COLOR = "#DCC788"
+TEXT_COLOR = "#495057"
+GRID_COLOR = "#e9ecef"
+
+
+def data_version(enhanced_data):
+    """Short content hash of the report series"""
+    return fingerprint(enhanced_data)
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    return str(value)
+
+
+def render_trend_chart(test_name, measurements, unit=""):
+    """Line chart of one test's measurements in date order, latest point highlighted"""
+    points = sorted(
+        (m for m in measurements if isinstance(m.get("value"), (int, float))),
+        key=lambda m: m.get("date", ""),
+    )
+    title = escape(test_name)
+    unit_label = escape(unit or "")
+    header = (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {WIDTH} {HEIGHT}" '
+              f'width="{WIDTH}" height="{HEIGHT}" role="img" aria-label="{title} trend" '
+              f'font-family="Roboto, Arial, sans-serif" font-size="10">'
+              f'<text x="{PAD_LEFT}" y="16" font-size="12" font-weight="600" fill="{TEXT_COLOR}">{title}</text>')
+    if not points:
+        return header + (f'<text x="{WIDTH / 2}" y="{HEIGHT / 2}" text-anchor="middle" '
+                         f'fill="{TEXT_COLOR}">No data</text></svg>')
+
+    values = [p["value"] for p in points]
+    low, high = min(values), max(values)
+    if high == low:
+        low, high = low - 1, high + 1
+    plot_w = WIDTH - PAD_LEFT - PAD_RIGHT
+    plot_h = HEIGHT - PAD_TOP - PAD_BOTTOM
+    step = plot_w / (len(points) - 1) if len(points) > 1 else 0
+
+    def x(i):
+        return PAD_LEFT + (i * step if len(points) > 1 else plot_w / 2)
+
+    def y(value):
+        return PAD_TOP + plot_h - (value - low) / (high - low) * plot_h
+
+    coords = " ".join(f"{x(i):.1f},{y(v):.1f}" for i, v in enumerate(values))
+    latest = points[-1]
+    parts = [
+        header,
+        f'<text x="{WIDTH - PAD_RIGHT}" y="16" text-anchor="end" font-size="12" font-weight="600" '
+        f'fill="{LINE_COLOR}">{escape(_format(latest["value"]))}{unit_label}</text>',
+        # Axes and min/max labels
+        f'<line x1="{PAD_LEFT}" y1="{PAD_TOP}" x2="{PAD_LEFT}" y2="{PAD_TOP + plot_h}" stroke="{GRID_COLOR}"/>',
+        f'<line x1="{PAD_LEFT}" y1="{PAD_TOP + plot_h}" x2="{WIDTH - PAD_RIGHT}" y2="{PAD_TOP + plot_h}" '
+        f'stroke="{GRID_COLOR}"/>',
+        f'<text x="{PAD_LEFT - 4}" y="{PAD_TOP + 4}" text-anchor="end" fill="{TEXT_COLOR}">{escape(_format(high))}</text>',
+        f'<text x="{PAD_LEFT - 4}" y="{PAD_TOP + plot_h}" text-anchor="end" fill="{TEXT_COLOR}">'
+        f'{escape(_format(low))}</text>',
+        f'<text x="{PAD_LEFT}" y="{HEIGHT - 8}" fill="{TEXT_COLOR}">{escape(points[0].get("date", "")[:10])}</text>',
+        f'<text x="{WIDTH - PAD_RIGHT}" y="{HEIGHT - 8}" text-anchor="end" fill="{TEXT_COLOR}">'
+        f'{escape(latest.get("date", "")[:10])}</text>',
+        f'<polyline points="{coords}" fill="none" stroke="{LINE_COLOR}" stroke-width="2" '
+        f'stroke-linejoin="round"/>',
+    ]
+    parts.extend(
+        f'<circle cx="{x(i):.1f}" cy="{y(v):.1f}" r="2.5" fill="{LINE_COLOR}"/>' for i, v in enumerate(values[:-1])
+    )
+    parts.append(f'<circle cx="{x(len(values) - 1):.1f}" cy="{y(values[-1]):.1f}" r="4" fill="{LATEST_COLOR}" '
+                 f'stroke="{LINE_COLOR}"/>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def render_report_charts(enhanced_data):
+    """{category: {test_name: svg}} for every series in enhanced_data"""
+    return {
+        category: {
+            test_name: render_trend_chart(test_name, series.get("measurements", []), series.get("unit", ""))
+            for test_name, series in tests.items()
+        }
+        for category, tests in enhanced_data.items()
+    }